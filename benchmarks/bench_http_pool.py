@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк HTTP-пулів Bot API проти локального сервера-замінника.
+
+Сервер імітує api.telegram.org: кожне нове з'єднання коштує HANDSHAKE_MS (TCP + TLS),
+кожна відповідь — RTT_MS, getUpdates тримається як long poll, а документи
+вивантажуються зі швидкістю UPLOAD_MBPS. Поки йде long poll і два вивантаження PDF,
+бот робить сплеск дрібних викликів (deleteMessage / editMessageText, як у діалогах),
+і ми міряємо їхню пропускну здатність і затримку.
+
+Конфігурації:
+  * shared-4     — один об'єкт запитів на все з невеликим пулом (4 з'єднання);
+  * split-no-ka  — окремий getUpdates і пул на 64 з'єднання, але без keep-alive;
+  * split-tuned  — як у боті (http_pool.py): окремий getUpdates, пул 64, keep-alive.
+
+Запуск:  python benchmarks/bench_http_pool.py
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from telegram import Bot  # noqa: E402
+from telegram.error import TelegramError  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+
+from http_pool import build_api_request, build_get_updates_request  # noqa: E402
+
+HANDSHAKE_MS = 30
+RTT_MS = 20
+LONG_POLL_SECONDS = 1
+UPLOAD_MBPS = 4
+UPLOAD_BYTES = 2 * 1024 * 1024
+SMALL_CALLS = 400
+SMALL_CONCURRENCY = 16
+
+TOKEN = "123:bench"
+
+def _result(method: str):
+    if method == "getMe":
+        return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+    if method == "getUpdates":
+        return []
+    if method == "sendDocument":
+        return {
+            "message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"},
+            "document": {"file_id": "F", "file_unique_id": "U", "file_name": "doc.pdf"},
+        }
+    return True
+
+class StandInServer:
+    def __init__(self):
+        self.connections = 0
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(HANDSHAKE_MS / 1000)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method = lines[0].split(" ")[1].rsplit("/", 1)[-1]
+                headers = {k.lower(): v.strip() for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+                length = int(headers.get("content-length", "0"))
+                started = time.perf_counter()
+                while length > 0:
+                    chunk = await reader.read(min(length, 64 * 1024))
+                    if not chunk:
+                        return
+                    length -= len(chunk)
+                # Вивантаження обмежене "каналом" UPLOAD_MBPS
+                if method == "sendDocument":
+                    budget = int(headers.get("content-length", "0")) / (UPLOAD_MBPS * 1024 * 1024)
+                    await asyncio.sleep(max(0.0, budget - (time.perf_counter() - started)))
+                await asyncio.sleep(LONG_POLL_SECONDS if method == "getUpdates" else RTT_MS / 1000)
+                body = json.dumps({"ok": True, "result": _result(method)}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+async def _long_poll(bot: Bot, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            await bot.get_updates(timeout=LONG_POLL_SECONDS)
+        except TelegramError:
+            pass
+
+async def _uploads(bot: Bot, stop: asyncio.Event) -> None:
+    payload = b"%PDF" + b"0" * UPLOAD_BYTES
+    while not stop.is_set():
+        try:
+            await bot.send_document(chat_id=1, document=payload, filename="doc.pdf")
+        except TelegramError:
+            pass
+
+async def _small_calls(bot: Bot) -> tuple:
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(SMALL_CONCURRENCY)
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if i % 2:
+                    await bot.delete_message(chat_id=1, message_id=i)
+                else:
+                    await bot.edit_message_text("…", chat_id=1, message_id=i)
+                latencies.append(time.perf_counter() - started)
+            except TelegramError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(SMALL_CALLS)))
+    return time.perf_counter() - started, latencies, errors
+
+async def run_case(name: str, api_request: HTTPXRequest, get_updates_request: HTTPXRequest) -> None:
+    server = StandInServer()
+    port = await server.start()
+    bot = Bot(TOKEN, base_url=f"http://127.0.0.1:{port}/bot", request=api_request, get_updates_request=get_updates_request)
+    await bot.initialize()
+    stop = asyncio.Event()
+    background = [asyncio.create_task(_long_poll(bot, stop))] + [asyncio.create_task(_uploads(bot, stop)) for _ in range(2)]
+    await asyncio.sleep(0.2)
+    elapsed, latencies, errors = await _small_calls(bot)
+    stop.set()
+    await asyncio.gather(*background)
+    await bot.shutdown()
+    await server.stop()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float("nan")
+    print(
+        f"{name:12s} {len(latencies) / elapsed:8.1f} викл/с   p50 {statistics.median(latencies) * 1000 if latencies else float('nan'):7.1f} мс"
+        f"   p95 {p95:7.1f} мс   помилок {errors:3d}   з'єднань {server.connections}"
+    )
+
+async def main():
+    print(f"{SMALL_CALLS} дрібних викликів по {SMALL_CONCURRENCY} паралельно, на тлі long poll і 2 вивантажень по {UPLOAD_BYTES // 1024 // 1024} МБ")
+    print(f"(хендшейк {HANDSHAKE_MS} мс, RTT {RTT_MS} мс, канал вивантаження {UPLOAD_MBPS} МБ/с)\n")
+    shared = HTTPXRequest(connection_pool_size=4, media_write_timeout=60)
+    await run_case("shared-4", shared, shared)
+    await run_case("split-no-ka", build_api_request(keepalive=0), build_get_updates_request())
+    await run_case("split-tuned", build_api_request(), build_get_updates_request())
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк розміру PDF за типами документів і профілями стиснення (pdf_optimize.py).
+
+Документи (Політика, DPIA, Чек-ліст) збираються справжніми діалогами з replay_harness.py,
+кожен рендериться всіма доступними бекендами без оптимізації, а потім проходить кожен
+профіль PDF_SIZE_PROFILE. Для кожної пари показуються байти, виграш і час оптимізації,
+а також шрифти: вбудовані підмножиною, вбудовані повністю (кандидати на subsetting)
+і не вбудовані.
+
+Запуск:  python benchmarks/bench_pdf_size.py [--items 12]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import replay_harness  # noqa: E402  (додає src/ у sys.path)
+import bot  # noqa: E402
+import pdf_utils  # noqa: E402
+from pdf_optimize import SIZE_PROFILES, font_report, optimize_pdf  # noqa: E402
+
+async def collect_documents(items: int) -> dict:
+    """Проганяє по одному діалогу кожного типу (формат md) і повертає {тип: Markdown}."""
+    documents = {}
+    original = bot.build_document_markdown
+
+    def capture(kind, data_raw, registry=None):
+        documents[kind] = original(kind, data_raw, registry)
+        return documents[kind]
+
+    bot.build_document_markdown = capture
+    rng = random.Random(1)
+    scripts = [
+        replay_harness.policy_script(rng),
+        replay_harness.dpia_script(rng, items),
+        replay_harness.checklist_script(rng, 0.3),
+    ]
+    try:
+        await replay_harness.replay(scripts, "md", False, replay_harness.ReplayStats())
+    finally:
+        bot.build_document_markdown = original
+    return documents
+
+def describe_fonts(pdf: bytes) -> str:
+    fonts = font_report(pdf)
+    return (f"шрифти: підмножина {len(fonts.get('subset', []))}, повні {len(fonts.get('full', []))}"
+            f"{' ' + str(fonts['full']) if fonts.get('full') else ''}, не вбудовані {len(fonts.get('not_embedded', []))}")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=12, help="пунктів даних у DPIA")
+    args = parser.parse_args()
+
+    documents = await collect_documents(args.items)
+    for kind, markdown in documents.items():
+        html_full = pdf_utils._md_to_html(markdown)
+        for backend, generate, _ in pdf_utils.PDF_BACKENDS:
+            try:
+                raw = generate(html_full)
+            except pdf_utils.RenderBackendError as e:
+                print(f"{kind:10s} {backend:12s} помилка: {e}")
+                continue
+            if raw is None:
+                continue
+            print(f"\n{kind} / {backend}: {describe_fonts(raw)}")
+            for name, profile in SIZE_PROFILES.items():
+                started = time.perf_counter()
+                pdf = optimize_pdf(raw, profile)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                print(f"  {name:10s} {len(pdf):9d} байт  {100 * (1 - len(pdf) / len(raw)):5.1f}% менше"
+                      f"  {elapsed_ms:7.1f} мс")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Мікробенчмарк екранування відповідей користувача.
+
+Порівнює однопрохідний `str.translate` зі схемою з sanitizer.py (html.escape + заміни
+лише тих символів, що є в тексті), а також кеш на поле сесії — на реалістичному українському тексті.
+
+Запуск:  python benchmarks/bench_sanitizer.py
+"""
+
+import html
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sanitizer import escape_html, escape_pdf, session_escape_html  # noqa: E402
+
+ANSWER = (
+    "Ми зберігаємо Telegram ID, ім'я та email студентів у \"Google Sheets\" <лише для читання>.\n"
+    "Доступ мають 2 адміністратори | 2FA увімкнено & токени в .env.\n"
+    "Дані видаляються через 30 днів після завершення семестру (див. /deleteme)."
+)
+
+CLEAN_ANSWER = "Телеграм бот для розкладу занять факультету компютерних наук КАІ"
+
+def legacy_pdf(text: str) -> str:
+    if not text: return ""
+    safe = html.escape(text)
+    safe = safe.replace("|", "/")
+    safe = safe.replace("\n", "<br>")
+    return safe
+
+_TRANSLATE_TABLE = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;", "|": "/", "\n": "<br>",
+})
+
+def translate_pdf(text: str) -> str:
+    if not text: return ""
+    return text.translate(_TRANSLATE_TABLE)
+
+def legacy_html(text: str) -> str:
+    if not text: return ""
+    return html.escape(text)
+
+def session_rebuilds(escape_field, steps: int = 20, fields: int = 9):
+    """Імітує сесію Чек-ліста: на кожному кроці підсумок екранує всі поля заново."""
+    data = {f"f{i}": ANSWER for i in range(fields)}
+    for _ in range(steps):
+        for i in range(fields):
+            escape_field(data, f"f{i}")
+
+def main():
+    assert legacy_pdf(ANSWER) == escape_pdf(ANSWER) == translate_pdf(ANSWER)
+    assert legacy_html(ANSWER) == escape_html(ANSWER)
+
+    number = 100_000
+    cases = [
+        ("PDF: html.escape + 2×replace", lambda: legacy_pdf(ANSWER)),
+        ("PDF: str.translate", lambda: translate_pdf(ANSWER)),
+        ("PDF: sanitizer.escape_pdf", lambda: escape_pdf(ANSWER)),
+        ("PDF: escape_pdf, чистий текст", lambda: escape_pdf(CLEAN_ANSWER)),
+        ("HTML: sanitizer.escape_html", lambda: escape_html(ANSWER)),
+    ]
+    print(f"Одне поле ({len(ANSWER)} символів), {number} повторів:")
+    for name, fn in cases:
+        seconds = min(timeit.repeat(fn, number=number, repeat=5))
+        print(f"  {name:<32} {seconds / number * 1e6:7.2f} мкс/виклик")
+
+    number = 1_000
+    sessions = [
+        ("сесія без кешу", lambda: session_rebuilds(lambda d, k: legacy_html(d[k]))),
+        ("сесія з кешем на поле", lambda: session_rebuilds(lambda d, k: session_escape_html(d, k))),
+    ]
+    print(f"Сесія Чек-ліста (20 кроків × 9 полів), {number} повторів:")
+    for name, fn in sessions:
+        seconds = min(timeit.repeat(fn, number=number, repeat=5))
+        print(f"  {name:<32} {seconds / number * 1e3:7.3f} мс/сесію")
+
+if __name__ == "__main__":
+    main()
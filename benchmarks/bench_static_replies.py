@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк статичних відповідей: клавіатура й параметри запиту, зібрані на кожен виклик,
+проти готових `StaticReply.kwargs` зі static_replies.py.
+
+Bot працює з фіктивним транспортом (без мережі), тож міряється лише те, що бот робить
+сам: побудова клавіатури, серіалізація параметрів, розбір відповіді. Для кожного варіанта —
+час на виклик і пік тимчасових алокацій на виклик (tracemalloc).
+
+Запуск:  python benchmarks/bench_static_replies.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+from telegram.constants import ParseMode  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+import templates  # noqa: E402
+from static_replies import static_replies  # noqa: E402
+
+CALLS = 2_000
+
+_ME = json.dumps({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "B", "username": "b"}}).encode()
+_SENT = json.dumps({"ok": True, "result": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "."}}).encode()
+
+class NullRequest(BaseRequest):
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        # Як справжній транспорт: тіло запиту серіалізується
+        if request_data is not None:
+            request_data.json_payload
+        return 200, _ME if url.endswith("getMe") else _SENT
+
+def legacy_main_menu_keyboard() -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton("1️⃣ Крок 1: Оцінка Ризиків (DPIA)", callback_data="start_dpia")],
+        [InlineKeyboardButton("2️⃣ Крок 2: Політика Приватності", callback_data="start_policy")],
+        [InlineKeyboardButton("3️⃣ Крок 3: Технічний Чек-ліст", callback_data="start_checklist")],
+        [InlineKeyboardButton("📦 Порожні шаблони (кіт)", callback_data="show_kit")],
+        [
+            InlineKeyboardButton("❓ Допомога", callback_data="show_help"),
+            InlineKeyboardButton("🔒 Наша Політика", callback_data="show_privacy")
+        ],
+        [InlineKeyboardButton("🐙 GitHub (Open Source)", url="https://github.com/Kirill3224/KAI-Privacy-Kit")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def legacy_back_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад в меню", callback_data="start_menu")]])
+
+async def measure(name: str, send) -> None:
+    for _ in range(50):
+        await send()
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        await send()
+    per_call_us = (time.perf_counter() - started) / CALLS * 1e6
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(200):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await send()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    peaks.sort()
+    print(f"{name:32s} {per_call_us:8.1f} мкс/виклик   пік алокацій {peaks[len(peaks) // 2] / 1024:6.1f} КБ/виклик")
+
+async def main():
+    bot = Bot("123:bench", request=NullRequest(), get_updates_request=NullRequest())
+    await bot.initialize()
+    welcome, help_inline = static_replies['WELCOME'], static_replies['HELP_INLINE']
+
+    print(f"{CALLS} викликів на варіант\n")
+    await measure("/start: щоразу нова клавіатура", lambda: bot.send_message(
+        chat_id=1, text=templates.BOT_WELCOME, reply_markup=legacy_main_menu_keyboard(), parse_mode=ParseMode.HTML))
+    await measure("/start: StaticReply", lambda: bot.send_message(chat_id=1, **welcome.kwargs))
+    await measure("help inline: щоразу нова", lambda: bot.edit_message_text(
+        chat_id=1, message_id=1, text=templates.BOT_HELP, reply_markup=legacy_back_keyboard(),
+        parse_mode=ParseMode.HTML, disable_web_page_preview=True))
+    await measure("help inline: StaticReply", lambda: bot.edit_message_text(chat_id=1, message_id=1, **help_inline.kwargs))
+    await bot.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Відтворення діалогів у процесі, без мережі.
+
+Будує той самий Application і ConversationHandler, що й `main()` (`bot.build_application`),
+але Bot працює через фіктивний транспорт `RecordingRequest`: кожен виклик Bot API
+серіалізується як зазвичай, записується і миттєво отримує канонічну відповідь.
+Сценарії (Політика, DPIA з N пунктами, Чек-ліст із пропусками нотаток) або випадкова суміш
+діалогів проганяються на повній швидкості CPU, а звіт показує:
+  * CPU-час хендлерів на кожен стан діалогу (середній і p95);
+  * пік тимчасових алокацій на крок (окремий прохід із tracemalloc, щоб не спотворювати час);
+  * час рендеру документів (PDF рендериться справжніми робочими процесами);
+  * кількість викликів Bot API за методами.
+
+Приклади:
+  python benchmarks/replay_harness.py --scenario dpia --items 20 --runs 50
+  python benchmarks/replay_harness.py --random 200 --seed 7 --format md
+  python benchmarks/replay_harness.py --scenario policy --max-cpu-ms 5   # ненульовий код, якщо повільніше
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Діалоги йдуть на повній швидкості CPU — ліміти користувачів (rate_limit.py) тут лише завадять
+for _quota in ("RATE_LIMIT_MESSAGES", "RATE_LIMIT_FLOW_STARTS", "RATE_LIMIT_RENDERS"):
+    os.environ.setdefault(_quota, "0")
+# Прохід з tracemalloc повторює ті самі update_id — дедуплікація (dedup.py) відкинула б їх як повтори
+os.environ.setdefault("DEDUP_WINDOW", "0")
+
+from telegram import Update  # noqa: E402
+from telegram.ext import ConversationHandler  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+from telegram.warnings import PTBUserWarning  # noqa: E402
+
+# Попередження PTB про per_message стосуються налаштувань бота, а не прогону
+warnings.filterwarnings("ignore", category=PTBUserWarning)
+
+import bot  # noqa: E402
+from render_queue import render_queue  # noqa: E402
+
+TOKEN = "123456:replay"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+
+# --- Фіктивний транспорт Bot API ---
+
+class RecordingRequest(BaseRequest):
+    """Записує виклики Bot API і відповідає одразу, без мережі."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self._message_ids = itertools.count(10_000)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, chat_id, **extra) -> dict:
+        return {"message_id": next(self._message_ids), "date": 0, "chat": {"id": chat_id, "type": "private"}, **extra}
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        name = url.rsplit("/", 1)[-1]
+        self.calls[name] += 1
+        params = {}
+        if request_data is not None:
+            # Як справжній транспорт: тіло запиту серіалізується повністю
+            if request_data.contains_files:
+                request_data.multipart_data
+            request_data.json_payload
+            params = request_data.parameters
+        chat_id = int(params.get("chat_id", 0) or 0)
+        if name == "getMe":
+            result = BOT_USER
+        elif name in ("sendMessage", "editMessageText"):
+            result = self._message(chat_id, text=".")
+        elif name == "sendDocument":
+            result = self._message(chat_id, document={"file_id": "F", "file_unique_id": "U"})
+        elif name == "sendMediaGroup":
+            media = params.get("media") or []
+            media = json.loads(media) if isinstance(media, str) else media
+            result = [self._message(chat_id, document={"file_id": "F", "file_unique_id": "U"}) for _ in media]
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+# --- Оновлення ---
+
+class UpdateFactory:
+    def __init__(self, bot_instance):
+        self.bot = bot_instance
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": "U"}
+
+    def text(self, user_id: int, text: str) -> Update:
+        message = {
+            "message_id": next(self._ids), "date": 0, "text": text,
+            "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id),
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": next(self._ids), "message": message}, self.bot)
+
+    def callback(self, user_id: int, data: str) -> Update:
+        query = {
+            "id": str(next(self._ids)), "chat_instance": "replay", "data": data, "from": self._user(user_id),
+            "message": {"message_id": next(self._ids), "date": 0, "chat": {"id": user_id, "type": "private"}, "text": "."},
+        }
+        return Update.de_json({"update_id": next(self._ids), "callback_query": query}, self.bot)
+
+# --- Сценарії: послідовність ("text" | "cb", значення) ---
+
+_WORDS = ("дані", "студенти", "email", "Telegram ID", "розклад", "Google Sheets", "шифрування", "доступ",
+          "адміністратор", "видалення", "30 днів", "логи", "резервна копія", "2FA", "токен", "<b>тег</b>")
+
+def _answer(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+def policy_script(rng: random.Random) -> list:
+    return [("cb", "start_policy")] + [("text", _answer(rng)) for _ in range(5)]
+
+def dpia_script(rng: random.Random, items: int = 5) -> list:
+    steps = [("cb", "start_dpia"), ("text", _answer(rng, 3)), ("text", _answer(rng)), ("text", _answer(rng))]
+    steps.append(("text", "\n".join(f"{rng.choice(_WORDS)} {i}" for i in range(items))))
+    for _ in range(items):
+        if rng.random() < 0.7:
+            steps += [("cb", "min_yes"), ("text", _answer(rng))]
+        else:
+            steps.append(("cb", "min_no"))
+    return steps + [("text", _answer(rng)) for _ in range(5)]
+
+def checklist_script(rng: random.Random, skip_ratio: float = 0.5) -> list:
+    steps = [("cb", "start_checklist"), ("text", _answer(rng, 3))]
+    for _ in range(9):
+        steps.append(("cb", rng.choice(("cl_yes", "cl_no"))))
+        steps.append(("cb", "cl_skip_note") if rng.random() < skip_ratio else ("text", _answer(rng)))
+    return steps
+
+def build_scripts(args, rng: random.Random) -> list:
+    if args.random:
+        makers = (
+            lambda: policy_script(rng),
+            lambda: dpia_script(rng, rng.randint(1, args.items)),
+            lambda: checklist_script(rng, rng.random()),
+        )
+        return [rng.choice(makers)() for _ in range(args.random)]
+    maker = {
+        "policy": lambda: policy_script(rng),
+        "dpia": lambda: dpia_script(rng, args.items),
+        "checklist": lambda: checklist_script(rng, args.skip_ratio),
+    }[args.scenario]
+    return [maker() for _ in range(args.runs)]
+
+# --- Прогін ---
+
+def _state_names(conversation: ConversationHandler) -> dict:
+    prefixes = ("POLICY_", "DPIA_", "CHECKLIST_", "C1_", "C2_", "C3_")
+    names = {
+        value: name for name, value in vars(bot).items()
+        if name.startswith(prefixes) and isinstance(value, int)
+    }
+    return {state: names.get(state, str(state)) for state in conversation.states}
+
+def _percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+class ReplayStats:
+    def __init__(self):
+        self.cpu_ms = defaultdict(list)
+        self.alloc_kb = defaultdict(list)
+        self.render_ms = []
+        self.updates = 0
+        self.wall_seconds = 0.0
+        # Рендери рахуємо лише в проході без tracemalloc
+        self.timing = True
+
+async def _process(application, conversation: ConversationHandler, user_id: int, update: Update) -> None:
+    await application.process_update(update)
+    # Генерація йде у фоні (block=False) — крок закінчується, коли документ надіслано
+    pending = getattr(conversation._conversations.get((user_id, user_id)), 'task', None)
+    if pending is not None:
+        await pending
+
+async def replay(scripts: list, output_format: str, trace_alloc: bool, stats: ReplayStats) -> RecordingRequest:
+    request = RecordingRequest()
+    application = bot.build_application(token=TOKEN, request=request, use_persistence=False)
+    conversation = next(h for h in application.handlers[0] if isinstance(h, ConversationHandler))
+    state_names = _state_names(conversation)
+    updates = UpdateFactory(application.bot)
+    stats.timing = not trace_alloc
+
+    await application.initialize()
+    try:
+        for user_id, script in enumerate(scripts, start=1000):
+            await application.process_update(updates.callback(user_id, f"fmt_{output_format}"))
+            for kind, value in script:
+                update = updates.callback(user_id, value) if kind == "cb" else updates.text(user_id, value)
+                # Внутрішній стан ConversationHandler: ключ (chat_id, user_id)
+                state = conversation._conversations.get((user_id, user_id))
+                step = state_names.get(state, "ВХІД") if state is not None else "ВХІД"
+                if trace_alloc:
+                    current = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                    await _process(application, conversation, user_id, update)
+                    stats.alloc_kb[step].append((tracemalloc.get_traced_memory()[1] - current) / 1024)
+                else:
+                    wall_started = time.perf_counter()
+                    cpu_started = time.process_time()
+                    await _process(application, conversation, user_id, update)
+                    stats.cpu_ms[step].append((time.process_time() - cpu_started) * 1000)
+                    stats.wall_seconds += time.perf_counter() - wall_started
+                    stats.updates += 1
+    finally:
+        await application.shutdown()
+    return request
+
+def _timed_render(stats: ReplayStats):
+    original = render_queue.render_pdf
+
+    async def render_pdf(markdown, on_progress=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await original(markdown, on_progress, **kwargs)
+        finally:
+            if stats.timing:
+                stats.render_ms.append((time.perf_counter() - started) * 1000)
+
+    return render_pdf
+
+def report(stats: ReplayStats, calls: Counter) -> float:
+    print(f"{'Стан':28s} {'кроків':>7s} {'CPU сер., мс':>13s} {'CPU p95, мс':>12s} {'алок. мед., КБ':>15s}")
+    worst = 0.0
+    for step in sorted(stats.cpu_ms, key=lambda name: -statistics.mean(stats.cpu_ms[name])):
+        samples = stats.cpu_ms[step]
+        mean = statistics.mean(samples)
+        worst = max(worst, mean)
+        alloc = statistics.median(stats.alloc_kb[step]) if stats.alloc_kb.get(step) else float("nan")
+        print(f"{step:28s} {len(samples):7d} {mean:13.3f} {_percentile(samples, 0.95):12.3f} {alloc:15.1f}")
+    print(f"\nОновлень: {stats.updates}, {stats.updates / stats.wall_seconds:.0f} оновл./с (з рендером)")
+    if stats.render_ms:
+        print(f"Рендер PDF: {len(stats.render_ms)} шт., сер. {statistics.mean(stats.render_ms):.1f} мс, "
+              f"p95 {_percentile(stats.render_ms, 0.95):.1f} мс")
+    print("Виклики Bot API: " + ", ".join(f"{name} {count}" for name, count in calls.most_common()))
+    return worst
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=("policy", "dpia", "checklist"), default="dpia")
+    parser.add_argument("--runs", type=int, default=20, help="скільки разів прогнати сценарій")
+    parser.add_argument("--items", type=int, default=5, help="пунктів даних у DPIA (для --random — максимум)")
+    parser.add_argument("--skip-ratio", type=float, default=0.5, help="частка пропущених нотаток у Чек-лісті")
+    parser.add_argument("--random", type=int, default=0, help="N випадкових діалогів замість --scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--format", choices=tuple(bot.OUTPUT_FORMATS), default="pdf", help="формат документів")
+    parser.add_argument("--max-cpu-ms", type=float, default=0, help="поріг середнього CPU-часу кроку (0 — без перевірки)")
+    args = parser.parse_args()
+
+    stats = ReplayStats()
+    render_queue.render_pdf = _timed_render(stats)
+    calls = await replay(build_scripts(args, random.Random(args.seed)), args.format, False, stats)
+    # Окремий прохід для алокацій: tracemalloc сповільнює все в рази
+    tracemalloc.start()
+    await replay(build_scripts(args, random.Random(args.seed)), args.format, True, stats)
+    tracemalloc.stop()
+
+    worst = report(stats, calls.calls)
+    if args.max_cpu_ms and worst > args.max_cpu_ms:
+        print(f"\nПЕРЕВИЩЕНО: найповільніший стан {worst:.3f} мс > {args.max_cpu_ms} мс")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -15,41 +15,77 @@
 - UX: Уніфіковано видалення повідомлень при переходах (Upsell).
 """
 
+import time
+_IMPORTS_STARTED_AT = time.perf_counter()
+
+import asyncio
 import logging
 import os
-import html
 from datetime import date
+from types import MappingProxyType
 from dotenv import load_dotenv
 from telegram import Update, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
+    ApplicationHandlerStop,
     CommandHandler,
     ConversationHandler,
     MessageHandler,
     CallbackQueryHandler,
     filters,
     ContextTypes,
+    TypeHandler,
 )
 from telegram.constants import ParseMode
 from telegram.error import BadRequest
 
 # Локальні імпорти
 import templates
-from pdf_utils import create_pdf_from_markdown, clear_temp_file
-
-# Налаштування логування
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+from log_setup import setup_logging
+from pdf_utils import PdfUnavailable, create_html_from_markdown, warm_up_renderer
+from render_queue import RenderCancelled, RenderQueueFull, render_queue
+from render_workers import render_worker_pool
+from sanitizer import escape_html, escape_pdf, session_escape_html, session_memo
+from budgets import MAX_DOC_CHARS, DocumentTooLarge, enforce_document_budget, limit_items, truncate_field
+from xlsx_export import XLSX_BUILDERS, XlsxUnavailable
+from session_store import build_session_persistence
+from drain import DrainInterrupted, install_drain_signal_handlers, shutdown_drain
+from kit import kit_cache
+from http_pool import BOT_POLL_TIMEOUT, build_api_request, build_get_updates_request, configure_requests
+from static_replies import (
+    DPIA_UPSELL_KEYBOARD, MAIN_MENU_KEYBOARD, POLICY_UPSELL_KEYBOARD, POST_ACTION_KEYBOARD,
+    RETRY_GENERATION_KEYBOARD,
 )
+from multi_bot import load_bot_configs, run_applications
+from update_processor import PerUserUpdateProcessor
+from template_reload import TemplateStore, TemplateVersion, template_watcher
+from health import health_monitor
+from dedup import update_deduplicator
+from rate_limit import format_wait, user_rate_limits
+from importers import IMPORT_MAX_BYTES, StructuredInputError, parse_structured, parse_upload
+
+# Хронометраж холодного старту (секунди), звіт пишеться після прогріву рендерера
+STARTUP_TIMINGS = {'imports': time.perf_counter() - _IMPORTS_STARTED_AT}
+
+# Налаштування логування: форматування і запис у фоновому потоці (див. log_setup.py)
+setup_logging()
 logging.getLogger("telegram.ext.JobQueue").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 # --- Завантаження конфігурації ---
+_config_started_at = time.perf_counter()
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    logger.error("!!! Змінна BOT_TOKEN не знайдена в .env файлі !!!")
-    exit()
+# Фоновий прогрів рендерера одразу після старту (RENDER_WARMUP=0 вимикає)
+RENDER_WARMUP = os.getenv("RENDER_WARMUP", "1") != "0"
+# Скільки оновлень різних користувачів обробляється паралельно (1 — усі послідовно, як раніше);
+# оновлення одного користувача — завжди по черзі (update_processor.py), генерація — у фоні
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "32"))
+# Як часто (секунди) писати в лог статистику черги рендеру (0 — вимкнено)
+RENDER_STATS_INTERVAL = float(os.getenv("RENDER_STATS_INTERVAL", "60"))
+# Скільки секунд відповіді чекають на кнопку повтору генерації, після чого видаляються з пам'яті
+RETRY_DOCUMENT_TTL = float(os.getenv("RETRY_DOCUMENT_TTL", "600"))
+STARTUP_TIMINGS['config'] = time.perf_counter() - _config_started_at
 
 # === Етапи для Conversation Handlers ===
 
@@ -90,51 +126,33 @@ if not BOT_TOKEN:
 
 # === 1. Клавіатури (Keyboards) ===
 
+# Клавіатури зібрані один раз (див. static_replies.py)
+
 def get_main_menu_keyboard() -> InlineKeyboardMarkup:
-    keyboard = [
-        [InlineKeyboardButton("1️⃣ Крок 1: Оцінка Ризиків (DPIA)", callback_data="start_dpia")],
-        [InlineKeyboardButton("2️⃣ Крок 2: Політика Приватності", callback_data="start_policy")],
-        [InlineKeyboardButton("3️⃣ Крок 3: Технічний Чек-ліст", callback_data="start_checklist")],
-        [
-            InlineKeyboardButton("❓ Допомога", callback_data="show_help"),
-            InlineKeyboardButton("🔒 Наша Політика", callback_data="show_privacy")
-        ],
-        [InlineKeyboardButton("🐙 GitHub (Open Source)", url="https://github.com/Kirill3224/KAI-Privacy-Kit")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return MAIN_MENU_KEYBOARD
 
 def get_post_action_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([[
-        InlineKeyboardButton("⬅️ Повернутись до головного меню", callback_data="start_menu_post_generation")
-    ]])
+    return POST_ACTION_KEYBOARD
 
 def get_dpia_upsell_keyboard() -> InlineKeyboardMarkup:
-    keyboard = [
-        [InlineKeyboardButton("📄 Створити Політику (Крок 2)", callback_data="start_policy_upsell")],
-        [InlineKeyboardButton("⬅️ В меню", callback_data="start_menu_post_generation")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return DPIA_UPSELL_KEYBOARD
 
 def get_policy_upsell_keyboard() -> InlineKeyboardMarkup:
-    keyboard = [
-        [InlineKeyboardButton("✅ Пройти Чек-ліст (Крок 3)", callback_data="start_checklist_upsell")],
-        [InlineKeyboardButton("⬅️ В меню", callback_data="start_menu_post_generation")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return POLICY_UPSELL_KEYBOARD
+
+def get_retry_generation_keyboard() -> InlineKeyboardMarkup:
+    return RETRY_GENERATION_KEYBOARD
 
 
 # === 2. Функції Безпеки ===
 
-def safe_user_input(text: str) -> str:
-    if not text: return ""
-    return html.escape(text)
+# Однопрохідне екранування (див. sanitizer.py)
+safe_user_input = escape_html
+safe_pdf_input = escape_pdf
 
-def safe_pdf_input(text: str) -> str:
-    if not text: return ""
-    safe = html.escape(text)
-    safe = safe.replace("|", "/") 
-    safe = safe.replace("\n", "<br>")
-    return safe
+def safe_pdf_field(text: str) -> str:
+    """safe_pdf_input з урахуванням бюджету символів на поле (RENDER_MAX_FIELD_CHARS)."""
+    return safe_pdf_input(truncate_field(text))
 
 def clear_user_data(context: ContextTypes.DEFAULT_TYPE) -> None:
     if context.user_data:
@@ -142,6 +160,31 @@ def clear_user_data(context: ContextTypes.DEFAULT_TYPE) -> None:
 
 # === ХЕЛПЕРИ ПОВІДОМЛЕНЬ ===
 
+def template_version(context: ContextTypes.DEFAULT_TYPE) -> TemplateVersion:
+    """
+    Версія шаблонів бота, що обробляє оновлення (див. template_reload.py): закріплена за діалогом
+    користувача, а для генерації — та, на якій діалог ішов (`take_session_data`).
+    """
+    return getattr(context, 'session_templates', None) or context.bot_data['template_store'].for_session(context.user_data)
+
+def texts(context: ContextTypes.DEFAULT_TYPE) -> templates.TemplateRegistry:
+    """Шаблони бота, що обробляє оновлення: з файлів TEMPLATES_DIR, власні тексти бота (BOTS_CONFIG) або спільні."""
+    return template_version(context).registry
+
+def replies(context: ContextTypes.DEFAULT_TYPE) -> MappingProxyType:
+    """Статичні відповіді, зібрані з шаблонів цього бота (див. `texts`)."""
+    return template_version(context).replies
+
+def take_session_data(context: ContextTypes.DEFAULT_TYPE, key: str) -> dict:
+    """
+    Забирає відповіді завершеного діалогу й очищає user_data. Версія шаблонів діалогу
+    лишається за `context` до кінця обробки, тож документ збирається тими ж шаблонами.
+    """
+    context.session_templates = template_version(context)
+    data_raw = context.user_data[key]
+    clear_user_data(context)
+    return data_raw
+
 async def delete_main_message(context: ContextTypes.DEFAULT_TYPE, message_id: int = None) -> None:
     msg_id_to_delete = message_id or context.user_data.pop('main_message_id', None)
     chat_id = context._chat_id
@@ -196,14 +239,7 @@ async def delete_user_text_reply(update: Update) -> None:
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     clear_user_data(context)
     query = update.callback_query
-    
-    text = (
-        "👋 <b>Привіт! Я — Privacy Sentry.</b>\n\n"
-        "Я допоможу вам зробити ваш студентський проєкт безпечним та законним. "
-        "Я не зберігаю ваші дані («stateless»), тому ми будемо працювати крок за кроком.\n\n"
-        "👇 <b>Ваша Дорожня Карта (натискайте по черзі):</b>"
-    )
-    reply_markup = get_main_menu_keyboard()
+    reply = replies(context)['WELCOME']
 
     if query:
         try:
@@ -211,38 +247,53 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             if query.data in ("start_menu", "start_menu_post_generation"):
                 await delete_main_message(context, query.message.message_id)
             
-            await context.bot.send_message(chat_id=query.message.chat_id, text=text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+            await context.bot.send_message(chat_id=query.message.chat_id, **reply.kwargs)
         except BadRequest:
-            await context.bot.send_message(chat_id=query.message.chat_id, text=text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+            await context.bot.send_message(chat_id=query.message.chat_id, **reply.kwargs)
     else:
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+        await update.message.reply_text(**reply.kwargs)
             
     return ConversationHandler.END 
 
 async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message: return 
-    await update.message.reply_text(templates.BOT_HELP, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+    await update.message.reply_text(**replies(context)['HELP'].kwargs)
 
 async def show_privacy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message: return
-    await update.message.reply_text(templates.BOT_PRIVACY_POLICY, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+    await update.message.reply_text(**replies(context)['PRIVACY'].kwargs)
 
 async def show_help_inline(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
-    keyboard = [[InlineKeyboardButton("⬅️ Назад в меню", callback_data="start_menu")]]
     try:
-        await query.edit_message_text(templates.BOT_HELP, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+        await query.edit_message_text(**replies(context)['HELP_INLINE'].kwargs)
     except BadRequest: pass
 
 async def show_privacy_inline(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
-    keyboard = [[InlineKeyboardButton("⬅️ Назад в меню", callback_data="start_menu")]]
     try:
-        await query.edit_message_text(templates.BOT_PRIVACY_POLICY, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+        await query.edit_message_text(**replies(context)['PRIVACY_INLINE'].kwargs)
     except BadRequest: pass
 
+async def _send_kit(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    await context.bot.send_message(chat_id=chat_id, text=texts(context).KIT_INTRO(), parse_mode=ParseMode.HTML)
+    try:
+        await kit_cache.send(context.bot, chat_id)
+    except Exception as e:
+        logger.error("Не вдалося надіслати кіт: %s", e, exc_info=True)
+        await context.bot.send_message(chat_id=chat_id, text="❌ Не вдалося надіслати шаблони. Спробуйте пізніше.")
+
+async def show_kit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not update.message: return
+    await _send_kit(context, update.message.chat_id)
+
+async def show_kit_inline(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    await _send_kit(context, query.message.chat_id)
+
 class _FakeUpdate:
     def __init__(self, chat_id, bot):
         self.callback_query = None
@@ -254,11 +305,18 @@ class _FakeUpdate:
         class _Chat:
             def __init__(self, chat_id):
                 self.id = chat_id
-        async def reply_text(self, text, reply_markup, parse_mode):
-            await self._bot.send_message(chat_id=self.chat.id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+        async def reply_text(self, text, **kwargs):
+            await self._bot.send_message(chat_id=self.chat.id, text=text, **kwargs)
+
+def render_owner(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> tuple:
+    """Ключ рендерів чату в черзі: /cancel у цьому чаті зупиняє їх (бот + чат, бо ботів може бути кілька)."""
+    return (context.bot.id, chat_id)
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     clear_user_data(context)
+    if update.effective_chat:
+        # Документ, що ще рендериться, вже не потрібен — звільняємо рендерер для інших
+        render_queue.cancel(render_owner(context, update.effective_chat.id))
     query = update.callback_query
     message = update.message
     cancel_text = "🚫 Дію скасовано. Усі дані з пам'яті видалено."
@@ -327,11 +385,21 @@ async def cancel_from_block(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 def get_policy_template_data(data: dict) -> dict:
     return {
-        'project_name': safe_user_input(data.get('project_name', '...')),
-        'contact': safe_user_input(data.get('contact', '...')),
-        'data_collected': safe_user_input(data.get('data_collected', '...')),
-        'data_storage': safe_user_input(data.get('data_storage', '...')),
-        'delete_mechanism': safe_user_input(data.get('delete_mechanism', '...')),
+        'project_name': session_escape_html(data, 'project_name', '...'),
+        'contact': session_escape_html(data, 'contact', '...'),
+        'data_collected': session_escape_html(data, 'data_collected', '...'),
+        'data_storage': session_escape_html(data, 'data_storage', '...'),
+        'delete_mechanism': session_escape_html(data, 'delete_mechanism', '...'),
+    }
+
+def get_policy_pdf_data(data_raw: dict) -> dict:
+    return {
+        'project_name': safe_pdf_field(data_raw.get('project_name', '[Назва]')),
+        'contact': safe_pdf_field(data_raw.get('contact', '[Контакт]')),
+        'data_collected': safe_pdf_field(data_raw.get('data_collected', '[Дані]')),
+        'data_storage': safe_pdf_field(data_raw.get('data_storage', '[Зберігання]')),
+        'delete_mechanism': safe_pdf_field(data_raw.get('delete_mechanism', '[Видалення]')),
+        'date': date.today().strftime("%d.%m.%Y"),
     }
 
 async def start_policy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -339,7 +407,7 @@ async def start_policy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     await query.answer()
     clear_user_data(context)
     context.user_data['policy'] = {}
-    text = templates.POLICY_Q_PROJECT_NAME
+    text = texts(context).POLICY_Q_PROJECT_NAME()
     await edit_main_message(context, text, new_message=True)
     context.user_data['current_state'] = POLICY_Q_CONTACT
     return POLICY_Q_CONTACT
@@ -352,7 +420,7 @@ async def start_policy_from_upsell(update: Update, context: ContextTypes.DEFAULT
 async def policy_q_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['policy']['project_name'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.POLICY_Q_CONTACT.format(**get_policy_template_data(context.user_data['policy']))
+    text = texts(context).POLICY_Q_CONTACT(**get_policy_template_data(context.user_data['policy']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = POLICY_Q_DATA_COLLECTED
     return POLICY_Q_DATA_COLLECTED
@@ -360,7 +428,7 @@ async def policy_q_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 async def policy_q_data_collected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['policy']['contact'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.POLICY_Q_DATA_COLLECTED.format(**get_policy_template_data(context.user_data['policy']))
+    text = texts(context).POLICY_Q_DATA_COLLECTED(**get_policy_template_data(context.user_data['policy']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = POLICY_Q_DATA_STORAGE
     return POLICY_Q_DATA_STORAGE
@@ -368,7 +436,7 @@ async def policy_q_data_collected(update: Update, context: ContextTypes.DEFAULT_
 async def policy_q_data_storage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['policy']['data_collected'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.POLICY_Q_DATA_STORAGE.format(**get_policy_template_data(context.user_data['policy']))
+    text = texts(context).POLICY_Q_DATA_STORAGE(**get_policy_template_data(context.user_data['policy']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = POLICY_Q_DELETE_MECHANISM
     return POLICY_Q_DELETE_MECHANISM
@@ -376,7 +444,7 @@ async def policy_q_data_storage(update: Update, context: ContextTypes.DEFAULT_TY
 async def policy_q_delete_mechanism(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['policy']['data_storage'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.POLICY_Q_DELETE_MECHANISM.format(**get_policy_template_data(context.user_data['policy']))
+    text = texts(context).POLICY_Q_DELETE_MECHANISM(**get_policy_template_data(context.user_data['policy']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = POLICY_GENERATE
     return POLICY_GENERATE
@@ -386,40 +454,8 @@ async def policy_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = update.effective_user.id
     await delete_user_text_reply(update)
     await delete_main_message(context)
-    generating_msg = await update.message.reply_text("⏳ Генерую ваш PDF...")
-
-    data_raw = context.user_data['policy']
-    data_dict = {
-        'project_name': safe_pdf_input(data_raw.get('project_name', '[Назва]')),
-        'contact': safe_pdf_input(data_raw.get('contact', '[Контакт]')),
-        'data_collected': safe_pdf_input(data_raw.get('data_collected', '[Дані]')),
-        'data_storage': safe_pdf_input(data_raw.get('data_storage', '[Зберігання]')),
-        'delete_mechanism': safe_pdf_input(data_raw.get('delete_mechanism', '[Видалення]')),
-        'date': date.today().strftime("%d.%m.%Y"),
-    }
-    clear_user_data(context)
-
-    try:
-        filled_markdown = templates.POLICY_TEMPLATE.format(**data_dict)
-        pdf_path = create_pdf_from_markdown(filled_markdown, is_html=False, output_filename=f"policy_{user_id}.pdf")
-        await context.bot.send_document(chat_id=update.message.chat_id, document=open(pdf_path, 'rb'))
-        
-        upsell_msg = await context.bot.send_message(
-            chat_id=update.message.chat_id,
-            text=templates.POST_POLICY_UPSELL,
-            reply_markup=get_policy_upsell_keyboard(),
-            parse_mode=ParseMode.HTML
-        )
-        context.user_data['main_message_id'] = upsell_msg.message_id
-        clear_temp_file(pdf_path)
-    except Exception as e:
-        logger.error(f"Error: {e}")
-        await update.message.reply_text("Сталася помилка при генерації.")
-        await start(_FakeUpdate(update.message.chat.id, context.bot), context)
-    finally:
-        try: await generating_msg.delete()
-        except: pass
-        return ConversationHandler.END
+    data_raw = take_session_data(context, 'policy')
+    return await generate_document(context, update.message.chat_id, user_id, 'policy', data_raw)
 
 # === 5. DPIA ===
 
@@ -432,27 +468,70 @@ def get_dpia_template_data(data: dict) -> dict:
              minimization_text += f"\n<b>{i+1}. {safe_user_input(item)}:</b> [Очікує...] "
     else:
         for i, item_data in enumerate(minimization_data):
-            item = safe_user_input(item_data['item'])
-            reason = safe_user_input(item_data['reason'])
+            item = session_escape_html(item_data, 'item')
+            reason = session_escape_html(item_data, 'reason')
             if item_data['needed']:
                 minimization_text += f"\n<b>{i+1}. {item}:</b> ✅ <b>Так</b> (Навіщо: <code>{reason}</code>)"
             else:
                 minimization_text += f"\n<b>{i+1}. {item}:</b> ❌ <b>Ні</b> (<code>{reason}</code>)"
 
     raw_list = data.get('data_list', [])
-    formatted_list = "\n".join([f"• <code>{safe_user_input(i)}</code>" for i in raw_list])
+    formatted_list = session_memo(
+        data, 'data_list', tuple(raw_list),
+        lambda items: "\n".join([f"• <code>{safe_user_input(i)}</code>" for i in items])
+    )
+    if data.get('data_list_dropped'):
+        formatted_list += f"\n<i>… ще {data['data_list_dropped']} пункт(ів) не враховано (ліміт {len(raw_list)})</i>"
 
     return {
-        'project_name': safe_user_input(data.get('project_name', '...')),
-        'team': safe_user_input(data.get('team', '...')),
-        'goal': safe_user_input(data.get('goal', '...')),
+        'project_name': session_escape_html(data, 'project_name', '...'),
+        'team': session_escape_html(data, 'team', '...'),
+        'goal': session_escape_html(data, 'goal', '...'),
         'data_list': formatted_list, 
         'minimization_summary': minimization_text.strip(),
-        'retention_period': safe_user_input(data.get('retention_period', '...')),
-        'retention_mechanism': safe_user_input(data.get('retention_mechanism', '...')),
-        'storage': safe_user_input(data.get('storage', '...')),
-        'risk': safe_user_input(data.get('risk', '...')),
-        'mitigation': safe_user_input(data.get('mitigation', '...')),
+        'retention_period': session_escape_html(data, 'retention_period', '...'),
+        'retention_mechanism': session_escape_html(data, 'retention_mechanism', '...'),
+        'storage': session_escape_html(data, 'storage', '...'),
+        'risk': session_escape_html(data, 'risk', '...'),
+        'mitigation': session_escape_html(data, 'mitigation', '...'),
+    }
+
+def get_dpia_pdf_data(data_raw: dict) -> dict:
+    table_rows = []
+    table_rows.append(f"| Назва проєкту: | {safe_pdf_field(data_raw.get('project_name'))} |")
+    table_rows.append(f"| Керівник/Розробник: | {safe_pdf_field(data_raw.get('team'))} |")
+    table_rows.append(f"| Мета: | {safe_pdf_field(data_raw.get('goal'))} |")
+    
+    minimization_data, dropped = limit_items(data_raw.get('minimization_data', []))
+    if not minimization_data:
+        table_rows.append("| Дані: | [Не вказано] |")
+    else:
+        for i, item in enumerate(minimization_data):
+            data_name = f"Дані (пункт {i+1}):"
+            item_name = safe_pdf_field(item['item'])
+            item_reason = safe_pdf_field(item['reason'])
+            if item['needed']:
+                data_value = f"{item_name} (✅ **Навіщо:** {item_reason})"
+            else:
+                data_value = f"~~{item_name}~~ (❌ **Відмовлено**)"
+            table_rows.append(f"| {data_name} | {data_value} |")
+    dropped += data_raw.get('data_list_dropped', 0)
+    if dropped:
+        table_rows.append(f"| Дані (решта): | [Ще {dropped} пункт(ів) не включено — ліміт {len(minimization_data)}] |")
+
+    table_rows.append(f"| Строк Зберігання: | {safe_pdf_field(data_raw.get('retention_period'))} |")
+    table_rows.append(f"| Механізм Видалення: | {safe_pdf_field(data_raw.get('retention_mechanism'))} |")
+    table_rows.append(f"| Місце Зберігання: | {safe_pdf_field(data_raw.get('storage'))} |")
+    table_rows.append(f"| Головний Ризик: | {safe_pdf_field(data_raw.get('risk'))} |")
+    table_rows.append(f"| Мінімізація Ризику: | {safe_pdf_field(data_raw.get('mitigation'))} |")
+
+    table_header = "| Питання | Відповідь |\n| :--- | :--- |\n"
+    dpia_table_string = table_header + "\n".join(table_rows)
+    
+    return {
+        'project_name': safe_pdf_field(data_raw.get('project_name')),
+        'date': date.today().strftime("%d.%m.%Y"),
+        'dpia_table': dpia_table_string
     }
 
 async def start_dpia(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -460,7 +539,7 @@ async def start_dpia(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await query.answer()
     clear_user_data(context)
     context.user_data['dpia'] = {'minimization_data': [], 'data_list': [], 'current_data_index': 0}
-    text = templates.DPIA_Q_PROJECT_NAME
+    text = texts(context).DPIA_Q_PROJECT_NAME()
     await edit_main_message(context, text, new_message=True)
     context.user_data['current_state'] = DPIA_Q_TEAM
     return DPIA_Q_TEAM
@@ -468,7 +547,7 @@ async def start_dpia(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def dpia_q_team(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['dpia']['project_name'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.DPIA_Q_TEAM.format(**get_dpia_template_data(context.user_data['dpia']))
+    text = texts(context).DPIA_Q_TEAM(**get_dpia_template_data(context.user_data['dpia']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = DPIA_Q_GOAL
     return DPIA_Q_GOAL
@@ -476,7 +555,7 @@ async def dpia_q_team(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 async def dpia_q_goal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['dpia']['team'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.DPIA_Q_GOAL.format(**get_dpia_template_data(context.user_data['dpia']))
+    text = texts(context).DPIA_Q_GOAL(**get_dpia_template_data(context.user_data['dpia']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = DPIA_Q_DATA_LIST
     return DPIA_Q_DATA_LIST
@@ -484,7 +563,7 @@ async def dpia_q_goal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 async def dpia_q_data_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['dpia']['goal'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.DPIA_Q_DATA_LIST.format(**get_dpia_template_data(context.user_data['dpia']))
+    text = texts(context).DPIA_Q_DATA_LIST(**get_dpia_template_data(context.user_data['dpia']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = DPIA_Q_MINIMIZATION_START
     return DPIA_Q_MINIMIZATION_START
@@ -493,11 +572,13 @@ async def dpia_q_minimization_start(update: Update, context: ContextTypes.DEFAUL
     data_list = [item.strip() for item in update.message.text.split('\n') if item.strip()]
     await delete_user_text_reply(update)
     if not data_list:
-        text = templates.DPIA_Q_DATA_LIST_ERROR
+        text = texts(context).DPIA_Q_DATA_LIST_ERROR()
         await edit_main_message(context, text)
         context.user_data['current_state'] = DPIA_Q_MINIMIZATION_START
         return DPIA_Q_MINIMIZATION_START
+    data_list, dropped = limit_items(data_list)
     context.user_data['dpia']['data_list'] = data_list
+    context.user_data['dpia']['data_list_dropped'] = dropped
     context.user_data['dpia']['current_data_index'] = 0
     context.user_data['dpia']['minimization_data'] = []
     return await dpia_ask_minimization_status(context)
@@ -516,7 +597,7 @@ async def dpia_ask_minimization_status(context: ContextTypes.DEFAULT_TYPE) -> in
     
     safe_item = f"<code>{safe_user_input(current_data_item)}</code>"
     
-    text = templates.DPIA_Q_MINIMIZATION_ASK.format(
+    text = texts(context).DPIA_Q_MINIMIZATION_ASK(
         **template_data,
         count=f"{index + 1}/{len(data_list)}",
         item=safe_item
@@ -534,7 +615,7 @@ async def dpia_q_minimization_reason(update: Update, context: ContextTypes.DEFAU
     if query.data == "min_yes":
         context.user_data['dpia']['minimization_data'].append({"item": current_data_item, "needed": True, "reason": ""})
         template_data = get_dpia_template_data(context.user_data['dpia'])
-        text = templates.DPIA_Q_MINIMIZATION_REASON.format(**template_data, item=safe_item)
+        text = texts(context).DPIA_Q_MINIMIZATION_REASON(**template_data, item=safe_item)
         await edit_main_message(context, text)
         context.user_data['current_state'] = DPIA_Q_MINIMIZATION_STATUS
         return DPIA_Q_MINIMIZATION_STATUS
@@ -552,7 +633,7 @@ async def dpia_q_minimization_status(update: Update, context: ContextTypes.DEFAU
     return await dpia_ask_minimization_status(context)
 
 async def dpia_minimization_finished(context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = templates.DPIA_Q_RETENTION_PERIOD.format(**get_dpia_template_data(context.user_data['dpia']))
+    text = texts(context).DPIA_Q_RETENTION_PERIOD(**get_dpia_template_data(context.user_data['dpia']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = DPIA_Q_RETENTION_MECHANISM
     return DPIA_Q_RETENTION_MECHANISM
@@ -560,7 +641,7 @@ async def dpia_minimization_finished(context: ContextTypes.DEFAULT_TYPE) -> int:
 async def dpia_q_retention_mechanism(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['dpia']['retention_period'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.DPIA_Q_RETENTION_MECHANISM.format(**get_dpia_template_data(context.user_data['dpia']))
+    text = texts(context).DPIA_Q_RETENTION_MECHANISM(**get_dpia_template_data(context.user_data['dpia']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = DPIA_Q_STORAGE
     return DPIA_Q_STORAGE
@@ -568,7 +649,7 @@ async def dpia_q_retention_mechanism(update: Update, context: ContextTypes.DEFAU
 async def dpia_q_storage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['dpia']['retention_mechanism'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.DPIA_Q_STORAGE.format(**get_dpia_template_data(context.user_data['dpia']))
+    text = texts(context).DPIA_Q_STORAGE(**get_dpia_template_data(context.user_data['dpia']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = DPIA_Q_RISK
     return DPIA_Q_RISK
@@ -576,7 +657,7 @@ async def dpia_q_storage(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 async def dpia_q_risk(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['dpia']['storage'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.DPIA_Q_RISK.format(**get_dpia_template_data(context.user_data['dpia']))
+    text = texts(context).DPIA_Q_RISK(**get_dpia_template_data(context.user_data['dpia']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = DPIA_Q_MITIGATION
     return DPIA_Q_MITIGATION
@@ -584,7 +665,7 @@ async def dpia_q_risk(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 async def dpia_q_mitigation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['dpia']['risk'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.DPIA_Q_MITIGATION.format(**get_dpia_template_data(context.user_data['dpia']))
+    text = texts(context).DPIA_Q_MITIGATION(**get_dpia_template_data(context.user_data['dpia']))
     await edit_main_message(context, text)
     context.user_data['current_state'] = DPIA_GENERATE
     return DPIA_GENERATE
@@ -594,65 +675,8 @@ async def dpia_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     user_id = update.effective_user.id
     await delete_user_text_reply(update)
     await delete_main_message(context)
-    generating_msg = await update.message.reply_text("⏳ Генерую ваш PDF...")
-
-    data_raw = context.user_data['dpia']
-    table_rows = []
-    table_rows.append(f"| Назва проєкту: | {safe_pdf_input(data_raw.get('project_name'))} |")
-    table_rows.append(f"| Керівник/Розробник: | {safe_pdf_input(data_raw.get('team'))} |")
-    table_rows.append(f"| Мета: | {safe_pdf_input(data_raw.get('goal'))} |")
-    
-    minimization_data = data_raw.get('minimization_data', [])
-    if not minimization_data:
-        table_rows.append("| Дані: | [Не вказано] |")
-    else:
-        for i, item in enumerate(minimization_data):
-            data_name = f"Дані (пункт {i+1}):"
-            item_name = safe_pdf_input(item['item'])
-            item_reason = safe_pdf_input(item['reason'])
-            if item['needed']:
-                data_value = f"{item_name} (✅ **Навіщо:** {item_reason})"
-            else:
-                data_value = f"~~{item_name}~~ (❌ **Відмовлено**)"
-            table_rows.append(f"| {data_name} | {data_value} |")
-
-    table_rows.append(f"| Строк Зберігання: | {safe_pdf_input(data_raw.get('retention_period'))} |")
-    table_rows.append(f"| Механізм Видалення: | {safe_pdf_input(data_raw.get('retention_mechanism'))} |")
-    table_rows.append(f"| Місце Зберігання: | {safe_pdf_input(data_raw.get('storage'))} |")
-    table_rows.append(f"| Головний Ризик: | {safe_pdf_input(data_raw.get('risk'))} |")
-    table_rows.append(f"| Мінімізація Ризику: | {safe_pdf_input(data_raw.get('mitigation'))} |")
-
-    table_header = "| Питання | Відповідь |\n| :--- | :--- |\n"
-    dpia_table_string = table_header + "\n".join(table_rows)
-    
-    data_dict = {
-        'project_name': safe_pdf_input(data_raw.get('project_name')),
-        'date': date.today().strftime("%d.%m.%Y"),
-        'dpia_table': dpia_table_string
-    }
-    clear_user_data(context)
-
-    try:
-        filled_markdown = templates.DPIA_TEMPLATE.format(**data_dict)
-        pdf_path = create_pdf_from_markdown(filled_markdown, is_html=False, output_filename=f"dpia_{user_id}.pdf")
-        await context.bot.send_document(chat_id=update.message.chat_id, document=open(pdf_path, 'rb'))
-        
-        upsell_msg = await context.bot.send_message(
-            chat_id=update.message.chat_id,
-            text=templates.POST_DPIA_UPSELL, 
-            reply_markup=get_dpia_upsell_keyboard(),
-            parse_mode=ParseMode.HTML
-        )
-        context.user_data['main_message_id'] = upsell_msg.message_id
-        clear_temp_file(pdf_path)
-    except Exception as e:
-        logger.error(f"Error: {e}")
-        await update.message.reply_text("Сталася помилка при генерації.")
-        await start(_FakeUpdate(update.message.chat.id, context.bot), context)
-    finally:
-        try: await generating_msg.delete()
-        except: pass
-        return ConversationHandler.END
+    data_raw = take_session_data(context, 'dpia')
+    return await generate_document(context, update.message.chat_id, user_id, 'dpia', data_raw)
 
 # === 6. Checklist (v4.8 - FIXED) ===
 
@@ -661,13 +685,14 @@ def get_status_text_html(status: str) -> str:
     elif status == "no": return "❌ <b>Не виконано</b>"
     return "" 
 
-def get_note_text_html(note: str) -> str:
+def get_note_text_html(cl_data: dict, note_key: str) -> str:
+    note = cl_data.get(note_key, '')
     if not note: return ""
     if note == "*Пропущено*": return "Нотатка: <i>Пропущено</i>"
-    return f"Нотатка: <code>{safe_user_input(note)}</code>"
+    return f"Нотатка: <code>{session_escape_html(cl_data, note_key)}</code>"
 
 def get_checklist_summary_text(cl_data: dict) -> str:
-    summary = f"✅ <b>Назва Проєкту:</b> <code>{safe_user_input(cl_data.get('project_name', '...'))}</code>\n\n"
+    summary = f"✅ <b>Назва Проєкту:</b> <code>{session_escape_html(cl_data, 'project_name', '...')}</code>\n\n"
     
     items = [
         ('c1_s1', "1.1. 2FA"),
@@ -700,32 +725,62 @@ def get_checklist_summary_text(cl_data: dict) -> str:
 
             summary += f"<b>{name}:</b> {get_status_text_html(status_val)}\n"
             if note_val:
-                summary += f"{get_note_text_html(note_val)}\n"
+                summary += f"{get_note_text_html(cl_data, note_key)}\n"
                 
     return summary.strip()
 
 def get_checklist_template_data(cl_data: dict) -> dict:
     return {
-        'project_name': safe_user_input(cl_data.get('project_name', '...')),
+        'project_name': session_escape_html(cl_data, 'project_name', '...'),
         'summary_text': get_checklist_summary_text(cl_data),
         'c1_s1_status': get_status_text_html(cl_data.get('c1_s1_status', '')),
-        'c1_s1_note': get_note_text_html(cl_data.get('c1_s1_note', '')),
+        'c1_s1_note': get_note_text_html(cl_data, 'c1_s1_note'),
         'c1_s2_status': get_status_text_html(cl_data.get('c1_s2_status', '')),
-        'c1_s2_note': get_note_text_html(cl_data.get('c1_s2_note', '')),
+        'c1_s2_note': get_note_text_html(cl_data, 'c1_s2_note'),
         'c1_s3_status': get_status_text_html(cl_data.get('c1_s3_status', '')),
-        'c1_s3_note': get_note_text_html(cl_data.get('c1_s3_note', '')),
+        'c1_s3_note': get_note_text_html(cl_data, 'c1_s3_note'),
         'c2_s1_status': get_status_text_html(cl_data.get('c2_s1_status', '')),
-        'c2_s1_note': get_note_text_html(cl_data.get('c2_s1_note', '')),
+        'c2_s1_note': get_note_text_html(cl_data, 'c2_s1_note'),
         'c2_s2_status': get_status_text_html(cl_data.get('c2_s2_status', '')),
-        'c2_s2_note': get_note_text_html(cl_data.get('c2_s2_note', '')),
+        'c2_s2_note': get_note_text_html(cl_data, 'c2_s2_note'),
         'c2_s3_status': get_status_text_html(cl_data.get('c2_s3_status', '')),
-        'c2_s3_note': get_note_text_html(cl_data.get('c2_s3_note', '')),
+        'c2_s3_note': get_note_text_html(cl_data, 'c2_s3_note'),
         'c3_s1_status': get_status_text_html(cl_data.get('c3_s1_status', '')),
-        'c3_s1_note': get_note_text_html(cl_data.get('c3_s1_note', '')),
+        'c3_s1_note': get_note_text_html(cl_data, 'c3_s1_note'),
         'c3_s2_status': get_status_text_html(cl_data.get('c3_s2_status', '')),
-        'c3_s2_note': get_note_text_html(cl_data.get('c3_s2_note', '')),
+        'c3_s2_note': get_note_text_html(cl_data, 'c3_s2_note'),
         'c3_s3_status': get_status_text_html(cl_data.get('c3_s3_status', '')),
-        'c3_s3_note': get_note_text_html(cl_data.get('c3_s3_note', '')),
+        'c3_s3_note': get_note_text_html(cl_data, 'c3_s3_note'),
+    }
+
+def get_checklist_pdf_data(data: dict) -> dict:
+    def get_status_pdf(key): return "Виконано" if data.get(key)=="yes" else "Не виконано"
+    def get_note_pdf(key):
+        val = data.get(key, "*Не заповнено*")
+        if val == "*Пропущено*": return "Пропущено"
+        return safe_pdf_field(val)
+
+    rows = []
+    rows.append(f"| 1.1. 2FA | {get_status_pdf('c1_s1_status')} | {get_note_pdf('c1_s1_note')} |")
+    rows.append(f"| 1.2. Привілеї | {get_status_pdf('c1_s2_status')} | {get_note_pdf('c1_s2_note')} |")
+    rows.append(f"| 1.3. Публічні посилання | {get_status_pdf('c1_s3_status')} | {get_note_pdf('c1_s3_note')} |")
+    rows.append(f"| 2.1. Політика | {get_status_pdf('c2_s1_status')} | {get_note_pdf('c2_s1_note')} |")
+    rows.append(f"| 2.2. Видалення | {get_status_pdf('c2_s2_status')} | {get_note_pdf('c2_s2_note')} |")
+    rows.append(f"| 2.3. Контакт | {get_status_pdf('c2_s3_status')} | {get_note_pdf('c2_s3_note')} |")
+    rows.append(f"| 3.1. Токени | {get_status_pdf('c3_s1_status')} | {get_note_pdf('c3_s1_note')} |")
+    rows.append(f"| 3.2. Retention | {get_status_pdf('c3_s2_status')} | {get_note_pdf('c3_s2_note')} |")
+    rows.append(f"| 3.3. Шифрування | {get_status_pdf('c3_s3_status')} | {get_note_pdf('c3_s3_note')} |")
+    
+    header = "| Пункт | Статус | Нотатки |\n| :--- | :--- | :--- |\n"
+    c1 = "### Категорія 1: Контроль Доступу\n\n" + header + "\n".join(rows[0:3])
+    c2 = "\n\n### Категорія 2: Права Користувачів\n\n" + header + "\n".join(rows[3:6])
+    c3 = "\n\n### Категорія 3: Технічна Гігієна\n\n" + header + "\n".join(rows[6:9])
+    content = c1 + c2 + c3
+    
+    return {
+        'project_name': safe_pdf_field(data.get('project_name', '...')),
+        'date': date.today().strftime("%d.%m.%Y"),
+        'checklist_content': content 
     }
 
 def get_checklist_status_keyboard() -> InlineKeyboardMarkup:
@@ -744,7 +799,7 @@ async def start_checklist(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.answer()
     clear_user_data(context)
     context.user_data['cl'] = {} 
-    text = templates.CHECKLIST_Q_PROJECT_NAME
+    text = texts(context).CHECKLIST_Q_PROJECT_NAME()
     await edit_main_message(context, text, new_message=True)
     context.user_data['current_state'] = CHECKLIST_Q_PROJECT_NAME
     return CHECKLIST_Q_PROJECT_NAME
@@ -755,7 +810,7 @@ async def start_checklist_from_upsell(update: Update, context: ContextTypes.DEFA
     await delete_main_message(context, query.message.message_id) 
     clear_user_data(context)
     context.user_data['cl'] = {} 
-    text = templates.CHECKLIST_Q_PROJECT_NAME
+    text = texts(context).CHECKLIST_Q_PROJECT_NAME()
     await edit_main_message(context, text, new_message=True)
     context.user_data['current_state'] = CHECKLIST_Q_PROJECT_NAME
     return CHECKLIST_Q_PROJECT_NAME
@@ -763,7 +818,7 @@ async def start_checklist_from_upsell(update: Update, context: ContextTypes.DEFA
 async def checklist_q_project_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['cl']['project_name'] = update.message.text
     await delete_user_text_reply(update)
-    text = templates.CHECKLIST_C1_S1_STATUS.format(**get_checklist_template_data(context.user_data['cl']))
+    text = texts(context).CHECKLIST_C1_S1_STATUS(**get_checklist_template_data(context.user_data['cl']))
     await edit_main_message(context, text, get_checklist_status_keyboard())
     context.user_data['current_state'] = C1_S1_NOTE
     return C1_S1_NOTE
@@ -779,7 +834,7 @@ async def _handle_status(update, context, status_key, next_tmpl, next_state):
     # (v4.8 FIX) Explicitly add 'status' to template data
     td['status'] = get_status_text_html(status_val)
     
-    text = next_tmpl.format(**td)
+    text = next_tmpl(**td)
     await edit_main_message(context, text, get_skip_note_keyboard())
     context.user_data['current_state'] = next_state
     return next_state
@@ -794,80 +849,80 @@ async def _handle_note(update, context, note_key, next_tmpl, next_state, is_skip
         await delete_user_text_reply(update)
     
     td = get_checklist_template_data(context.user_data['cl'])
-    text = next_tmpl.format(**td)
+    text = next_tmpl(**td)
     await edit_main_message(context, text, get_checklist_status_keyboard())
     context.user_data['current_state'] = next_state
     return next_state
 
 # --- Category 1 ---
 async def checklist_c1_s1_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c1_s1_status', templates.CHECKLIST_C1_S1_NOTE, C1_S2_STATUS)
+    return await _handle_status(update, context, 'c1_s1_status', texts(context).CHECKLIST_C1_S1_NOTE, C1_S2_STATUS)
 
 async def checklist_c1_s2_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c1_s1_note', templates.CHECKLIST_C1_S2_STATUS, C1_S2_NOTE)
+    return await _handle_note(update, context, 'c1_s1_note', texts(context).CHECKLIST_C1_S2_STATUS, C1_S2_NOTE)
 async def checklist_c1_s2_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c1_s1_note', templates.CHECKLIST_C1_S2_STATUS, C1_S2_NOTE, True)
+    return await _handle_note(update, context, 'c1_s1_note', texts(context).CHECKLIST_C1_S2_STATUS, C1_S2_NOTE, True)
 
 async def checklist_c1_s2_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c1_s2_status', templates.CHECKLIST_C1_S2_NOTE, C1_S3_STATUS)
+    return await _handle_status(update, context, 'c1_s2_status', texts(context).CHECKLIST_C1_S2_NOTE, C1_S3_STATUS)
 
 async def checklist_c1_s3_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c1_s2_note', templates.CHECKLIST_C1_S3_STATUS, C1_S3_NOTE)
+    return await _handle_note(update, context, 'c1_s2_note', texts(context).CHECKLIST_C1_S3_STATUS, C1_S3_NOTE)
 async def checklist_c1_s3_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c1_s2_note', templates.CHECKLIST_C1_S3_STATUS, C1_S3_NOTE, True)
+    return await _handle_note(update, context, 'c1_s2_note', texts(context).CHECKLIST_C1_S3_STATUS, C1_S3_NOTE, True)
 
 async def checklist_c1_s3_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c1_s3_status', templates.CHECKLIST_C1_S3_NOTE, C2_S1_STATUS)
+    return await _handle_status(update, context, 'c1_s3_status', texts(context).CHECKLIST_C1_S3_NOTE, C2_S1_STATUS)
 
 # --- Category 2 ---
 async def checklist_c2_s1_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c1_s3_note', templates.CHECKLIST_C2_S1_STATUS, C2_S1_NOTE)
+    return await _handle_note(update, context, 'c1_s3_note', texts(context).CHECKLIST_C2_S1_STATUS, C2_S1_NOTE)
 async def checklist_c2_s1_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c1_s3_note', templates.CHECKLIST_C2_S1_STATUS, C2_S1_NOTE, True)
+    return await _handle_note(update, context, 'c1_s3_note', texts(context).CHECKLIST_C2_S1_STATUS, C2_S1_NOTE, True)
 
 async def checklist_c2_s1_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c2_s1_status', templates.CHECKLIST_C2_S1_NOTE, C2_S2_STATUS)
+    return await _handle_status(update, context, 'c2_s1_status', texts(context).CHECKLIST_C2_S1_NOTE, C2_S2_STATUS)
 
 async def checklist_c2_s2_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c2_s1_note', templates.CHECKLIST_C2_S2_STATUS, C2_S2_NOTE)
+    return await _handle_note(update, context, 'c2_s1_note', texts(context).CHECKLIST_C2_S2_STATUS, C2_S2_NOTE)
 async def checklist_c2_s2_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c2_s1_note', templates.CHECKLIST_C2_S2_STATUS, C2_S2_NOTE, True)
+    return await _handle_note(update, context, 'c2_s1_note', texts(context).CHECKLIST_C2_S2_STATUS, C2_S2_NOTE, True)
 
 async def checklist_c2_s2_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c2_s2_status', templates.CHECKLIST_C2_S2_NOTE, C2_S3_STATUS)
+    return await _handle_status(update, context, 'c2_s2_status', texts(context).CHECKLIST_C2_S2_NOTE, C2_S3_STATUS)
 
 async def checklist_c2_s3_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c2_s2_note', templates.CHECKLIST_C2_S3_STATUS, C2_S3_NOTE)
+    return await _handle_note(update, context, 'c2_s2_note', texts(context).CHECKLIST_C2_S3_STATUS, C2_S3_NOTE)
 async def checklist_c2_s3_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c2_s2_note', templates.CHECKLIST_C2_S3_STATUS, C2_S3_NOTE, True)
+    return await _handle_note(update, context, 'c2_s2_note', texts(context).CHECKLIST_C2_S3_STATUS, C2_S3_NOTE, True)
 
 async def checklist_c2_s3_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c2_s3_status', templates.CHECKLIST_C2_S3_NOTE, C3_S1_STATUS)
+    return await _handle_status(update, context, 'c2_s3_status', texts(context).CHECKLIST_C2_S3_NOTE, C3_S1_STATUS)
 
 # --- Category 3 ---
 async def checklist_c3_s1_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c2_s3_note', templates.CHECKLIST_C3_S1_STATUS, C3_S1_NOTE)
+    return await _handle_note(update, context, 'c2_s3_note', texts(context).CHECKLIST_C3_S1_STATUS, C3_S1_NOTE)
 async def checklist_c3_s1_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c2_s3_note', templates.CHECKLIST_C3_S1_STATUS, C3_S1_NOTE, True)
+    return await _handle_note(update, context, 'c2_s3_note', texts(context).CHECKLIST_C3_S1_STATUS, C3_S1_NOTE, True)
 
 async def checklist_c3_s1_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c3_s1_status', templates.CHECKLIST_C3_S1_NOTE, C3_S2_STATUS)
+    return await _handle_status(update, context, 'c3_s1_status', texts(context).CHECKLIST_C3_S1_NOTE, C3_S2_STATUS)
 
 async def checklist_c3_s2_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c3_s1_note', templates.CHECKLIST_C3_S2_STATUS, C3_S2_NOTE)
+    return await _handle_note(update, context, 'c3_s1_note', texts(context).CHECKLIST_C3_S2_STATUS, C3_S2_NOTE)
 async def checklist_c3_s2_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c3_s1_note', templates.CHECKLIST_C3_S2_STATUS, C3_S2_NOTE, True)
+    return await _handle_note(update, context, 'c3_s1_note', texts(context).CHECKLIST_C3_S2_STATUS, C3_S2_NOTE, True)
 
 async def checklist_c3_s2_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c3_s2_status', templates.CHECKLIST_C3_S2_NOTE, C3_S3_STATUS)
+    return await _handle_status(update, context, 'c3_s2_status', texts(context).CHECKLIST_C3_S2_NOTE, C3_S3_STATUS)
 
 async def checklist_c3_s3_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c3_s2_note', templates.CHECKLIST_C3_S3_STATUS, C3_S3_NOTE)
+    return await _handle_note(update, context, 'c3_s2_note', texts(context).CHECKLIST_C3_S3_STATUS, C3_S3_NOTE)
 async def checklist_c3_s3_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_note(update, context, 'c3_s2_note', templates.CHECKLIST_C3_S3_STATUS, C3_S3_NOTE, True)
+    return await _handle_note(update, context, 'c3_s2_note', texts(context).CHECKLIST_C3_S3_STATUS, C3_S3_NOTE, True)
 
 async def checklist_c3_s3_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await _handle_status(update, context, 'c3_s3_status', templates.CHECKLIST_C3_S3_NOTE, CHECKLIST_GENERATE)
+    return await _handle_status(update, context, 'c3_s3_status', texts(context).CHECKLIST_C3_S3_NOTE, CHECKLIST_GENERATE)
 
 async def checklist_generate_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['cl']['c3_s3_note'] = update.message.text
@@ -884,67 +939,420 @@ async def checklist_generate(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = context._user_id
     await delete_main_message(context)
     chat_id = update.message.chat_id if update.message else update.callback_query.message.chat_id
-    generating_msg = await context.bot.send_message(chat_id=chat_id, text="⏳ Генерую ваш PDF...")
+    data_raw = take_session_data(context, 'cl')
+    return await generate_document(context, chat_id, user_id, 'checklist', data_raw)
+
+# === 7. Генерація документів ===
+
+# Тип документа → (будівник даних PDF, шаблон, відповідь після успіху з static_replies)
+DOCUMENT_KINDS = {
+    'policy': (get_policy_pdf_data, 'POLICY_TEMPLATE', 'POST_POLICY_UPSELL'),
+    'dpia': (get_dpia_pdf_data, 'DPIA_TEMPLATE', 'POST_DPIA_UPSELL'),
+    'checklist': (get_checklist_pdf_data, 'CHECKLIST_TEMPLATE_PDF', 'POST_CHECKLIST_SUCCESS'),
+}
+
+def build_document_markdown(kind: str, data_raw: dict, registry: templates.TemplateRegistry = None) -> str:
+    build_pdf_data, template_name, _ = DOCUMENT_KINDS[kind]
+    return (registry or templates.compiled)[template_name](**build_pdf_data(data_raw))
+
+async def render_pdf_within_budget(filled_markdown: str, output_filename: str, on_progress=None, lane=None, owner=None) -> bytes:
+    """
+    Перевіряє бюджет документа, логує оцінку вартості та рендерить PDF у черзі (у пам'яті).
+    `lane` — бот, від якого рендер (черга чергує ботів), `owner` — чат, чий /cancel зупиняє рендер
+    (див. render_queue.py).
+    """
+    cost = enforce_document_budget(filled_markdown)
+    logger.info("Оцінка рендеру %s: %s", output_filename, cost, extra={"sample": True, "estimated_ms": cost.estimated_ms})
+    return await render_queue.render_pdf(filled_markdown, on_progress, lane=lane, owner=owner)
+
+# Формат видачі, який обирається командою /format (зберігається в chat_data)
+OUTPUT_FORMATS = {
+    'pdf': ("📄 PDF", ('pdf',)),
+    'xlsx': ("📊 XLSX", ('xlsx',)),
+    'both': ("📄 PDF + 📊 XLSX", ('pdf', 'xlsx')),
+    'html': ("🌐 HTML", ('html',)),
+    'md': ("📝 Markdown", ('md',)),
+}
+
+def get_output_formats(context: ContextTypes.DEFAULT_TYPE, kind: str) -> tuple:
+    chosen = (context.chat_data or {}).get('output_format', 'pdf')
+    formats = OUTPUT_FORMATS.get(chosen, OUTPUT_FORMATS['pdf'])[1]
+    # Політика — це текст, таблиці для неї немає
+    formats = tuple(f for f in formats if f != 'xlsx' or kind in XLSX_BUILDERS)
+    return formats or ('pdf',)
+
+def get_generating_text(formats: tuple, position: int = None, eta: int = None) -> str:
+    text = f"⏳ Генерую ваш {' + '.join(f.upper() for f in formats)}..."
+    if 'pdf' not in formats:
+        return text
+    if position is None:
+        position, eta = render_queue.estimate()
+    if position:
+        return f"{text}\nВи {position}-й у черзі, орієнтовно ~{eta} с."
+    return f"{text}\nОрієнтовно ~{eta} с."
+
+def keep_for_retry(context: ContextTypes.DEFAULT_TYPE, user_id: int, kind: str, data_raw: dict) -> None:
+    """
+    Зберігає відповіді для кнопки повтору генерації не довше RETRY_DOCUMENT_TTL секунд:
+    після цього їх прибирає `_expire_retry_document` (або /cancel — разом з усіма даними).
+    """
+    saved_at = time.time()
+    context.user_data['retry_document'] = {'kind': kind, 'data': data_raw, 'saved_at': saved_at}
+    if context.job_queue:
+        context.job_queue.run_once(_expire_retry_document, RETRY_DOCUMENT_TTL, data=saved_at, user_id=user_id)
+
+async def _expire_retry_document(context: ContextTypes.DEFAULT_TYPE) -> None:
+    pending = context.user_data.get('retry_document') if context.user_data is not None else None
+    # Новіша відмова зберегла свої відповіді й запланувала власне прибирання
+    if pending and pending.get('saved_at') == context.job.data:
+        del context.user_data['retry_document']
+
+def is_retry_expired(pending: dict) -> bool:
+    # Запис міг пережити своє прибирання (перезапуск зі збереженими сесіями, бот без job_queue)
+    return time.time() - pending.get('saved_at', 0) > RETRY_DOCUMENT_TTL
+
+async def generate_document(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, kind: str, data_raw: dict) -> int:
+    """Рендерить документ `kind` з сирих відповідей, надсилає файл(и) і наступний крок."""
+    wait = user_rate_limits.renders.acquire(user_id)
+    if wait:
+        # Ліміт генерацій (rate_limit.py): відповіді так само зберігаються для кнопки повтору
+        keep_for_retry(context, user_id, kind, data_raw)
+        await context.bot.send_message(
+            chat_id=chat_id, text=texts(context).RATE_LIMIT_RENDER_NOTICE(**get_cooldown_template_data({'seconds': wait})),
+            reply_markup=get_retry_generation_keyboard(),
+        )
+        return ConversationHandler.END
+    try:
+        with render_queue.admit():
+            return await _generate_admitted(context, chat_id, user_id, kind, data_raw)
+    except RenderQueueFull:
+        # Черга повна не з вини користувача — генерацію з його ліміту не списуємо
+        user_rate_limits.renders.refund(user_id)
+        # Відповіді не губимо: їх можна відправити в генерацію ще раз кнопкою
+        keep_for_retry(context, user_id, kind, data_raw)
+        await context.bot.send_message(
+            chat_id=chat_id, text=texts(context).RENDER_QUEUE_FULL_NOTICE(), reply_markup=get_retry_generation_keyboard()
+        )
+        return ConversationHandler.END
 
-    data = context.user_data['cl']
-    def get_status_pdf(key): return "Виконано" if data.get(key)=="yes" else "Не виконано"
-    def get_note_pdf(key):
-        val = data.get(key, "*Не заповнено*")
-        if val == "*Пропущено*": return "Пропущено"
-        return safe_pdf_input(val)
+async def _generate_admitted(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, kind: str, data_raw: dict) -> int:
+    formats = get_output_formats(context, kind)
+    if 'pdf' in formats and render_queue.is_saturated():
+        # Черга PDF переповнена — віддаємо той самий документ як HTML без PDF-рушія
+        logger.warning("Черга рендеру заповнена (%s), %s → HTML", render_queue.pending, kind)
+        formats = tuple(dict.fromkeys('html' if f == 'pdf' else f for f in formats))
+        await context.bot.send_message(chat_id=chat_id, text=texts(context).RENDER_FALLBACK_NOTICE())
+    generating_msg = await context.bot.send_message(chat_id=chat_id, text=get_generating_text(formats))
 
-    rows = []
-    rows.append(f"| 1.1. 2FA | {get_status_pdf('c1_s1_status')} | {get_note_pdf('c1_s1_note')} |")
-    rows.append(f"| 1.2. Привілеї | {get_status_pdf('c1_s2_status')} | {get_note_pdf('c1_s2_note')} |")
-    rows.append(f"| 1.3. Публічні посилання | {get_status_pdf('c1_s3_status')} | {get_note_pdf('c1_s3_note')} |")
-    rows.append(f"| 2.1. Політика | {get_status_pdf('c2_s1_status')} | {get_note_pdf('c2_s1_note')} |")
-    rows.append(f"| 2.2. Видалення | {get_status_pdf('c2_s2_status')} | {get_note_pdf('c2_s2_note')} |")
-    rows.append(f"| 2.3. Контакт | {get_status_pdf('c2_s3_status')} | {get_note_pdf('c2_s3_note')} |")
-    rows.append(f"| 3.1. Токени | {get_status_pdf('c3_s1_status')} | {get_note_pdf('c3_s1_note')} |")
-    rows.append(f"| 3.2. Retention | {get_status_pdf('c3_s2_status')} | {get_note_pdf('c3_s2_note')} |")
-    rows.append(f"| 3.3. Шифрування | {get_status_pdf('c3_s3_status')} | {get_note_pdf('c3_s3_note')} |")
-    
-    header = "| Пункт | Статус | Нотатки |\n| :--- | :--- | :--- |\n"
-    c1 = "### Категорія 1: Контроль Доступу\n\n" + header + "\n".join(rows[0:3])
-    c2 = "\n\n### Категорія 2: Права Користувачів\n\n" + header + "\n".join(rows[3:6])
-    c3 = "\n\n### Категорія 3: Технічна Гігієна\n\n" + header + "\n".join(rows[6:9])
-    content = c1 + c2 + c3
-    
-    data_dict = {
-        'project_name': safe_pdf_input(data.get('project_name', '...')),
-        'date': date.today().strftime("%d.%m.%Y"),
-        'checklist_content': content 
-    }
-    clear_user_data(context)
+    async def show_queue_position(position: int, eta: int) -> None:
+        try: await generating_msg.edit_text(get_generating_text(formats, position, eta))
+        except BadRequest: pass
 
     try:
-        filled_md = templates.CHECKLIST_TEMPLATE_PDF.format(**data_dict)
-        pdf_path = create_pdf_from_markdown(filled_md, False, f"checklist_{user_id}.pdf")
-        await context.bot.send_document(chat_id=chat_id, document=open(pdf_path, 'rb'))
-        
-        # Success Message + Button
-        upsell_msg = await context.bot.send_message(
-            chat_id=chat_id,
-            text=templates.POST_CHECKLIST_SUCCESS,
-            reply_markup=get_post_action_keyboard(),
-            parse_mode=ParseMode.HTML
+        # Рендер і надсилання відстежуються drain-ом: під час деплою їх дочекаються
+        await shutdown_drain.run(_deliver_document(context, chat_id, user_id, kind, formats, data_raw, show_queue_position))
+    except RenderCancelled:
+        # Користувач натиснув /cancel під час рендеру — відповідь про скасування вже надіслано
+        logger.info("Генерацію %s для %s скасовано користувачем", kind, user_id)
+    except DrainInterrupted:
+        logger.warning("Генерацію %s для %s перервано перезапуском", kind, user_id)
+        await context.bot.send_message(chat_id=chat_id, text=texts(context).DRAIN_INTERRUPTED_NOTICE())
+    except DocumentTooLarge as e:
+        logger.warning("Відмова в рендері: %s", e)
+        await context.bot.send_message(
+            chat_id=chat_id, text=texts(context).DOCUMENT_TOO_LARGE(**get_document_budget_template_data({'chars': e.cost.chars}))
         )
-        context.user_data['main_message_id'] = upsell_msg.message_id
-
-        clear_temp_file(pdf_path)
+        await start(_FakeUpdate(chat_id, context.bot), context)
     except Exception as e:
-        logger.error(f"Error: {e}")
-        await update.message.reply_text("Сталася помилка.")
+        logger.error("Error: %s", e)
+        await context.bot.send_message(chat_id=chat_id, text="Сталася помилка при генерації.")
         await start(_FakeUpdate(chat_id, context.bot), context)
-    
-    try: await generating_msg.delete()
-    except: pass
+    finally:
+        try: await generating_msg.delete()
+        except: pass
     return ConversationHandler.END
 
-def main():
-    application = Application.builder().token(BOT_TOKEN).build()
+async def _deliver_document(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, kind: str, formats: tuple, data_raw: dict, on_progress=None) -> None:
+    """Рендерить і надсилає файл(и) документа та наступний крок."""
+    _, _, success_text_name = DOCUMENT_KINDS[kind]
+    if 'xlsx' in formats:
+        try:
+            xlsx_bytes = XLSX_BUILDERS[kind](data_raw)
+        except XlsxUnavailable as e:
+            # Без openpyxl таблиці не буде — віддаємо той самий документ у PDF
+            logger.error("XLSX недоступний, %s → PDF: %s", kind, e)
+            await context.bot.send_message(chat_id=chat_id, text=texts(context).XLSX_UNAVAILABLE_NOTICE())
+            formats = tuple(dict.fromkeys(('pdf' if f == 'xlsx' else f) for f in formats))
+        else:
+            await context.bot.send_document(chat_id=chat_id, document=xlsx_bytes, filename=f"{kind}.xlsx")
+    if {'pdf', 'html', 'md'} & set(formats):
+        filled_markdown = build_document_markdown(kind, data_raw, texts(context))
+    if 'md' in formats:
+        enforce_document_budget(filled_markdown)
+        await context.bot.send_document(chat_id=chat_id, document=filled_markdown.encode("utf-8"), filename=f"{kind}.md")
+    if 'html' in formats:
+        enforce_document_budget(filled_markdown)
+        html_document = create_html_from_markdown(filled_markdown)
+        await context.bot.send_document(chat_id=chat_id, document=html_document.encode("utf-8"), filename=f"{kind}.html")
+    if 'pdf' in formats:
+        pdf_filename = f"{kind}_{user_id}.pdf"
+        try:
+            pdf_bytes = await render_pdf_within_budget(
+                filled_markdown, pdf_filename, on_progress, lane=context.bot.id, owner=render_owner(context, chat_id)
+            )
+        except PdfUnavailable as e:
+            # Усі PDF-бекенди недоступні (впали, зависли або розімкнені) — віддаємо HTML
+            logger.error("PDF недоступний, %s → HTML: %s", kind, e)
+            if 'html' not in formats:
+                await context.bot.send_message(chat_id=chat_id, text=texts(context).PDF_UNAVAILABLE_NOTICE())
+                html_document = create_html_from_markdown(filled_markdown)
+                await context.bot.send_document(chat_id=chat_id, document=html_document.encode("utf-8"), filename=f"{kind}.html")
+        else:
+            await context.bot.send_document(chat_id=chat_id, document=pdf_bytes, filename=pdf_filename)
+
+    upsell_msg = await context.bot.send_message(chat_id=chat_id, **replies(context)[success_text_name].kwargs)
+    context.user_data['main_message_id'] = upsell_msg.message_id
+
+async def retry_generation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Повторна спроба генерації, відхиленої через переповнену чергу або ліміт генерацій."""
+    query = update.callback_query
+    pending = context.user_data.pop('retry_document', None)
+    if not pending or is_retry_expired(pending):
+        await query.answer(texts(context).RETRY_EXPIRED_NOTICE(), show_alert=True)
+        return
+    await query.answer()
+    try: await query.message.delete()
+    except BadRequest: pass
+    await generate_document(context, query.message.chat_id, update.effective_user.id, pending['kind'], pending['data'])
+
+async def log_render_stats(context: ContextTypes.DEFAULT_TYPE) -> None:
+    stats = render_queue.stats()
+    last = context.bot_data.get('_last_render_stats')
+    # Пишемо лише коли щось відбувається
+    if stats['pending'] or last is None or (stats['completed_total'], stats['shed_total']) != last:
+        context.bot_data['_last_render_stats'] = (stats['completed_total'], stats['shed_total'])
+        logger.info("Черга рендеру: %s", stats)
+
+def get_output_format_keyboard(current: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(("• " if key == current else "") + label, callback_data=f"fmt_{key}")]
+        for key, (label, _) in OUTPUT_FORMATS.items()
+    ])
+
+async def choose_output_format(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not update.message: return
+    current = context.chat_data.get('output_format', 'pdf')
+    await update.message.reply_text(
+        texts(context).OUTPUT_FORMAT_PROMPT(), reply_markup=get_output_format_keyboard(current), parse_mode=ParseMode.HTML
+    )
+
+async def set_output_format(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    chosen = query.data.removeprefix("fmt_")
+    if chosen not in OUTPUT_FORMATS: return
+    context.chat_data['output_format'] = chosen
+    try:
+        await query.edit_message_text(
+            f"✅ Формат документів: <b>{OUTPUT_FORMATS[chosen][0]}</b>", parse_mode=ParseMode.HTML
+        )
+    except BadRequest: pass
+
+# === 8. Імпорт готових відповідей (.xlsx / JSON / YAML) ===
+
+async def _reject_import_during_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    if context.user_data.get('current_state') is None:
+        return False
+    await update.message.reply_text(
+        "⚠️ Ви вже заповнюєте документ у діалозі. Завершіть його або надішліть /cancel, а потім повторіть імпорт."
+    )
+    return True
+
+async def _generate_from_import(update: Update, context: ContextTypes.DEFAULT_TYPE, parse, *args) -> None:
+    try:
+        kind, data_raw = await asyncio.to_thread(parse, *args)
+    except StructuredInputError as e:
+        await update.message.reply_text(f"⚠️ {e}\n\nФормат описано в /import.")
+        return
+    await generate_document(context, update.message.chat_id, update.effective_user.id, kind, data_raw)
+
+async def import_document_upload(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Заповнений 1_dpia_lite.xlsx або файл .json/.yaml → одразу PDF."""
+    if await _reject_import_during_flow(update, context): return
+    document = update.message.document
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text("⚠️ Файл завеликий для імпорту.")
+        return
+    tg_file = await document.get_file()
+    content = bytes(await tg_file.download_as_bytearray())
+    await delete_user_text_reply(update)
+    await _generate_from_import(update, context, parse_upload, document.file_name, content)
+
+async def import_structured_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JSON- або YAML-повідомлення з відповідями → одразу PDF."""
+    if await _reject_import_during_flow(update, context): return
+    text = update.message.text
+    await delete_user_text_reply(update)
+    await _generate_from_import(update, context, parse_structured, text, "json" if text.lstrip().startswith("{") else "yaml")
+
+async def show_import_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not update.message: return
+    await update.message.reply_text(texts(context).BOT_IMPORT_HELP(), parse_mode=ParseMode.HTML)
+
+# === 9. Повтори, ліміти та drain під час перезапуску ===
+
+async def drop_duplicate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Відкидає повторні оновлення й подвійні натискання (див. dedup.py) до хендлерів і черги рендеру."""
+    if not update_deduplicator.is_duplicate(update, context.bot.id):
+        return
+    if update.callback_query:
+        # Лише прибираємо "годинник" на кнопці: перше натискання вже обробляється
+        try: await update.callback_query.answer()
+        except BadRequest: pass
+    raise ApplicationHandlerStop
+
+# Кнопки, з яких починається новий документ (entry points main_conv)
+FLOW_START_CALLBACKS = frozenset({
+    "start_policy", "start_dpia", "start_checklist", "start_checklist_upsell", "start_policy_upsell",
+})
+
+def get_cooldown_template_data(limit: dict) -> dict:
+    return {'wait': format_wait(limit.get('seconds', 0))}
+
+def get_document_budget_template_data(cost: dict) -> dict:
+    return {'chars': cost.get('chars', 0), 'limit': MAX_DOC_CHARS}
+
+async def enforce_rate_limits(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Ліміти користувача (див. rate_limit.py) до хендлерів: повідомлення й натискання, а також
+    початок нового документа. Попередження — лише перше за відмову поспіль, далі мовчки.
+    """
+    user = update.effective_user
+    if user is None:
+        return
+    query = update.callback_query
+    limiter, template_name = user_rate_limits.messages, 'RATE_LIMIT_MESSAGES_NOTICE'
+    wait = limiter.acquire(user.id)
+    if not wait and query and query.data in FLOW_START_CALLBACKS and context.user_data.get('current_state') is None:
+        limiter, template_name = user_rate_limits.flow_starts, 'RATE_LIMIT_FLOW_NOTICE'
+        wait = limiter.acquire(user.id)
+    if not wait:
+        return
+    notice = texts(context)[template_name](**get_cooldown_template_data({'seconds': wait})) \
+        if limiter.should_warn(user.id) else None
+    if query:
+        try: await query.answer(notice, show_alert=bool(notice))
+        except BadRequest: pass
+    elif notice and update.effective_message:
+        await update.effective_message.reply_text(notice)
+    raise ApplicationHandlerStop
+
+async def reject_new_sessions_while_draining(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Під час drain пропускає лише тих, хто вже посеред діалогу; решті — прохання повернутися згодом."""
+    if not shutdown_drain.draining:
+        return
+    if context.user_data is not None and context.user_data.get('current_state') is not None:
+        return
+    if update.callback_query:
+        await update.callback_query.answer(texts(context).DRAIN_NOTICE(), show_alert=True)
+    elif update.effective_message:
+        await update.effective_message.reply_text(texts(context).DRAIN_NOTICE())
+    raise ApplicationHandlerStop
+
+async def on_application_started(application: Application) -> None:
+    install_drain_signal_handlers(application)
+    template_watcher.start()
+    await health_monitor.start()
+
+async def on_application_stopped(application: Application) -> None:
+    # Робочі процеси спільні для всіх ботів процесу — зупиняє їх лише перший (як і post_init)
+    await render_worker_pool.close()
+
+# === 10. Перевірка шаблонів ===
+
+# (префікси шаблонів, будівник даних, додаткові ключі, що передаються в хендлерах)
+TEMPLATE_DATA_BUILDERS = [
+    (("POLICY_Q_",), get_policy_template_data, set()),
+    (("DPIA_Q_",), get_dpia_template_data, {'count', 'item'}),
+    (("CHECKLIST_C",), get_checklist_template_data, {'status'}),
+    (("POLICY_TEMPLATE",), get_policy_pdf_data, set()),
+    (("DPIA_TEMPLATE",), get_dpia_pdf_data, set()),
+    (("CHECKLIST_TEMPLATE_PDF",), get_checklist_pdf_data, set()),
+    (("RATE_LIMIT_",), get_cooldown_template_data, set()),
+    (("DOCUMENT_TOO_LARGE",), get_document_budget_template_data, set()),
+]
+
+def validate_templates(registry=None) -> None:
+    """
+    Звіряє плейсхолдери кожного скомпільованого шаблону з ключами,
+    які повертають будівники даних. Піднімає ValueError ще до старту бота,
+    а не `KeyError` посеред розмови.
+    """
+    registry = registry or templates.compiled
+    problems = []
+    for name, tpl in registry.items():
+        if not tpl.placeholders:
+            continue
+        binding = next((b for b in TEMPLATE_DATA_BUILDERS if name.startswith(b[0])), None)
+        if binding is None:
+            problems.append(f"{name}: немає будівника даних для {sorted(tpl.placeholders)}")
+            continue
+        _, builder, extra_keys = binding
+        missing = tpl.placeholders - set(builder({})) - extra_keys
+        if missing:
+            problems.append(f"{name}: {builder.__name__} не дає {sorted(missing)}")
+    if problems:
+        raise ValueError("Невідповідність плейсхолдерів у шаблонах:\n" + "\n".join(problems))
+
+# === 11. Холодний старт ===
+
+def log_startup_report() -> None:
+    parts = ", ".join(f"{name} {seconds:.3f}с" for name, seconds in STARTUP_TIMINGS.items())
+    logger.info("Холодний старт: %s", parts)
+
+async def warm_up_renderer_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Прогріває робочі процеси PDF-рендеру, не блокуючи event loop."""
+    try:
+        STARTUP_TIMINGS['warmup'] = await warm_up_renderer()
+    except Exception as e:
+        logger.warning("Прогрів рендерера не вдався: %s", e)
+    # Порожні PDF кіта — заздалегідь, щоб перший /kit не чекав на рендер
+    kit_started_at = time.perf_counter()
+    if await kit_cache.prerender():
+        STARTUP_TIMINGS['kit'] = time.perf_counter() - kit_started_at
+    log_startup_report()
+
+def build_application(token: str = None, request=None, get_updates_request=None, use_persistence: bool = True,
+                      template_overrides: dict = None, session_name: str = None) -> Application:
+    """
+    Application з усіма хендлерами, як у продакшені.
+    `request` / `get_updates_request` підміняють HTTP-транспорт Bot API (напр., у benchmarks/replay_harness.py
+    або спільний пул для кількох ботів); без них використовуються пули з http_pool.py.
+    `template_overrides` — власні тексти бота (див. `texts`), `session_name` — окремий файл сесій (multi_bot.py).
+    Піднімає ValueError, якщо плейсхолдери власних текстів не збігаються з даними.
+    """
+    builder = (
+        Application.builder().token(token or BOT_TOKEN)
+        .post_init(on_application_started)
+        .post_shutdown(on_application_stopped)
+        .concurrent_updates(PerUserUpdateProcessor(BOT_CONCURRENT_UPDATES))
+    )
+    if request is None:
+        builder = configure_requests(builder)
+    else:
+        builder = builder.request(request).get_updates_request(get_updates_request or request)
+    persistence = build_session_persistence(session_name) if use_persistence else None
+    if persistence:
+        builder = builder.persistence(persistence)
+    application = builder.build()
+    # Сховище версій шаблонів; файли з TEMPLATES_DIR підвантажує template_watcher (див. main)
+    application.bot_data['template_store'] = TemplateStore(
+        templates.compiled, template_overrides, validate_templates, sessions=application.user_data
+    )
     
     main_conv = ConversationHandler(
+        name="main_conv",
+        persistent=persistence is not None,
         entry_points=[
             CallbackQueryHandler(start_policy, pattern="^start_policy$"),
             CallbackQueryHandler(start_dpia, pattern="^start_dpia$"),
@@ -958,7 +1366,8 @@ def main():
             POLICY_Q_DATA_COLLECTED: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_q_data_collected)],
             POLICY_Q_DATA_STORAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_q_data_storage)],
             POLICY_Q_DELETE_MECHANISM: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_q_delete_mechanism)],
-            POLICY_GENERATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_generate)],
+            # Генерація не блокує (block=False): поки документ рендериться, діалог у стані WAITING
+            POLICY_GENERATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_generate, block=False)],
 
             # DPIA
             DPIA_Q_TEAM: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_team)],
@@ -971,7 +1380,7 @@ def main():
             DPIA_Q_STORAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_storage)],
             DPIA_Q_RISK: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_risk)],
             DPIA_Q_MITIGATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_mitigation)],
-            DPIA_GENERATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_generate)],
+            DPIA_GENERATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_generate, block=False)],
 
             # Checklist
             CHECKLIST_Q_PROJECT_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_q_project_name)],
@@ -1017,8 +1426,14 @@ def main():
             ],
             C3_S3_NOTE: [CallbackQueryHandler(checklist_c3_s3_note, pattern="^cl_(yes|no)$")],
             CHECKLIST_GENERATE: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_generate_from_text),
-                CallbackQueryHandler(checklist_generate_from_skip, pattern="^cl_skip_note$")
+                MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_generate_from_text, block=False),
+                CallbackQueryHandler(checklist_generate_from_skip, pattern="^cl_skip_note$", block=False)
+            ],
+            # Поки йде генерація, fallbacks не перевіряються — діалог приймає лише скасування
+            # (/cancel або кнопку "❌ Скасувати"); воно зупиняє рендер, див. render_queue.cancel
+            ConversationHandler.WAITING: [
+                CallbackQueryHandler(cancel_from_block, pattern="^cancel_from_block$"),
+                CommandHandler("cancel", cancel),
             ],
         },
         fallbacks=[
@@ -1028,6 +1443,9 @@ def main():
         ]
     )
     
+    application.add_handler(TypeHandler(Update, drop_duplicate_updates), group=-4)
+    application.add_handler(TypeHandler(Update, enforce_rate_limits), group=-3)
+    application.add_handler(TypeHandler(Update, reject_new_sessions_while_draining), group=-1)
     application.add_handler(main_conv)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CallbackQueryHandler(start, pattern="^start_menu$"))
@@ -1037,9 +1455,77 @@ def main():
     application.add_handler(CommandHandler("help", show_help))
     application.add_handler(CallbackQueryHandler(show_help_inline, pattern="^show_help$"))
     application.add_handler(CommandHandler("cancel", cancel))
+    application.add_handler(CommandHandler("import", show_import_help))
+    application.add_handler(CommandHandler("format", choose_output_format))
+    application.add_handler(CommandHandler("kit", show_kit))
+    application.add_handler(CallbackQueryHandler(show_kit_inline, pattern="^show_kit$"))
+    application.add_handler(CallbackQueryHandler(set_output_format, pattern="^fmt_"))
+    application.add_handler(CallbackQueryHandler(retry_generation, pattern="^retry_generation$", block=False))
+    application.add_handler(MessageHandler(
+        filters.Document.FileExtension("xlsx") | filters.Document.FileExtension("json")
+        | filters.Document.FileExtension("yaml") | filters.Document.FileExtension("yml"),
+        import_document_upload, block=False
+    ))
+    # JSON — з "{", YAML — з "document:" (див. /import)
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND & filters.Regex(r"^\s*(\{|(document|type)\s*:)"), import_structured_text, block=False
+    ))
+    return application
+
+def main():
+    try:
+        configs = load_bot_configs(BOT_TOKEN)
+    except (OSError, ValueError) as e:
+        logger.error("!!! Некоректний BOTS_CONFIG: %s !!!", e)
+        exit()
+    if not configs:
+        logger.error("!!! Змінна BOT_TOKEN не знайдена в .env файлі !!!")
+        exit()
+    validate_templates()
+    handlers_started_at = time.perf_counter()
+    shared = len(configs) > 1
+    # Один пул з'єднань до Bot API на всіх ботів; long poll у кожного свій
+    api_request = build_api_request() if shared else None
+    try:
+        applications = [
+            build_application(
+                config.token, api_request, build_get_updates_request() if shared else None,
+                template_overrides=config.templates, session_name=config.name if shared else None,
+            )
+            for config in configs
+        ]
+    except ValueError as e:
+        logger.error("!!! Некоректні шаблони бота в BOTS_CONFIG: %s !!!", e)
+        exit()
+    for application in applications:
+        health_monitor.attach(application)
+        template_watcher.attach(application.bot_data['template_store'])
+    if template_watcher.directory:
+        try:
+            template_watcher.load()
+        except (OSError, ValueError) as e:
+            logger.error("!!! Некоректні шаблони в TEMPLATES_DIR: %s !!!", e)
+            exit()
+    STARTUP_TIMINGS['handlers'] = time.perf_counter() - handlers_started_at
+    # Черга рендеру, робочі процеси і кіт спільні — фонові задачі запускає лише перший бот
+    application = applications[0]
+
+    if RENDER_STATS_INTERVAL > 0 and application.job_queue:
+        application.job_queue.run_repeating(log_render_stats, RENDER_STATS_INTERVAL, first=RENDER_STATS_INTERVAL)
+
+    if RENDER_WARMUP and application.job_queue:
+        # Задача стартує разом із run_polling / run_webhook
+        application.job_queue.run_once(warm_up_renderer_job, 0)
+    else:
+        log_startup_report()
 
     logger.info("Бот запускається...")
-    application.run_polling()
+    if len(applications) > 1:
+        logger.info("Ботів у процесі: %s (%s)", len(applications), ", ".join(config.name for config in configs))
+        run_applications(applications, BOT_POLL_TIMEOUT)
+        return
+    # Сигнали обробляє drain (див. on_application_started)
+    application.run_polling(stop_signals=None, timeout=BOT_POLL_TIMEOUT)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Бюджети вхідних даних для рендеру документів.
+
+Одна відповідь у Telegram може мати до 4096 символів, а список даних DPIA
+не має обмеження на кількість пунктів. Щоб один користувач не займав рендерер
+для всіх іншим багатосторінковим PDF, перед `create_pdf_from_markdown` діють ліміти:
+  - символів на одне поле (RENDER_MAX_FIELD_CHARS) — поле скорочується з позначкою;
+  - кількість пунктів у списку (RENDER_MAX_ITEMS) — зайві пункти відкидаються з позначкою;
+  - загальний розмір документа (RENDER_MAX_DOC_CHARS) — явна відмова (DocumentTooLarge).
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+
+logger = logging.getLogger("budgets")
+
+MAX_FIELD_CHARS = int(os.getenv("RENDER_MAX_FIELD_CHARS", "1000"))
+MAX_ITEMS = int(os.getenv("RENDER_MAX_ITEMS", "30"))
+MAX_DOC_CHARS = int(os.getenv("RENDER_MAX_DOC_CHARS", "40000"))
+
+TRUNCATION_NOTE = " … [скорочено]"
+
+# Грубі коефіцієнти для оцінки: скільки символів / рядків таблиці вміщує сторінка A4
+_CHARS_PER_PAGE = 2500
+_TABLE_ROWS_PER_PAGE = 25
+_MS_PER_PAGE = 150
+
+class DocumentTooLarge(Exception):
+    """Документ перевищує RENDER_MAX_DOC_CHARS — рендер не запускається."""
+
+    def __init__(self, cost: "RenderCost"):
+        self.cost = cost
+        super().__init__(f"Документ завеликий: {cost.chars} символів (ліміт {MAX_DOC_CHARS})")
+
+@dataclass(frozen=True)
+class RenderCost:
+    chars: int
+    table_rows: int
+    pages: int
+    estimated_ms: int
+
+    def __str__(self) -> str:
+        return f"{self.chars} симв., {self.table_rows} рядків, ~{self.pages} стор., ~{self.estimated_ms} мс"
+
+def truncate_field(text: str, limit: int = None) -> str:
+    """Скорочує одне поле до `limit` символів (за замовчуванням RENDER_MAX_FIELD_CHARS)."""
+    limit = MAX_FIELD_CHARS if limit is None else limit
+    if not text or len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + TRUNCATION_NOTE
+
+def limit_items(items: list, limit: int = None) -> tuple:
+    """Повертає (перші `limit` пунктів, кількість відкинутих)."""
+    limit = MAX_ITEMS if limit is None else limit
+    if len(items) <= limit:
+        return items, 0
+    return items[:limit], len(items) - limit
+
+def estimate_render_cost(markdown: str) -> RenderCost:
+    chars = len(markdown)
+    table_rows = markdown.count("\n|")
+    pages = max(1, -(-chars // _CHARS_PER_PAGE), -(-table_rows // _TABLE_ROWS_PER_PAGE))
+    return RenderCost(chars=chars, table_rows=table_rows, pages=pages, estimated_ms=pages * _MS_PER_PAGE)
+
+def enforce_document_budget(markdown: str) -> RenderCost:
+    """Оцінює вартість рендеру; піднімає DocumentTooLarge, якщо документ за межами бюджету."""
+    cost = estimate_render_cost(markdown)
+    if cost.chars > MAX_DOC_CHARS:
+        raise DocumentTooLarge(cost)
+    return cost
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Запобіжник (circuit breaker) для PDF-бекендів.
+
+Після BREAKER_FAILURES невдач або таймаутів поспіль бекенд "розмикається" (open):
+рендери на нього не йдуть, бот одразу пробує наступний. Через BREAKER_RESET секунд
+запобіжник напіврозмикається (half-open) і пропускає рівно одну пробну спробу:
+успіх замикає його знову, невдача — розмикає ще на BREAKER_RESET секунд.
+
+Методи викликаються з робочих потоків рендеру, тому стан захищено блокуванням.
+Кожна зміна стану пишеться в лог, а `snapshot()` потрапляє в статистику черги рендеру.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("circuit_breaker")
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "60"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.failures_total = 0
+        self.opened_total = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str, reason: str = "") -> None:
+        if state == self.state:
+            return
+        logger.warning("Запобіжник %s: %s → %s%s", self.name, self.state, state, f" ({reason})" if reason else "")
+        self.state = state
+
+    def allow(self) -> bool:
+        """Чи можна зараз рендерити цим бекендом."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(HALF_OPEN, "пробна спроба")
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            self._set_state(CLOSED)
+
+    def record_failure(self, reason: str) -> None:
+        with self._lock:
+            self.failures += 1
+            self.failures_total += 1
+            self._trial_in_flight = False
+            # Невдачі рендерів, що стартували ще до розмикання, не продовжують паузу
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.opened_total += 1
+                self._set_state(OPEN, f"{self.failures} невдач поспіль, остання: {reason}")
+
+    def release(self) -> None:
+        """Звільняє пробну спробу, яка не відбулася (бекенд недоступний або рендер скасовано)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'failures_total': self.failures_total,
+                'opened_total': self.opened_total,
+            }
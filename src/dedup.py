@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Відсіювання повторних оновлень (подвійні натискання, повільна мережа, повторна доставка).
+
+Оновлення вважається повтором, якщо протягом DEDUP_WINDOW секунд бот уже бачив:
+  * той самий `update_id` — Telegram доставив оновлення вдруге (напр., після перезапуску);
+  * той самий id callback query;
+  * натискання тієї самої кнопки (`callback_data`) під тим самим повідомленням у тому самому чаті,
+    поки повідомлення не змінилося. Бот редагує одне "головне" повідомлення з однаковими кнопками
+    на кожному кроці (напр., `min_yes` / `min_no` для кожного пункту DPIA), тож у ключ входить
+    ще й текст повідомлення: нове запитання — нова кнопка, друге натискання на старе — повтор.
+
+Перевірка синхронна (без await), тож два паралельні оновлення (`concurrent_updates`) не можуть
+обидва пройти її як "перші". Ключі зберігаються в OrderedDict у порядку надходження і
+застарілі прибираються з голови при кожній перевірці, тож вартість стала, а пам'ять обмежена
+DEDUP_MAX_KEYS.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("dedup")
+
+# 0 — вимкнено
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "10"))
+DEDUP_MAX_KEYS = int(os.getenv("DEDUP_MAX_KEYS", "20000"))
+
+class UpdateDeduplicator:
+    def __init__(self, window: float = DEDUP_WINDOW, max_keys: int = DEDUP_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self.dropped = {'update': 0, 'callback': 0, 'button': 0}
+        # ключ → час, коли його вперше побачено
+        self._seen = OrderedDict()
+
+    @staticmethod
+    def keys(update, bot_id: int) -> list:
+        """(тип, ключ) оновлення: update_id, а для натискань — ще id запиту і кнопка під повідомленням."""
+        keys = [('update', (bot_id, update.update_id))]
+        query = update.callback_query
+        if query is not None:
+            keys.append(('callback', (bot_id, query.id)))
+            message = query.message
+            if message is not None:
+                content = getattr(message, 'text', None) or getattr(message, 'caption', None) or ""
+                keys.append(('button', (bot_id, message.chat.id, message.message_id, query.data, hash(content))))
+        return keys
+
+    def is_duplicate(self, update, bot_id: int, now: float = None) -> bool:
+        """Запам'ятовує оновлення і повертає True, якщо воно (чи таке саме натискання) вже було у вікні."""
+        if self.window <= 0:
+            return False
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        keys = self.keys(update, bot_id)
+        for kind, key in keys:
+            if key in self._seen:
+                self.dropped[kind] += 1
+                logger.debug("Повтор відкинуто (%s): %s", kind, key)
+                return True
+        for _, key in keys:
+            self._seen[key] = now
+        while len(self._seen) > self.max_keys:
+            self._seen.popitem(last=False)
+        return False
+
+    def _expire(self, now: float) -> None:
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.window:
+                break
+            del self._seen[key]
+
+    def stats(self) -> dict:
+        return {'tracked_keys': len(self._seen), 'dropped': dict(self.dropped)}
+
+update_deduplicator = UpdateDeduplicator()
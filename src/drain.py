@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Плавна зупинка ("drain") під час деплою.
+
+На SIGTERM / SIGINT бот не зупиняється одразу:
+  1. вмикається режим drain — нові сесії не приймаються (див. `ShutdownDrain.draining`),
+     а користувачі, що вже посеред діалогу, можуть його завершити;
+  2. генерації, що вже йдуть (рендер + надсилання файлів), отримують до DRAIN_TIMEOUT секунд;
+  3. після цього викликається `application.stop_running()` — звичайна зупинка PTB.
+Якщо генерація не вклалася в дедлайн, вона скасовується, і користувач отримує пояснення.
+Повторний сигнал під час drain зупиняє бота без очікування.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+
+logger = logging.getLogger("drain")
+
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "25"))
+
+class DrainInterrupted(Exception):
+    """Генерацію скасовано, бо дедлайн drain минув."""
+
+class ShutdownDrain:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.draining = False
+        self._inflight = set()
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, coro):
+        """Виконує `coro` як відстежувану задачу, яку drain дочекається (або скасує після дедлайну)."""
+        task = asyncio.ensure_future(coro)
+        self._inflight.add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Скасовано саме внутрішню задачу (drain), а не того, хто її чекає
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                raise DrainInterrupted() from None
+            raise
+        finally:
+            self._inflight.discard(task)
+
+    async def drain(self) -> bool:
+        """Чекає на генерації, що йдуть; повертає False, якщо довелося скасувати якісь після дедлайну."""
+        self.draining = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        # Поки чекаємо, можуть стартувати генерації користувачів, що завершують діалог
+        while self._inflight:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.wait(set(self._inflight), timeout=remaining)
+        return self.cancel_inflight() == 0
+
+    def cancel_inflight(self) -> int:
+        pending = [task for task in self._inflight if not task.done()]
+        for task in pending:
+            task.cancel()
+        return len(pending)
+
+shutdown_drain = ShutdownDrain(DRAIN_TIMEOUT)
+
+def install_drain_signal_handlers(application, drain: ShutdownDrain = shutdown_drain) -> None:
+    """
+    Замінює стандартні обробники сигналів PTB (run_polling має отримати `stop_signals=None`).
+    Викликати з `post_init`, тобто вже всередині робочого event loop.
+    """
+    loop = asyncio.get_running_loop()
+    drain_tasks = set()
+
+    async def drain_then_stop():
+        logger.info("Drain: нові сесії не приймаються, генерацій у роботі: %s, дедлайн %.0f с", drain.inflight, drain.timeout)
+        started = loop.time()
+        if await drain.drain():
+            logger.info("Drain завершено за %.1f с", loop.time() - started)
+        else:
+            logger.warning("Drain: дедлайн минув, незавершені генерації скасовано")
+        application.stop_running()
+
+    def on_signal(signum):
+        if drain.draining:
+            logger.warning("Повторний сигнал %s — зупинка без очікування", signal.Signals(signum).name)
+            drain.cancel_inflight()
+            application.stop_running()
+            return
+        task = loop.create_task(drain_then_stop())
+        drain_tasks.add(task)
+        task.add_done_callback(drain_tasks.discard)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, on_signal, signum)
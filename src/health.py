@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Локальний HTTP-ендпоінт здоров'я для оркестратора (вмикається HEALTH_PORT, за замовчуванням вимкнено).
+
+  GET /livez   — 200, поки event loop живий: затримка циклу нижча за HEALTH_LIVENESS_LAG;
+  GET /readyz  — 200, коли бот справді може обслуговувати користувачів: loop не гальмує
+                 (HEALTH_MAX_LOOP_LAG), Bot API відповідає кожному боту, хоч один PDF-бекенд
+                 пройшов самоперевірку, і не йде drain;
+  GET /health  — повний звіт у JSON (код — як у /readyz).
+
+Що збирається:
+  * затримка event loop — фонова задача засинає на _LAG_INTERVAL і міряє, наскільки запізнилась;
+    якщо loop заблоковано, сервер не відповість зовсім, і це теж сигнал для оркестратора;
+  * час останнього оновлення від Telegram для кожного бота (TypeHandler у групі -2);
+  * доступність Bot API — `getMe` раз на HEALTH_SELFTEST_INTERVAL;
+  * самоперевірка рендеру — крихітний документ кожним бекендом (`pdf_utils.self_test_backends`)
+    з тим самим інтервалом: результат і тривалість за бекендами;
+  * глибина черги рендеру й стан запобіжників (`render_queue.stats()`).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from dedup import update_deduplicator
+from drain import shutdown_drain
+from rate_limit import user_rate_limits
+from pdf_utils import self_test_backends
+from render_queue import render_queue
+
+logger = logging.getLogger("health")
+
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "0"))
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
+HEALTH_SELFTEST_INTERVAL = float(os.getenv("HEALTH_SELFTEST_INTERVAL", "300"))
+HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", "0.5"))
+HEALTH_LIVENESS_LAG = float(os.getenv("HEALTH_LIVENESS_LAG", "5"))
+
+# Як часто (секунди) міряти затримку event loop і скільки вимірів тримати (~1 хв)
+_LAG_INTERVAL = 0.5
+_LAG_SAMPLES = 120
+
+_STATUS_LINES = {200: "200 OK", 404: "404 Not Found", 503: "503 Service Unavailable"}
+
+class HealthMonitor:
+    def __init__(self):
+        self._applications = []
+        self._last_update = {}
+        self._api = {}
+        self._lags = deque(maxlen=_LAG_SAMPLES)
+        self._lag_checked_at = None
+        self._render = {}
+        self._render_checked_at = None
+        self._tasks = set()
+        self._server = None
+
+    def attach(self, application) -> None:
+        """Стежить за ботом: час останнього оновлення і доступність його Bot API."""
+        self._applications.append(application)
+
+        async def record_update(update: Update, context) -> None:
+            self._last_update[context.bot.id] = time.time()
+
+        application.add_handler(TypeHandler(Update, record_update), group=-2)
+
+    async def start(self, port: int = HEALTH_PORT, host: str = HEALTH_HOST) -> None:
+        """Запускає фонові перевірки й HTTP-сервер; викликати всередині робочого event loop."""
+        if port <= 0:
+            return
+        for coro in (self._watch_loop_lag(), self._run_probes()):
+            task = asyncio.ensure_future(coro)
+            self._tasks.add(task)
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info("Health-ендпоінт: http://%s:%s/health (/livez, /readyz)", host, port)
+
+    # --- Перевірки ---
+
+    async def _watch_loop_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(_LAG_INTERVAL)
+            self._lags.append(max(0.0, loop.time() - started - _LAG_INTERVAL))
+            self._lag_checked_at = time.time()
+
+    async def _run_probes(self) -> None:
+        while True:
+            await self.probe()
+            await asyncio.sleep(HEALTH_SELFTEST_INTERVAL)
+
+    async def probe(self) -> None:
+        """Одна перевірка Bot API кожного бота і самоперевірка рендеру."""
+        for application in self._applications:
+            started = time.perf_counter()
+            try:
+                await application.bot.get_me()
+                result = {'ok': True}
+            except Exception as e:
+                result = {'ok': False, 'error': f"{type(e).__name__}: {e}"[:300]}
+            result['ms'] = round((time.perf_counter() - started) * 1000, 1)
+            result['checked_at'] = time.time()
+            self._api[application.bot.id] = result
+        try:
+            self._render = await self_test_backends()
+        except Exception as e:
+            logger.error("Самоперевірка рендеру впала: %s", e)
+            self._render = {}
+        self._render_checked_at = time.time()
+        failed = [name for name, result in self._render.items() if result['status'] == 'failed']
+        if failed:
+            logger.warning("Самоперевірка рендеру: бекенди з помилкою %s", failed)
+
+    # --- Звіт ---
+
+    def report(self) -> dict:
+        now = time.time()
+        lag_last = round(self._lags[-1], 3) if self._lags else None
+        lag_max = round(max(self._lags), 3) if self._lags else None
+        live = self._lag_checked_at is not None and now - self._lag_checked_at < HEALTH_LIVENESS_LAG \
+            and lag_max < HEALTH_LIVENESS_LAG
+        problems = []
+        if lag_max is None:
+            problems.append("затримку event loop ще не виміряно")
+        elif lag_max >= HEALTH_MAX_LOOP_LAG:
+            problems.append(f"затримка event loop {lag_max} с")
+        if not any(result['status'] == 'ok' for result in self._render.values()):
+            problems.append("жоден PDF-бекенд не пройшов самоперевірку")
+        bots = {}
+        for application in self._applications:
+            bot_id = application.bot.id
+            api = self._api.get(bot_id)
+            if not api or not api['ok']:
+                problems.append(f"Bot API недоступний для бота {bot_id}")
+            last_update = self._last_update.get(bot_id)
+            bots[str(bot_id)] = {
+                'polling': bool(application.updater and application.updater.running),
+                'last_update_seconds_ago': round(now - last_update, 1) if last_update else None,
+                'api': api,
+            }
+        if shutdown_drain.draining:
+            problems.append("drain")
+        queue = render_queue.stats()
+        return {
+            'live': live,
+            'ready': live and not problems,
+            'problems': problems,
+            'loop_lag_seconds': {'last': lag_last, 'max_1m': lag_max},
+            'bots': bots,
+            'render_self_test': {
+                'checked_seconds_ago': round(now - self._render_checked_at, 1) if self._render_checked_at else None,
+                'backends': self._render,
+            },
+            'render_queue': {key: queue[key] for key in ('pending', 'waiting', 'admitted', 'limit', 'backends')},
+            'dedup': update_deduplicator.stats(),
+            'rate_limits': user_rate_limits.stats(),
+        }
+
+    # --- HTTP ---
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            path = request_line.decode("latin-1").split(" ")[1] if request_line.count(b" ") >= 2 else ""
+            # Заголовки не потрібні, але їх треба дочитати
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+            report = self.report()
+            if path == "/livez":
+                status, body = (200 if report['live'] else 503), {'live': report['live']}
+            elif path == "/readyz":
+                status, body = (200 if report['ready'] else 503), {'ready': report['ready'], 'problems': report['problems']}
+            elif path == "/health":
+                status, body = (200 if report['ready'] else 503), report
+            else:
+                status, body = 404, {'error': "not found"}
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {_STATUS_LINES[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+health_monitor = HealthMonitor()
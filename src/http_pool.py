@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP-клієнти для Bot API.
+
+Long polling і решта викликів ідуть через окремі об'єкти запитів:
+  * getUpdates — одне з'єднання, яке тримає long poll і ні з ким не конкурує;
+  * усе інше (send/edit/delete, вивантаження документів) — пул на BOT_HTTP_POOL_SIZE з'єднань
+    з keep-alive, щоб дрібні виклики не чекали, поки вивантажиться великий PDF,
+    і не платили за новий TCP/TLS-хендшейк.
+
+Змінні оточення (секунди, якщо не сказано інше):
+  BOT_HTTP_POOL_SIZE            — максимум з'єднань основного пулу (64);
+  BOT_HTTP_KEEPALIVE            — скільки тримати простояне з'єднання відкритим (30; 0 — не тримати);
+  BOT_HTTP_VERSION              — `1.1` або `2` (HTTP/2 мультиплексує виклики в одному з'єднанні;
+                                  потрібен пакет h2, без нього — повернення до 1.1);
+  BOT_HTTP_CONNECT_TIMEOUT      — встановлення з'єднання (5);
+  BOT_HTTP_READ_TIMEOUT         — очікування відповіді (10);
+  BOT_HTTP_WRITE_TIMEOUT        — надсилання тіла звичайного запиту (10);
+  BOT_HTTP_MEDIA_WRITE_TIMEOUT  — надсилання тіла з файлом, напр. PDF чи альбом кіта (60);
+  BOT_HTTP_POOL_TIMEOUT         — очікування вільного з'єднання в пулі (3);
+  BOT_POLL_TIMEOUT              — скільки Telegram тримає getUpdates без нових оновлень (30).
+"""
+
+import logging
+import os
+
+import httpx
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger("http_pool")
+
+BOT_HTTP_POOL_SIZE = int(os.getenv("BOT_HTTP_POOL_SIZE", "64"))
+BOT_HTTP_KEEPALIVE = float(os.getenv("BOT_HTTP_KEEPALIVE", "30"))
+BOT_HTTP_VERSION = os.getenv("BOT_HTTP_VERSION", "1.1")
+BOT_HTTP_CONNECT_TIMEOUT = float(os.getenv("BOT_HTTP_CONNECT_TIMEOUT", "5"))
+BOT_HTTP_READ_TIMEOUT = float(os.getenv("BOT_HTTP_READ_TIMEOUT", "10"))
+BOT_HTTP_WRITE_TIMEOUT = float(os.getenv("BOT_HTTP_WRITE_TIMEOUT", "10"))
+BOT_HTTP_MEDIA_WRITE_TIMEOUT = float(os.getenv("BOT_HTTP_MEDIA_WRITE_TIMEOUT", "60"))
+BOT_HTTP_POOL_TIMEOUT = float(os.getenv("BOT_HTTP_POOL_TIMEOUT", "3"))
+BOT_POLL_TIMEOUT = int(os.getenv("BOT_POLL_TIMEOUT", "30"))
+
+def _try_import_h2():
+    try:
+        import h2  # type: ignore
+        return h2
+    except Exception:
+        return None
+
+def _http_version(requested: str) -> str:
+    if requested in ("2", "2.0") and _try_import_h2() is None:
+        logger.warning("BOT_HTTP_VERSION=%s, але пакет h2 не встановлено — використовую HTTP/1.1", requested)
+        return "1.1"
+    return requested
+
+def build_api_request(
+    pool_size: int = BOT_HTTP_POOL_SIZE,
+    keepalive: float = BOT_HTTP_KEEPALIVE,
+    http_version: str = BOT_HTTP_VERSION,
+) -> HTTPXRequest:
+    """Пул для всіх викликів, крім getUpdates."""
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=BOT_HTTP_CONNECT_TIMEOUT,
+        read_timeout=BOT_HTTP_READ_TIMEOUT,
+        write_timeout=BOT_HTTP_WRITE_TIMEOUT,
+        media_write_timeout=BOT_HTTP_MEDIA_WRITE_TIMEOUT,
+        pool_timeout=BOT_HTTP_POOL_TIMEOUT,
+        http_version=_http_version(http_version),
+        # Замінює limits, які HTTPXRequest будує сам лише з max_connections
+        httpx_kwargs={"limits": httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size if keepalive > 0 else 0,
+            keepalive_expiry=keepalive,
+        )},
+    )
+
+def build_get_updates_request() -> HTTPXRequest:
+    """
+    Одне з'єднання для long polling. Bot сам додає `timeout` getUpdates до read_timeout,
+    тож тут лише запас на мережу.
+    """
+    return HTTPXRequest(
+        connection_pool_size=1,
+        connect_timeout=BOT_HTTP_CONNECT_TIMEOUT,
+        read_timeout=BOT_HTTP_READ_TIMEOUT,
+        write_timeout=BOT_HTTP_WRITE_TIMEOUT,
+        pool_timeout=BOT_HTTP_POOL_TIMEOUT,
+    )
+
+def configure_requests(builder):
+    """Підключає обидва пули до ApplicationBuilder."""
+    http_version = _http_version(BOT_HTTP_VERSION)
+    logger.info(
+        "HTTP Bot API: пул %s з'єднань, keep-alive %.0f с, HTTP/%s, long poll %s с",
+        BOT_HTTP_POOL_SIZE, BOT_HTTP_KEEPALIVE, http_version, BOT_POLL_TIMEOUT,
+    )
+    return builder.request(build_api_request(http_version=http_version)).get_updates_request(build_get_updates_request())
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Імпорт уже заповнених відповідей для генерації документа за один крок.
+
+Підтримувані джерела:
+  A) `.xlsx` у форматі `artifacts/1_dpia_lite.xlsx` (читається openpyxl у read-only режимі, рядок за рядком);
+  B) JSON-повідомлення або файл `.json`;
+  C) YAML-повідомлення (починається з `document:`) або файл `.yaml` / `.yml`
+     (потрібен пакет PyYAML, інакше — зрозуміла помилка).
+
+Будь-яка невідповідність форми (напр., число замість списку пунктів) піднімає StructuredInputError
+з поясненням для користувача, а не TypeError посеред розбору.
+
+Результат — `(kind, data)`, де `kind` ∈ {"policy", "dpia", "checklist"}, а `data` має ту саму форму,
+що й `context.user_data[...]` у відповідному діалозі, тож далі працюють звичайні будівники даних.
+"""
+
+import io
+import json
+import logging
+import os
+
+logger = logging.getLogger("importers")
+
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(512 * 1024)))
+# Скільки рядків аркуша максимально переглядаємо (шаблон має ~20)
+XLSX_MAX_ROWS = 200
+
+POLICY_FIELDS = ('project_name', 'contact', 'data_collected', 'data_storage', 'delete_mechanism')
+DPIA_FIELDS = ('project_name', 'team', 'goal', 'retention_period', 'retention_mechanism', 'storage', 'risk', 'mitigation')
+CHECKLIST_ITEMS = ('c1_s1', 'c1_s2', 'c1_s3', 'c2_s1', 'c2_s2', 'c2_s3', 'c3_s1', 'c3_s2', 'c3_s3')
+
+DOCUMENT_ALIASES = {
+    'policy': 'policy', 'політика': 'policy',
+    'dpia': 'dpia',
+    'checklist': 'checklist', 'чек-ліст': 'checklist', 'чекліст': 'checklist',
+}
+
+_YES = {'yes', 'так', 'true', '1', '+', '✅', 'виконано'}
+_NO = {'no', 'ні', 'false', '0', '-', '❌', 'не виконано'}
+
+# Колонка A шаблону DPIA Lite → поле діалогу
+_XLSX_LABELS = {
+    'назва проєкту:': 'project_name',
+    'керівник/розробник:': 'team',
+    'де зберігаємо:': 'storage',
+    'який головний ризик?': 'risk',
+    'як мінімізуємо ризик?': 'mitigation',
+    'план зберігання:': 'retention_period',
+    'план очистки:': 'retention_mechanism',
+}
+_XLSX_PREFIXES = {
+    '1. мета': 'goal',
+    '2. дані': 'data_list',
+}
+
+class StructuredInputError(ValueError):
+    """Файл або повідомлення не вдалося зіставити з полями документа."""
+
+def _try_import_openpyxl():
+    try:
+        import openpyxl  # type: ignore
+        return openpyxl
+    except Exception:
+        return None
+
+def _try_import_yaml():
+    try:
+        import yaml  # type: ignore
+        return yaml
+    except Exception:
+        return None
+
+def _clean(value, field: str = None) -> str:
+    """Порожні клітинки та підказки шаблону на кшталт "[Впишіть ...]" вважаємо відсутньою відповіддю."""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        raise StructuredInputError(f"Поле \"{field or '?'}\" має бути текстом, а не {'списком' if isinstance(value, list) else 'об’єктом'}.")
+    text = str(value).strip()
+    if text.startswith("[") and text.endswith("]"):
+        return ""
+    return text
+
+def _parse_yes_no(value, field: str = None):
+    """Повертає (True/False/None, решта тексту)."""
+    if isinstance(value, bool):
+        return value, ""
+    text = _clean(value, field)
+    lowered = text.lower()
+    for token in sorted(_YES | _NO, key=len, reverse=True):
+        if lowered.startswith(token) and not lowered[len(token):len(token) + 1].isalnum():
+            rest = text[len(token):].lstrip(" .,:;—-").strip()
+            return token in _YES, rest
+    return None, text
+
+def _split_data_list(text: str) -> list:
+    separators = "\n;"
+    for sep in separators:
+        text = text.replace(sep, "\n")
+    return [item.strip(" •-") for item in text.split("\n") if item.strip(" •-")]
+
+# --- A) XLSX (DPIA Lite) ---
+
+def parse_dpia_xlsx(content: bytes) -> dict:
+    """Зчитує заповнений `1_dpia_lite.xlsx` у форму `user_data['dpia']`."""
+    openpyxl = _try_import_openpyxl()
+    if not openpyxl:
+        raise StructuredInputError("Імпорт .xlsx недоступний: не встановлено пакет 'openpyxl'.")
+
+    try:
+        workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    except Exception as e:
+        raise StructuredInputError(f"Не вдалося відкрити .xlsx: {e}") from e
+
+    data = {'minimization_data': [], 'data_list': []}
+    in_minimization = False
+    try:
+        sheet = workbook.worksheets[0]
+        for row in sheet.iter_rows(min_row=1, max_row=XLSX_MAX_ROWS, max_col=2, values_only=True):
+            label = _clean(row[0]) if row else ""
+            answer = _clean(row[1]) if len(row) > 1 else ""
+            if not label:
+                continue
+            lowered = label.lower()
+            if lowered.startswith('3. мінімізація'):
+                in_minimization = True
+                continue
+            if in_minimization:
+                if lowered.startswith('висновок') or lowered[:2] in ('4.', '5.'):
+                    in_minimization = False
+                elif answer:
+                    needed, reason = _parse_yes_no(answer)
+                    data['minimization_data'].append({
+                        "item": label,
+                        "needed": needed is not False,
+                        "reason": reason or ("" if needed is not False else "Відмовлено"),
+                    })
+                    continue
+            field = _XLSX_LABELS.get(lowered) or next(
+                (f for prefix, f in _XLSX_PREFIXES.items() if lowered.startswith(prefix)), None
+            )
+            if field == 'data_list':
+                data['data_list'] = _split_data_list(answer)
+            elif field and answer:
+                data[field] = answer
+    finally:
+        workbook.close()
+
+    if data['minimization_data']:
+        data['data_list'] = [item['item'] for item in data['minimization_data']]
+    if not data.get('project_name'):
+        raise StructuredInputError("У файлі не заповнено «Назва проєкту:».")
+    return data
+
+# --- B/C) JSON / YAML ---
+
+def _text_fields(raw: dict, fields: tuple) -> dict:
+    values = {field: _clean(raw.get(field), field) for field in fields}
+    return {field: value for field, value in values.items() if value}
+
+def _normalize_dpia(raw: dict) -> dict:
+    data = _text_fields(raw, DPIA_FIELDS)
+    items = raw.get('data') or raw.get('data_list') or []
+    if isinstance(items, str):
+        items = _split_data_list(items)
+    elif not isinstance(items, list):
+        raise StructuredInputError("Поле \"data\" має бути списком пунктів або текстом (пункти через «;»).")
+    minimization_data = []
+    for number, item in enumerate(items, 1):
+        field = f"data[{number}]"
+        if isinstance(item, dict):
+            needed, reason = _parse_yes_no(item.get('needed', True), f"{field}.needed")
+            minimization_data.append({
+                "item": _clean(item.get('item'), f"{field}.item"),
+                "needed": needed is not False,
+                "reason": _clean(item.get('reason'), f"{field}.reason") or reason or ("" if needed is not False else "Відмовлено"),
+            })
+        elif _clean(item, field):
+            minimization_data.append({"item": _clean(item), "needed": True, "reason": "[Не вказано]"})
+    data['minimization_data'] = [m for m in minimization_data if m['item']]
+    data['data_list'] = [m['item'] for m in data['minimization_data']]
+    return data
+
+def _normalize_checklist(raw: dict) -> dict:
+    data = _text_fields(raw, ('project_name',))
+    for key in CHECKLIST_ITEMS:
+        entry = raw.get(key)
+        if isinstance(entry, dict):
+            status, note = entry.get('status'), entry.get('note')
+        else:
+            status, note = raw.get(f"{key}_status", entry), raw.get(f"{key}_note")
+        done, _ = _parse_yes_no(status, f"{key}.status")
+        if done is not None:
+            data[f"{key}_status"] = "yes" if done else "no"
+        data[f"{key}_note"] = _clean(note, f"{key}.note") or "*Пропущено*"
+    return data
+
+def _normalize_policy(raw: dict) -> dict:
+    return _text_fields(raw, POLICY_FIELDS)
+
+_NORMALIZERS = {
+    'policy': _normalize_policy,
+    'dpia': _normalize_dpia,
+    'checklist': _normalize_checklist,
+}
+
+def _detect_kind(raw: dict) -> str:
+    declared = str(raw.get('document') or raw.get('type') or "").strip().lower()
+    if declared:
+        if declared not in DOCUMENT_ALIASES:
+            raise StructuredInputError(f"Невідомий тип документа: {declared!r} (очікується policy, dpia або checklist).")
+        return DOCUMENT_ALIASES[declared]
+    if any(key in raw for key in CHECKLIST_ITEMS):
+        return 'checklist'
+    if 'data' in raw or 'data_list' in raw or 'risk' in raw:
+        return 'dpia'
+    if 'contact' in raw or 'delete_mechanism' in raw:
+        return 'policy'
+    raise StructuredInputError("Не вдалося визначити тип документа — додайте поле \"document\".")
+
+def parse_structured(text: str, fmt: str = "json") -> tuple:
+    """Розбирає JSON/YAML-відповіді та повертає (kind, data)."""
+    if len(text.encode("utf-8")) > IMPORT_MAX_BYTES:
+        raise StructuredInputError("Файл завеликий для імпорту.")
+    if fmt == "yaml":
+        yaml = _try_import_yaml()
+        if not yaml:
+            raise StructuredInputError("Імпорт YAML недоступний: не встановлено пакет 'PyYAML'. Надішліть JSON.")
+        try:
+            raw = yaml.safe_load(text)
+        except Exception as e:
+            raise StructuredInputError(f"Некоректний YAML: {e}") from e
+    else:
+        try:
+            raw = json.loads(text)
+        except ValueError as e:
+            raise StructuredInputError(f"Некоректний JSON: {e}") from e
+
+    if not isinstance(raw, dict):
+        raise StructuredInputError("Очікується об'єкт з полями документа.")
+    kind = _detect_kind(raw)
+    data = _NORMALIZERS[kind](raw)
+    if not data.get('project_name'):
+        raise StructuredInputError("Не заповнено поле \"project_name\".")
+    logger.info("Імпорт %s: документ %s, полів %s", fmt, kind, len(data))
+    return kind, data
+
+def parse_upload(filename: str, content: bytes) -> tuple:
+    """Розбирає завантажений файл за розширенням і повертає (kind, data)."""
+    if len(content) > IMPORT_MAX_BYTES:
+        raise StructuredInputError("Файл завеликий для імпорту.")
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".xlsx":
+        return 'dpia', parse_dpia_xlsx(content)
+    if extension in (".json", ".yaml", ".yml"):
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError as e:
+            raise StructuredInputError("Файл має бути в кодуванні UTF-8.") from e
+        return parse_structured(text, "json" if extension == ".json" else "yaml")
+    raise StructuredInputError("Підтримуються файли .xlsx, .json, .yaml.")
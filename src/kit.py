@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Порожній "KAI Privacy Kit": статичні шаблони з `artifacts/` для команди /kit.
+
+Кожен файл вивантажується в Telegram один раз на бота; повернутий `file_id`
+кешується в пам'яті разом з відбитком файлу (mtime + розмір), і всі наступні
+запити надсилають документ за `file_id` — без жодного байта вивантаження і без рендерера.
+Зміна файлу на диску змінює відбиток, тож наступний /kit вивантажить нову версію.
+
+Порожні PDF для Markdown-шаблонів рендеряться один раз (у фоні під час старту
+або під час першого /kit) і теж кешуються за відбитком джерела.
+"""
+
+import asyncio
+import logging
+import os
+
+from telegram import InputMediaDocument
+from telegram.error import BadRequest
+
+from pdf_utils import PdfUnavailable, render_pdf_bytes_async
+
+logger = logging.getLogger("kit")
+
+KIT_ARTIFACTS_DIR = os.getenv(
+    "KIT_ARTIFACTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "artifacts")
+)
+
+# (ім'я файлу в чаті, файл-джерело в artifacts/, чи рендерити джерело в PDF)
+KIT_FILES = (
+    ("1_dpia_lite.xlsx", "1_dpia_lite.xlsx", False),
+    ("2_privacy_policy.md", "2_privacy_policy.md", False),
+    ("3_minimization_checklist.md", "3_minimization_checklist.md", False),
+    ("2_privacy_policy.pdf", "2_privacy_policy.md", True),
+    ("3_minimization_checklist.pdf", "3_minimization_checklist.md", True),
+)
+
+class KitCache:
+    def __init__(self, artifacts_dir: str = KIT_ARTIFACTS_DIR, files: tuple = KIT_FILES):
+        self.artifacts_dir = artifacts_dir
+        self.files = files
+        # (bot_id, ім'я) → (відбиток, file_id)
+        self._file_ids = {}
+        # ім'я PDF → (відбиток джерела, bytes)
+        self._rendered = {}
+
+    def _fingerprint(self, source: str) -> tuple:
+        stat = os.stat(os.path.join(self.artifacts_dir, source))
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self, source: str) -> bytes:
+        with open(os.path.join(self.artifacts_dir, source), "rb") as artifact:
+            return artifact.read()
+
+    async def _content(self, name: str, source: str, render: bool, fingerprint: tuple) -> bytes:
+        content = await asyncio.to_thread(self._read, source)
+        if not render:
+            return content
+        cached = self._rendered.get(name)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        pdf = await render_pdf_bytes_async(content.decode("utf-8"))
+        self._rendered[name] = (fingerprint, pdf)
+        return pdf
+
+    async def prerender(self) -> int:
+        """Рендерить порожні PDF заздалегідь. Повертає кількість."""
+        rendered = 0
+        for name, source, render in self.files:
+            if render:
+                try:
+                    await self._content(name, source, render, self._fingerprint(source))
+                    rendered += 1
+                except (OSError, PdfUnavailable) as e:
+                    logger.warning("Порожній %s не відрендерено: %s", name, e)
+        return rendered
+
+    async def _build_media(self, bot_id: int) -> list:
+        """[(ім'я, відбиток, чи з кешу, InputMediaDocument)] для файлів, що є на диску."""
+        media = []
+        for name, source, render in self.files:
+            try:
+                fingerprint = self._fingerprint(source)
+            except OSError as e:
+                logger.warning("Файл кіта %s недоступний: %s", source, e)
+                continue
+            cached = self._file_ids.get((bot_id, name))
+            if cached and cached[0] == fingerprint:
+                media.append((name, fingerprint, True, InputMediaDocument(cached[1])))
+                continue
+            try:
+                content = await self._content(name, source, render, fingerprint)
+            except PdfUnavailable as e:
+                logger.warning("Порожній %s пропущено: %s", name, e)
+                continue
+            media.append((name, fingerprint, False, InputMediaDocument(content, filename=name)))
+        return media
+
+    async def send(self, bot, chat_id: int) -> int:
+        """Надсилає кіт одним альбомом. Повертає кількість байтів, які довелося вивантажити."""
+        media = await self._build_media(bot.id)
+        if not media:
+            return 0
+        try:
+            messages = await bot.send_media_group(chat_id=chat_id, media=[item[3] for item in media])
+        except BadRequest as e:
+            if not any(item[2] for item in media):
+                raise
+            # Telegram не впізнав збережений file_id — забуваємо кеш цього бота і вивантажуємо заново
+            logger.warning("Кеш file_id кіта недійсний (%s), вивантажую заново", e)
+            for name, _, _, _ in media:
+                self._file_ids.pop((bot.id, name), None)
+            return await self.send(bot, chat_id)
+
+        uploaded = 0
+        for (name, fingerprint, from_cache, item), message in zip(media, messages):
+            if not from_cache:
+                uploaded += len(item.media.input_file_content)
+                if message.document:
+                    self._file_ids[(bot.id, name)] = (fingerprint, message.document.file_id)
+        logger.info("Кіт надіслано: %s файлів, вивантажено %s байт", len(media), uploaded)
+        return uploaded
+
+kit_cache = KitCache()
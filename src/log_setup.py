@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Налаштування логування без блокування event loop.
+
+Хендлер на кореневому логері лише кладе LogRecord у чергу; форматування
+(`%`-аргументи, JSON, traceback) і запис у stderr робить фоновий потік QueueListener.
+Тому виклики логера мають передавати аргументи ліниво (`logger.info("... %s", value)`),
+а не f-рядком, і не змінювати передані об'єкти після виклику.
+
+Змінні оточення:
+  LOG_LEVEL        — рівень кореневого логера (INFO);
+  LOG_FORMAT       — `text` (як раніше) або `json` (один JSON-об'єкт на рядок, з полями з `extra=`,
+                     напр. `duration_ms`, і `lag_ms` — затримкою між викликом і записом);
+  LOG_SAMPLE_RATE  — для записів, позначених `extra={"sample": True}` (масові INFO/DEBUG на кожен рендер),
+                     пропускати лише кожен N-й (1 — без семплінгу). WARNING і вище не семплюються.
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", "1"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Атрибути, які є в кожному LogRecord; все інше прийшло через `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """Один JSON-рядок на запис: час, рівень, логер, повідомлення та поля з `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "lag_ms": round((time.time() - record.created) * 1000, 2),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Пропускає кожен `rate`-й запис, позначений `extra={"sample": True}` (лічильник на шаблон повідомлення)."""
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self._counters = defaultdict(itertools.count)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 1 or not getattr(record, "sample", False) or record.levelno >= logging.WARNING:
+            return True
+        if next(self._counters[(record.name, record.msg)]) % self.rate:
+            return False
+        # Вага запису для агрегації: один рядок представляє `rate` подій
+        record.sample = self.rate
+        return True
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler, який не форматує запис у потоці виклику — це робить QueueListener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def _formatter() -> logging.Formatter:
+    return JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+
+def setup_worker_logging() -> None:
+    """Логування в робочому процесі рендеру: той самий формат, запис напряму в stderr (event loop тут немає)."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(_formatter())
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+def setup_logging() -> QueueListener:
+    """Перенаправляє кореневий логер у чергу й запускає фоновий потік запису."""
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(_formatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Дописати чергу до кінця при виході
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Кілька ботів (токенів) в одному процесі.
+
+BOTS_CONFIG — шлях до JSON зі списком ботів, напр.:
+  [
+    {"name": "fit", "token_env": "FIT_BOT_TOKEN", "templates": {"BOT_WELCOME": "👋 <b>Привіт від ФІТ!</b>"}},
+    {"name": "law", "token": "123:ABC"}
+  ]
+Токен береться з "token" або зі змінної оточення "token_env"; "templates" замінюють окремі
+шаблони з templates.py лише для цього бота (плейсхолдери перевіряються до старту, як і спільні).
+Без BOTS_CONFIG працює один бот з BOT_TOKEN, як і раніше.
+
+Кожен бот — окремий Application зі своїми хендлерами, станом діалогів і сховищем сесій,
+але всі працюють в одному event loop і ділять інтерпретатор, робочі процеси рендеру,
+чергу рендеру (кожен бот — окрема смуга, слоти віддаються смугам по колу),
+кеш кіта, пул HTTP-з'єднань до Bot API і drain під час деплою.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+
+logger = logging.getLogger("multi_bot")
+
+BOTS_CONFIG = os.getenv("BOTS_CONFIG")
+
+@dataclass(frozen=True)
+class BotConfig:
+    name: str
+    token: str
+    templates: dict = field(default_factory=dict)
+
+def load_bot_configs(default_token: str = None, path: str = BOTS_CONFIG) -> list:
+    """
+    Список BotConfig з BOTS_CONFIG або один бот з `default_token`.
+    Піднімає ValueError, якщо конфіг некоректний (немає токена, однакові імена).
+    """
+    if not path:
+        return [BotConfig("main", default_token)] if default_token else []
+    with open(path, encoding="utf-8") as config_file:
+        entries = json.load(config_file)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"BOTS_CONFIG {path}: очікується непорожній список ботів")
+    configs = []
+    for number, entry in enumerate(entries, 1):
+        name = str(entry.get("name") or f"bot{number}")
+        token = entry.get("token") or os.getenv(entry.get("token_env") or "")
+        if not token:
+            raise ValueError(f"BOTS_CONFIG: бот {name} без токена (token або token_env)")
+        overrides = entry.get("templates") or {}
+        if not all(isinstance(text, str) for text in overrides.values()):
+            raise ValueError(f"BOTS_CONFIG: бот {name} — шаблони мають бути рядками")
+        configs.append(BotConfig(name, token, dict(overrides)))
+    names = [config.name for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"BOTS_CONFIG: імена ботів мають бути унікальними: {names}")
+    return configs
+
+def run_applications(applications: list, poll_timeout: int) -> None:
+    """
+    Як `Application.run_polling`, але для кількох Application в одному event loop.
+    `post_init` і `post_shutdown` викликаються лише для першого (drain, сигнали й робочі процеси
+    рендеру спільні): його `stop_running()` зупиняє event loop, а з ним — усіх ботів.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    first = applications[0]
+    try:
+        for application in applications:
+            loop.run_until_complete(application.initialize())
+        if first.post_init:
+            loop.run_until_complete(first.post_init(first))
+        for application in applications:
+            loop.run_until_complete(application.updater.start_polling(timeout=poll_timeout))
+            loop.run_until_complete(application.start())
+        loop.run_forever()
+    except (KeyboardInterrupt, SystemExit):
+        logger.debug("Отримано сигнал зупинки")
+    finally:
+        try:
+            for application in applications:
+                if application.updater.running:
+                    loop.run_until_complete(application.updater.stop())
+            for application in applications:
+                if application.running:
+                    loop.run_until_complete(application.stop())
+            for application in applications:
+                loop.run_until_complete(application.shutdown())
+            if first.post_shutdown:
+                loop.run_until_complete(first.post_shutdown(first))
+        finally:
+            loop.close()
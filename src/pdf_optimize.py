@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Зменшення PDF перед вивантаженням у Telegram.
+
+Кожен документ іде через `send_document`, тож розмір файлу — це час вивантаження й трафік.
+Після рендеру PDF проходить оптимізацію за профілем PDF_SIZE_PROFILE:
+  * off       — PDF як є;
+  * balanced  — стиснення потоків вмісту, злиття однакових об'єктів (шрифти, ресурси сторінок)
+                і видалення об'єктів, на які ніхто не посилається;
+  * smallest  — те саме з максимальним стисненням, без закладок і метаданих, а wkhtmltopdf
+                отримує нижчі DPI і якість зображень.
+Рушії:
+  A) pikepdf (qpdf, якщо встановлено) — додатково пакує об'єкти в стиснені object streams;
+  B) pypdf — чистий Python.
+
+Шрифти: wkhtmltopdf (Qt) і reportlab (TTF через @font-face) вбудовують лише підмножину
+використаних гліфів, тож окремий subsetting тут не потрібен; `font_report` показує, чи
+не потрапив у документ повний шрифт (бенчмарк benchmarks/bench_pdf_size.py).
+
+Оптимізація не може зламати рендер: при будь-якій помилці або якщо результат не менший,
+повертається оригінал.
+"""
+
+import io
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+logger = logging.getLogger("pdf_optimize")
+
+@dataclass(frozen=True)
+class SizeProfile:
+    name: str
+    enabled: bool = True
+    # Рівень zlib для потоків вмісту сторінок (-1 — типовий)
+    compress_level: int = -1
+    drop_outlines: bool = False
+    drop_metadata: bool = False
+    # Додаткові опції wkhtmltopdf (зображення в HTML-шаблонах)
+    wkhtmltopdf_options: dict = field(default_factory=dict)
+
+SIZE_PROFILES = {
+    "off": SizeProfile("off", enabled=False),
+    "balanced": SizeProfile("balanced"),
+    "smallest": SizeProfile(
+        "smallest", compress_level=9, drop_outlines=True, drop_metadata=True,
+        wkhtmltopdf_options={'image-dpi': '150', 'image-quality': '75'},
+    ),
+}
+
+def get_profile(name: str) -> SizeProfile:
+    profile = SIZE_PROFILES.get((name or "").strip().lower())
+    if profile is None:
+        logger.warning("Невідомий PDF_SIZE_PROFILE=%r — використовую balanced", name)
+        return SIZE_PROFILES["balanced"]
+    return profile
+
+PDF_SIZE_PROFILE = get_profile(os.getenv("PDF_SIZE_PROFILE", "balanced"))
+
+# --- Ліниві імпорти, щоб не падати, якщо пакетів немає ---
+def _try_import_pikepdf():
+    try:
+        import pikepdf  # type: ignore
+        return pikepdf
+    except Exception:
+        return None
+
+def _try_import_pypdf():
+    try:
+        import pypdf  # type: ignore
+        return pypdf
+    except Exception:
+        return None
+
+def _optimize_with_pikepdf(pikepdf, pdf: bytes, profile: SizeProfile) -> bytes:
+    with pikepdf.open(io.BytesIO(pdf)) as document:
+        document.remove_unreferenced_resources()
+        if profile.drop_outlines and "/Outlines" in document.Root:
+            del document.Root.Outlines
+        if profile.drop_metadata:
+            if "/Metadata" in document.Root:
+                del document.Root.Metadata
+            if "/Info" in document.trailer:
+                del document.trailer.Info
+        output = io.BytesIO()
+        document.save(
+            output,
+            compress_streams=True,
+            recompress_flate=profile.compress_level == 9,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+        )
+        return output.getvalue()
+
+def _optimize_with_pypdf(pypdf, pdf: bytes, profile: SizeProfile) -> bytes:
+    writer = pypdf.PdfWriter(clone_from=io.BytesIO(pdf))
+    for page in writer.pages:
+        page.compress_content_streams(level=profile.compress_level)
+    if profile.drop_outlines and "/Outlines" in writer.root_object:
+        del writer.root_object["/Outlines"]
+    if profile.drop_metadata:
+        writer.metadata = None
+        if "/Metadata" in writer.root_object:
+            del writer.root_object["/Metadata"]
+    # Однакові шрифти й ресурси сторінок — один об'єкт; осиротілі об'єкти — геть
+    writer.compress_identical_objects()
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+def optimize_pdf(pdf: bytes, profile: SizeProfile = PDF_SIZE_PROFILE) -> bytes:
+    """Стискає PDF за профілем; повертає оригінал, якщо оптимізація не вдалась або не допомогла."""
+    if not profile.enabled:
+        return pdf
+    pikepdf = _try_import_pikepdf()
+    pypdf = _try_import_pypdf() if pikepdf is None else None
+    if pikepdf is None and pypdf is None:
+        return pdf
+    started = time.perf_counter()
+    try:
+        if pikepdf is not None:
+            optimized = _optimize_with_pikepdf(pikepdf, pdf, profile)
+        else:
+            optimized = _optimize_with_pypdf(pypdf, pdf, profile)
+    except Exception as e:
+        logger.warning("Оптимізація PDF (%s) не вдалась, надсилаю оригінал: %s", profile.name, e)
+        return pdf
+    if len(optimized) >= len(pdf):
+        return pdf
+    logger.debug("PDF стиснуто (%s): %s → %s байт за %.1f мс", profile.name, len(pdf), len(optimized),
+                 (time.perf_counter() - started) * 1000)
+    return optimized
+
+def font_report(pdf: bytes) -> dict:
+    """
+    Шрифти документа: {'subset': [...], 'full': [...], 'not_embedded': [...]}.
+    Підмножина має в імені префікс із шести великих літер ("ABCDEF+Roboto").
+    """
+    report = {'subset': set(), 'full': set(), 'not_embedded': set()}
+    pypdf = _try_import_pypdf()
+    if pypdf is None:
+        return {}
+    reader = pypdf.PdfReader(io.BytesIO(pdf))
+    for page in reader.pages:
+        fonts = (page.get("/Resources") or {}).get("/Font") or {}
+        for font in fonts.get_object().values():
+            font = font.get_object()
+            descriptor = font.get("/FontDescriptor")
+            # Складені шрифти (Type0) тримають дескриптор у нащадку
+            if descriptor is None and "/DescendantFonts" in font:
+                descriptor = font["/DescendantFonts"][0].get_object().get("/FontDescriptor")
+            name = str(font.get("/BaseFont", "?")).lstrip("/")
+            descriptor = descriptor.get_object() if descriptor is not None else {}
+            if not any(key in descriptor for key in ("/FontFile", "/FontFile2", "/FontFile3")):
+                report['not_embedded'].add(name)
+            elif len(name) > 7 and name[6] == "+" and name[:6].isupper():
+                report['subset'].add(name)
+            else:
+                report['full'].add(name)
+    return {kind: sorted(names) for kind, names in report.items()}
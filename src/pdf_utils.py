@@ -2,20 +2,57 @@
 """
 Генерація PDF з Markdown (PDF-only).
 Черга спроб:
-  A) pdfkit + wkhtmltopdf (рекомендовано; шлях можна задати через env WKHTMLTOPDF_CMD)
+  A) wkhtmltopdf (рекомендовано; шлях можна задати через env WKHTMLTOPDF_CMD):
+     у боті — asyncio-підпроцес (HTML у stdin, PDF зі stdout, без потоків і файлів),
+     у синхронному коді — через pdfkit
   B) xhtml2pdf (pisa) — працює без зовнішніх бінарників (CSS дещо скромніший)
 
+PDF повертається як bytes (`render_pdf_bytes` / `render_pdf_bytes_async`) і не торкається диска;
+`create_pdf_from_markdown` лишається для коду, якому потрібен файл.
+
 Якщо жоден варіант недоступний — піднімається виняток із чіткою інструкцією, що встановити.
+
+Кожен рендер має дедлайн RENDER_TIMEOUT: процес wkhtmltopdf вбивається, а рендер xhtml2pdf
+(чистий Python, потік не зупинити) відкидається — його результат не буде використано.
+Невдачі й таймаути рахує запобіжник бекенда (circuit_breaker.py).
+
+У боті (`render_pdf_bytes_async`) Python-бекенди працюють в окремих робочих процесах
+з лімітом пам'яті (render_workers.py), а не в процесі бота; пік пам'яті кожного рендеру
+(і процесу wkhtmltopdf) пишеться в лог і в статистику за бекендами.
+
+Готовий PDF стискається за профілем PDF_SIZE_PROFILE (pdf_optimize.py): для Python-бекендів —
+ще в робочому процесі, для асинхронного wkhtmltopdf — у робочому потоці.
 """
 
+import asyncio
+import io
 import logging
 import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
 from typing import Optional
 
 import markdown2
 
+from circuit_breaker import CircuitBreaker
+from pdf_optimize import PDF_SIZE_PROFILE, optimize_pdf
+from render_workers import RenderWorkerCrashed, _proc_memory_kb, render_memory, render_worker_pool
+
 logger = logging.getLogger("pdf_utils")
-logger.setLevel(logging.INFO)
+
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "30"))
+
+class RenderBackendError(Exception):
+    """Бекенд доступний, але не зміг створити PDF."""
+
+class RenderTimeout(RenderBackendError):
+    """Бекенд не вклався в RENDER_TIMEOUT."""
+
+class PdfUnavailable(Exception):
+    """Жоден бекенд не створив PDF (не встановлені, впали або розімкнені запобіжником)."""
 
 # --- Ліниві імпорти, щоб не падати, якщо пакетів немає ---
 def _try_import_pdfkit():
@@ -94,105 +131,355 @@ def _md_to_html(md_content: str) -> str:
     )
     return f"<html><head><meta charset='UTF-8'>{PDF_CSS_STYLE}</head><body>{html_body}</body></html>"
 
-def _generate_with_pdfkit(html_full: str, output_filename: str) -> bool:
-    """Спроба 1: Генерація через pdfkit (wkhtmltopdf)."""
+def create_html_from_markdown(content: str) -> str:
+    """Самодостатній HTML (зі стилями) — легкий формат без PDF-рушія."""
+    return _md_to_html(content)
+
+# Спільні опції wkhtmltopdf (і для pdfkit, і для асинхронного бекенда)
+WKHTMLTOPDF_OPTIONS = {
+    'encoding': "UTF-8",
+    'page-size': 'A4',
+    'margin-top': '20mm',
+    'margin-bottom': '22mm',
+    'margin-left': '17mm',
+    'margin-right': '17mm',
+    'quiet': '',
+    **PDF_SIZE_PROFILE.wkhtmltopdf_options,
+}
+
+def _find_wkhtmltopdf() -> Optional[str]:
+    """Шлях до wkhtmltopdf: WKHTMLTOPDF_CMD або PATH."""
+    wkhtmltopdf_path_env = os.getenv("WKHTMLTOPDF_CMD")
+    if wkhtmltopdf_path_env and os.path.exists(wkhtmltopdf_path_env):
+        return wkhtmltopdf_path_env
+    return shutil.which("wkhtmltopdf")
+
+def _generate_with_pdfkit(html_full: str) -> Optional[bytes]:
+    """
+    Спроба 1: Генерація через pdfkit (wkhtmltopdf).
+    pdfkit лише будує команду — процес запускаємо самі, щоб мати таймаут і вбити його, якщо завис.
+    """
     pdfkit = _try_import_pdfkit()
     if not pdfkit:
         logger.warning("Бібліотека 'pdfkit' не встановлена. Пропускаю...")
-        return False
+        return None
 
     try:
         # Шукаємо wkhtmltopdf
         wkhtmltopdf_path_env = os.getenv("WKHTMLTOPDF_CMD")
         config = None
         if wkhtmltopdf_path_env and os.path.exists(wkhtmltopdf_path_env):
-            logger.info(f"Використовую wkhtmltopdf з WKHTMLTOPDF_CMD: {wkhtmltopdf_path_env}")
+            logger.info("Використовую wkhtmltopdf з WKHTMLTOPDF_CMD: %s", wkhtmltopdf_path_env)
             config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path_env)
-        
-        options = {
-            'encoding': "UTF-8",
-            'page-size': 'A4',
-            'margin-top': '20mm',
-            'margin-bottom': '22mm',
-            'margin-left': '17mm',
-            'margin-right': '17mm',
-            'quiet': ''
-        }
-        
-        pdfkit.from_string(html_full, output_filename, options=options, configuration=config)
-        return True
-    
+        kit = pdfkit.PDFKit(html_full, 'string', options=WKHTMLTOPDF_OPTIONS, configuration=config)
     except IOError as e:
         if "No wkhtmltopdf executable found" in str(e):
             logger.warning("wkhtmltopdf не знайдено у PATH. Спроба 2: xhtml2pdf...")
-        else:
-            logger.error(f"pdfkit впав з помилкою вводу-виводу: {e}")
-        return False
+            return None
+        raise RenderBackendError(f"pdfkit впав з помилкою вводу-виводу: {e}") from e
+
+    try:
+        # Окрема група процесів, щоб після таймауту вбити wkhtmltopdf разом з нащадками.
+        # Без шляху виводу команда пише PDF у stdout
+        process = subprocess.Popen(
+            kit.command(),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            env=kit.environ, start_new_session=True,
+        )
+        try:
+            stdout, stderr = process.communicate(html_full.encode("utf-8"), timeout=RENDER_TIMEOUT)
+        except subprocess.TimeoutExpired as e:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            raise RenderTimeout(f"wkhtmltopdf не вклався в {RENDER_TIMEOUT:g} с — процес вбито") from e
+        kit.handle_error(process.returncode, (stderr or b"").decode("utf-8", errors="replace"))
+    except RenderTimeout:
+        raise
     except Exception as e:
-        logger.error(f"pdfkit впав з невідомою помилкою: {e}")
-        return False
+        raise RenderBackendError(f"pdfkit впав з помилкою: {e}") from e
+    if not stdout.startswith(b"%PDF"):
+        raise RenderBackendError("wkhtmltopdf завершився без PDF")
+    return stdout
 
-def _generate_with_xhtml2pdf(html_full: str, output_filename: str) -> bool:
-    """Спроба 2: Генерація через xhtml2pdf (чистий Python)."""
+def _generate_with_xhtml2pdf(html_full: str) -> Optional[bytes]:
+    """
+    Спроба 2: Генерація через xhtml2pdf (чистий Python).
+    Рендер іде в окремому потоці в пам'ять; якщо не вклався в дедлайн — результат відкидається.
+    """
     pisa = _try_import_xhtml2pdf()
     if not pisa:
         logger.warning("Бібліотека 'xhtml2pdf' не встановлена. Пропускаю...")
-        return False
+        return None
     
-    try:
-        with open(output_filename, "w+b") as result_file:
-            # Конвертуємо HTML в PDF
-            pisa_status = pisa.CreatePDF(
-                html_full,                # HTML-вміст
-                dest=result_file,         # Файл
-                encoding='utf-8'
-            )
-        
-        if not pisa_status.err:
-            logger.info("PDF успішно створено через xhtml2pdf.")
-            return True
-        else:
-            logger.error(f"xhtml2pdf впав з помилкою: {pisa_status.err}")
-            return False
-            
-    except Exception as e:
-        logger.warning(f"xhtml2pdf впав: {e}")
-        return False
+    outcome = {}
+
+    def render():
+        buffer = io.BytesIO()
+        try:
+            pisa_status = pisa.CreatePDF(html_full, dest=buffer, encoding='utf-8')
+            outcome['err'] = pisa_status.err
+            outcome['pdf'] = buffer.getvalue()
+        except Exception as e:
+            outcome['exception'] = e
+
+    worker = threading.Thread(target=render, name="xhtml2pdf-render", daemon=True)
+    worker.start()
+    worker.join(RENDER_TIMEOUT)
+    if worker.is_alive():
+        raise RenderTimeout(f"xhtml2pdf не вклався в {RENDER_TIMEOUT:g} с — результат відкинуто")
+    if isinstance(outcome.get('exception'), MemoryError):
+        # Ліміт пам'яті робочого процесу — хай його обробить render_workers
+        raise outcome['exception']
+    if 'exception' in outcome:
+        raise RenderBackendError(f"xhtml2pdf впав: {outcome['exception']}")
+    if outcome['err']:
+        raise RenderBackendError(f"xhtml2pdf впав з помилкою: {outcome['err']}")
+    return outcome['pdf']
+
+# Бекенди в порядку пріоритету: (назва, функція, запобіжник)
+PDF_BACKENDS = (
+    ("wkhtmltopdf", _generate_with_pdfkit, CircuitBreaker("wkhtmltopdf")),
+    ("xhtml2pdf", _generate_with_xhtml2pdf, CircuitBreaker("xhtml2pdf")),
+)
+_BREAKERS = {name: breaker for name, _, breaker in PDF_BACKENDS}
+
+def backend_states() -> dict:
+    """Стан запобіжників бекендів (для логів і статистики)."""
+    return {name: breaker.snapshot() for name, _, breaker in PDF_BACKENDS}
+
+def _unavailable() -> PdfUnavailable:
+    # Жоден варіант не спрацював → пояснюємо, що встановити
+    return PdfUnavailable(
+        "Не вдалося створити PDF.\n\n"
+        "**Варіант A (рекомендовано):** Встановіть `wkhtmltopdf` у вашій системі (напр., `sudo apt install wkhtmltopdf`).\n"
+        "**Варіант B (запасний):** Встановіть `xhtml2pdf` (`pip install xhtml2pdf`)."
+    )
+
+def render_pdf_bytes(content: str, skip_backends: tuple = ()) -> bytes:
+    """
+    Синхронно рендерить Markdown у PDF (у пам'яті), перебираючи бекенди за пріоритетом.
+    Піднімає PdfUnavailable, якщо PDF не вийшло. Викликати в робочому потоці.
+    """
+    html_full = _md_to_html(content)
+    started = time.perf_counter()
+    for name, generate, breaker in PDF_BACKENDS:
+        if name in skip_backends:
+            continue
+        if not breaker.allow():
+            logger.info("Бекенд %s пропущено: запобіжник розімкнено", name)
+            continue
+        try:
+            pdf = generate(html_full)
+        except RenderBackendError as e:
+            logger.error(str(e))
+            breaker.record_failure(type(e).__name__)
+            continue
+        if pdf is None:
+            breaker.release()
+            continue
+        breaker.record_success()
+        pdf = optimize_pdf(pdf)
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("PDF створено через %s: %s байт за %s мс", name, len(pdf), duration_ms,
+                    extra={"sample": True, "backend": name, "duration_ms": duration_ms, "pdf_bytes": len(pdf)})
+        return pdf
+    raise _unavailable()
 
 def create_pdf_from_markdown(content: str, is_html: bool, output_filename: str) -> str:
     """
     (ОНОВЛЕНО v2.9)
     Генерує *PDF-файл* з Markdown.
-    Повертає шлях до PDF (output_filename). Якщо PDF створити не вийшло — піднімає виняток з інструкцією.
+    Повертає шлях до PDF (output_filename). Якщо PDF створити не вийшло — піднімає PdfUnavailable з інструкцією.
     """
-    logger.info(f"Старт генерації PDF (v2.9 Гібрид): {output_filename}")
+    logger.info("Старт генерації PDF (v2.9 Гібрид): %s", output_filename)
     # is_html ігнорується, ми завжди передаємо Markdown з v2.8
-    html_full = _md_to_html(content)
+    pdf = render_pdf_bytes(content)
+    with open(output_filename, "wb") as result_file:
+        result_file.write(pdf)
+    return output_filename
 
-    # A) wkhtmltopdf (краща якість)
-    if _generate_with_pdfkit(html_full, output_filename):
-        logger.info(f"PDF створено через wkhtmltopdf: {output_filename}")
-        return output_filename
+# --- Асинхронний бекенд: wkhtmltopdf через asyncio, stdin → stdout ---
 
-    # B) xhtml2pdf (без зовнішніх бінарників)
-    if _generate_with_xhtml2pdf(html_full, output_filename):
-        logger.info(f"PDF створено через xhtml2pdf: {output_filename}")
-        return output_filename
+def _wkhtmltopdf_args(binary: str) -> list:
+    args = [binary]
+    for key, value in WKHTMLTOPDF_OPTIONS.items():
+        args.append(f"--{key}")
+        if value:
+            args.append(value)
+    # "-" "-": HTML зі stdin, PDF у stdout
+    return args + ["-", "-"]
 
-    # Обидва варіанти недоступні → пояснюємо, що встановити
-    raise Exception(
-        "Не вдалося створити PDF.\n\n"
-        "**Варіант A (рекомендовано):** Встановіть `wkhtmltopdf` у вашій системі (напр., `sudo apt install wkhtmltopdf`).\n"
-        "**Варіант B (запасний):** Встановіть `xhtml2pdf` (`pip install xhtml2pdf`)."
+# Як часто (секунди) знімати пік пам'яті процесу wkhtmltopdf
+_RSS_SAMPLE_INTERVAL = 0.05
+
+async def _sample_peak_rss(pid: int, peak: list) -> None:
+    """Пік RSS (КБ) підпроцесу в `peak[0]`: VmHWM лише зростає, тож останній зріз до виходу — найкраща оцінка."""
+    while True:
+        peak[0] = max(peak[0], _proc_memory_kb(pid)[0])
+        await asyncio.sleep(_RSS_SAMPLE_INTERVAL)
+
+async def _generate_with_wkhtmltopdf_async(html_full: str) -> Optional[bytes]:
+    """
+    wkhtmltopdf як asyncio-підпроцес: без потоку, без файлів, з дедлайном.
+    Процес вбивається і після таймауту, і якщо рендер скасовано (drain, /cancel).
+    """
+    binary = _find_wkhtmltopdf()
+    if not binary:
+        return None
+    process = await asyncio.create_subprocess_exec(
+        *_wkhtmltopdf_args(binary),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
+    peak_kb = [0]
+    sampler = asyncio.ensure_future(_sample_peak_rss(process.pid, peak_kb))
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(html_full.encode("utf-8")), RENDER_TIMEOUT)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        if isinstance(e, asyncio.TimeoutError):
+            raise RenderTimeout(f"wkhtmltopdf не вклався в {RENDER_TIMEOUT:g} с — процес вбито") from e
+        raise
+    finally:
+        sampler.cancel()
+    render_memory.record("wkhtmltopdf_async", peak_kb[0])
+    if not stdout.startswith(b"%PDF"):
+        error = (stderr or b"").decode("utf-8", errors="replace").strip()[-300:]
+        raise RenderBackendError(f"wkhtmltopdf (async) завершився з кодом {process.returncode}: {error}")
+    return stdout
+
+# Робочий процес отримує власний дедлайн трохи пізніше за дедлайн бекенда в ньому
+_WORKER_TIMEOUT_MARGIN = 5
+
+async def render_pdf_bytes_async(content: str) -> bytes:
+    """
+    Рендерить PDF, не блокуючи event loop: спершу асинхронний wkhtmltopdf,
+    а якщо його немає або він розімкнений — Python-бекенди в робочих процесах
+    з лімітом пам'яті (render_workers.py, див. `_render_in_workers`).
+    """
+    html_full = _md_to_html(content)
+    started = time.perf_counter()
+    breaker = _BREAKERS["wkhtmltopdf"]
+    attempted = False
+    if breaker.allow():
+        try:
+            pdf = await _generate_with_wkhtmltopdf_async(html_full)
+        except RenderBackendError as e:
+            logger.error(str(e))
+            breaker.record_failure(type(e).__name__)
+            attempted = True
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            if pdf is not None:
+                breaker.record_success()
+                pdf = await asyncio.to_thread(optimize_pdf, pdf)
+                duration_ms = round((time.perf_counter() - started) * 1000, 1)
+                peak_rss_mb = render_memory.snapshot().get("wkhtmltopdf_async", {}).get("peak_rss_mb_last", 0.0)
+                logger.info("PDF створено через wkhtmltopdf (async): %s байт за %s мс, пік пам'яті %s МБ",
+                            len(pdf), duration_ms, peak_rss_mb,
+                            extra={"sample": True, "backend": "wkhtmltopdf_async", "duration_ms": duration_ms,
+                                   "pdf_bytes": len(pdf), "peak_rss_mb": peak_rss_mb})
+                return pdf
+            breaker.release()
+    # wkhtmltopdf вже пробували (або його немає) — лишаються бекенди в робочих процесах
+    skip = ("wkhtmltopdf",) if attempted or not _find_wkhtmltopdf() else ()
+    return await _render_in_workers(html_full, skip, started)
+
+async def _render_in_workers(html_full: str, skip_backends: tuple, started: float) -> bytes:
+    """Як `render_pdf_bytes`, але кожна спроба йде в робочий процес (render_workers.py)."""
+    for name, _, breaker in PDF_BACKENDS:
+        if name in skip_backends:
+            continue
+        if not breaker.allow():
+            logger.info("Бекенд %s пропущено: запобіжник розімкнено", name)
+            continue
+        try:
+            pdf, peak_kb = await render_worker_pool.run(name, html_full, RENDER_TIMEOUT + _WORKER_TIMEOUT_MARGIN)
+        except RenderBackendError as e:
+            logger.error(str(e))
+            breaker.record_failure(type(e).__name__)
+            continue
+        except RenderWorkerCrashed as e:
+            logger.error("%s: %s", name, e)
+            breaker.record_failure(type(e).__name__)
+            continue
+        except BaseException:
+            breaker.release()
+            raise
+        if pdf is None:
+            breaker.release()
+            continue
+        breaker.record_success()
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        peak_rss_mb = round(peak_kb / 1024, 1)
+        logger.info("PDF створено через %s (робочий процес): %s байт за %s мс, пік пам'яті %s МБ",
+                    name, len(pdf), duration_ms, peak_rss_mb,
+                    extra={"sample": True, "backend": name, "duration_ms": duration_ms, "pdf_bytes": len(pdf),
+                           "peak_rss_mb": peak_rss_mb})
+        return pdf
+    raise _unavailable()
+
+WARMUP_MARKDOWN = """# Прогрів
+**Дата:** 01.01.2000
+
+| Питання | Відповідь |
+| :--- | :--- |
+| Назва проєкту: | Прогрів рендерера ✅ |
+"""
+
+async def warm_up_renderer() -> float:
+    """
+    Запускає всі робочі процеси рендеру (render_workers.py — звичайні підпроцеси, що обмінюються
+    з ботом pickle-повідомленнями через stdin/stdout і одразу після старту імпортують xhtml2pdf)
+    і рендерить одноразовий документ, щоб пройти першу ініціалізацію бекенда.
+    Повертає тривалість прогріву в секундах.
+    """
+    started = time.perf_counter()
+    await render_worker_pool.warm_up()
+    await render_pdf_bytes_async(WARMUP_MARKDOWN)
+    return time.perf_counter() - started
+
+SELF_TEST_MARKDOWN = """# Самоперевірка
+| Питання | Відповідь |
+| :--- | :--- |
+| Рендер: | ✅ |
+"""
+
+async def self_test_backends(content: str = SELF_TEST_MARKDOWN) -> dict:
+    """
+    Крихітний рендер кожним бекендом окремо — тими ж шляхами, що й у боті (асинхронний wkhtmltopdf,
+    робочі процеси), але повз запобіжники, щоб перевірка не впливала на користувачів.
+    Повертає {бекенд: {'status': 'ok' | 'failed' | 'unavailable', 'ms', 'bytes' або 'error'}}.
+    """
+    html_full = _md_to_html(content)
+    results = {}
+    for name, _, _ in PDF_BACKENDS:
+        started = time.perf_counter()
+        try:
+            if name == "wkhtmltopdf" and _find_wkhtmltopdf():
+                pdf = await _generate_with_wkhtmltopdf_async(html_full)
+            else:
+                pdf, _ = await render_worker_pool.run(name, html_full, RENDER_TIMEOUT + _WORKER_TIMEOUT_MARGIN)
+        except (RenderBackendError, RenderWorkerCrashed) as e:
+            results[name] = {'status': 'failed', 'error': str(e)[:300]}
+        else:
+            results[name] = {'status': 'ok', 'bytes': len(pdf)} if pdf else {'status': 'unavailable'}
+        results[name]['ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return results
 
 def clear_temp_file(filepath: str):
     """Видаляє тимчасовий PDF-файл після надсилання."""
     try:
         if os.path.exists(filepath):
             os.remove(filepath)
-            logger.info(f"Тимчасовий файл видалено: {filepath}")
+            logger.info("Тимчасовий файл видалено: %s", filepath)
         else:
-            logger.warning(f"TІMЧАСОВИЙ ФАЙЛ НЕ ЗНАЙДЕНО для видалення: {filepath}")
+            logger.warning("TІMЧАСОВИЙ ФАЙЛ НЕ ЗНАЙДЕНО для видалення: %s", filepath)
     except Exception as e:
-        logger.error(f"Помилка під час видалення тимчасового файлу {filepath}: {e}")
\ No newline at end of file
+        logger.error("Помилка під час видалення тимчасового файлу %s: %s", filepath, e)
\ No newline at end of file
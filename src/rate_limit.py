@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Ліміти на користувача: token bucket для кожної квоти.
+
+Квоти задаються як "кількість/секунди" (0 — вимкнено):
+  RATE_LIMIT_MESSAGES    — будь-які повідомлення й натискання (за замовчуванням 5/1);
+  RATE_LIMIT_FLOW_STARTS — початок нового документа з меню (6/600);
+  RATE_LIMIT_RENDERS     — генерації документа (10/3600).
+"Кількість" — це і розмір сплеску, і скільки токенів відновлюється за "секунди".
+
+Ключ — id користувача Telegram (однаковий для всіх ботів процесу, тож ліміт спільний,
+як і черга рендеру). Відро, що встигло відновитися повністю, нічим не відрізняється від нового,
+тож його можна забути: відра лежать в OrderedDict у порядку останнього звернення, і при кожній
+перевірці з голови прибираються ті, що вже повні. Вартість перевірки стала, пам'ять — лише
+для тих, хто звертався протягом останнього періоду.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("rate_limit")
+
+def _parse_quota(value: str) -> tuple:
+    """Квота "5/1" → (5, 1.0); "0" чи порожньо → (0, 0.0), тобто вимкнено."""
+    if not value or value.strip() == "0":
+        return 0, 0.0
+    count, _, seconds = value.partition("/")
+    return int(count), float(seconds or "1")
+
+RATE_LIMIT_MESSAGES = _parse_quota(os.getenv("RATE_LIMIT_MESSAGES", "5/1"))
+RATE_LIMIT_FLOW_STARTS = _parse_quota(os.getenv("RATE_LIMIT_FLOW_STARTS", "6/600"))
+RATE_LIMIT_RENDERS = _parse_quota(os.getenv("RATE_LIMIT_RENDERS", "10/3600"))
+
+class TokenBucketLimiter:
+    def __init__(self, name: str, capacity: int, period: float):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self.limited_total = 0
+        # ключ → [токени, час останнього звернення, чи вже попереджали]
+        self._buckets = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.period > 0
+
+    def acquire(self, key, now: float = None) -> float:
+        """Бере токен: 0.0, якщо дозволено, інакше — скільки секунд чекати до наступного."""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        bucket = self._refill(key, now)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return 0.0
+        self.limited_total += 1
+        return (1 - bucket[0]) * self.period / self.capacity
+
+    def refund(self, key) -> None:
+        """Повертає токен, якщо дію відхилено не з вини користувача (напр., черга рендеру повна)."""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.capacity, bucket[0] + 1)
+
+    def should_warn(self, key) -> bool:
+        """True лише для першої відмови поспіль — щоб попередження самі не стали спамом."""
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket[2]:
+            return False
+        bucket[2] = True
+        logger.info("Ліміт %s вичерпано: %s", self.name, key)
+        return True
+
+    def _refill(self, key, now: float) -> list:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.capacity), now, False]
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.capacity / self.period)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _expire(self, now: float) -> None:
+        # За `period` секунд порожнє відро наповнюється повністю
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.period:
+                break
+            del self._buckets[key]
+
+    def stats(self) -> dict:
+        return {'tracked_users': len(self._buckets), 'limited_total': self.limited_total}
+
+class UserRateLimits:
+    def __init__(self, messages: tuple = RATE_LIMIT_MESSAGES, flow_starts: tuple = RATE_LIMIT_FLOW_STARTS,
+                 renders: tuple = RATE_LIMIT_RENDERS):
+        self.messages = TokenBucketLimiter('messages', *messages)
+        self.flow_starts = TokenBucketLimiter('flow_starts', *flow_starts)
+        self.renders = TokenBucketLimiter('renders', *renders)
+
+    def stats(self) -> dict:
+        return {limiter.name: limiter.stats() for limiter in (self.messages, self.flow_starts, self.renders)}
+
+def format_wait(seconds: float) -> str:
+    """Час очікування для повідомлення користувачу: "12 с" або "7 хв"."""
+    seconds = max(1, round(seconds))
+    return f"{seconds} с" if seconds < 60 else f"{-(-seconds // 60)} хв"
+
+user_rate_limits = UserRateLimits()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Черга PDF-рендерів і контроль допуску генерацій.
+
+Рендер не блокує event loop (`render_pdf_bytes_async`: асинхронний wkhtmltopdf
+або xhtml2pdf у робочих процесах render_workers.py). Одночасно працює не більше RENDER_CONCURRENCY
+рендерів; решта чекає у FIFO-черзі. Якщо в черзі вже RENDER_SATURATION або більше документів,
+`is_saturated()` повертає True — бот тоді видає легкий формат (HTML) замість PDF.
+
+Допуск: одночасно в роботі не більше GENERATION_LIMIT генерацій (будь-якого формату).
+Понад цю межу `admit()` піднімає RenderQueueFull, і користувач отримує прохання
+повторити пізніше замість нескінченного очікування.
+
+Кілька ботів в одному процесі (multi_bot.py) ділять одну чергу, але кожен бот має свою
+смугу (`lane`): звільнений слот рендеру віддається смугам по колу, тож бот зі сплеском
+генерацій не змушує інших ботів чекати за всією своєю чергою. В межах смуги — FIFO.
+
+Рендер прив'язаний до власника (`owner` — бот і чат): `cancel(owner)` (/cancel користувача)
+прибирає документ із черги або зупиняє рендер, що вже йде (процес wkhtmltopdf чи робочий
+процес рендеру вбивається), а той, хто чекав на PDF, отримує RenderCancelled.
+Статистика рахує, скільки часу рендеру так заощаджено.
+
+Для кожного PDF у черзі відомі позиція та ETA (за ковзним середнім часу рендеру),
+а `stats()` повертає глибину черги, кількість відмов, час очікування, стан запобіжників бекендів,
+пік пам'яті рендерів за бекендами і стан робочих процесів рендеру.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from pdf_utils import backend_states, render_pdf_bytes_async
+from render_workers import render_memory, render_worker_pool
+
+logger = logging.getLogger("render_queue")
+
+RENDER_CONCURRENCY = int(os.getenv("RENDER_CONCURRENCY", "1"))
+RENDER_SATURATION = int(os.getenv("RENDER_SATURATION", str(RENDER_CONCURRENCY * 4)))
+GENERATION_LIMIT = int(os.getenv("GENERATION_LIMIT", "64"))
+# Як часто (секунди) перевіряти позицію в черзі для того, хто чекає
+RENDER_PROGRESS_INTERVAL = float(os.getenv("RENDER_PROGRESS_INTERVAL", "5"))
+# Оцінка часу одного рендеру до перших вимірів (секунди)
+RENDER_SECONDS_GUESS = float(os.getenv("RENDER_SECONDS_GUESS", "2"))
+
+# Вага нового виміру в ковзному середньому часу рендеру
+_EWMA_ALPHA = 0.2
+# Скільки останніх очікувань зберігати для перцентилів
+_WAIT_SAMPLES = 256
+
+class RenderQueueFull(Exception):
+    """Генерацію не допущено: у роботі вже GENERATION_LIMIT документів."""
+
+class RenderCancelled(Exception):
+    """Рендер скасовано власником (/cancel) — PDF уже не потрібен."""
+
+class RenderQueue:
+    def __init__(self, concurrency: int, saturation: int, limit: int = GENERATION_LIMIT):
+        self.concurrency = concurrency
+        self.saturation = saturation
+        self.limit = limit
+        self.pending = 0
+        self.admitted = 0
+        self.shed_total = 0
+        self.completed_total = 0
+        self.render_seconds = RENDER_SECONDS_GUESS
+        self._issued = 0
+        self._started = 0
+        self._waits = deque(maxlen=_WAIT_SAMPLES)
+        # Рендери, що йдуть, і ті, хто чекає на слот: смуга → FIFO futures (смуги по колу)
+        self._running = 0
+        self._lanes = OrderedDict()
+        # Рендери з власником: задача → (власник, стан); стан знає, чи почався рендер
+        self._jobs = {}
+        self.cancelled_queued = 0
+        self.cancelled_running = 0
+        self.render_seconds_saved = 0.0
+
+    def is_saturated(self) -> bool:
+        return self.pending >= self.saturation
+
+    @contextmanager
+    def admit(self):
+        """Допускає одну генерацію на час блоку `with` або піднімає RenderQueueFull."""
+        if self.admitted >= self.limit:
+            self.shed_total += 1
+            logger.warning("Генерацію відхилено: у роботі %s/%s", self.admitted, self.limit)
+            raise RenderQueueFull()
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.admitted -= 1
+
+    def estimate(self, ticket: int = None) -> tuple:
+        """
+        (позиція, ETA в секундах) для квитка `ticket` або для нового документа.
+        Позиція 1 — наступний у черзі, 0 — рендер уже йде (або почнеться одразу).
+        """
+        if ticket is None:
+            position = self.pending - self.concurrency + 1 if self.pending >= self.concurrency else 0
+        else:
+            position = max(0, ticket - self._started)
+        rounds = math.ceil(position / self.concurrency)
+        return position, math.ceil((rounds + 1) * self.render_seconds)
+
+    async def render_pdf(self, markdown: str, on_progress=None, lane=None, owner=None) -> bytes:
+        """
+        Рендерить PDF у черзі й повертає його вміст. Поки документ чекає, `on_progress(position, eta)`
+        (async) викликається щоразу, як змінюється його позиція. `lane` — смуга (бот) для справедливої черги,
+        `owner` — ключ для `cancel` (напр., (id бота, id чату)); скасований так рендер піднімає RenderCancelled.
+        """
+        state = {'started_at': None, 'cancelled': False}
+        job = asyncio.ensure_future(self._render(markdown, on_progress, lane, state))
+        if owner is not None:
+            self._jobs[job] = (owner, state)
+        try:
+            return await job
+        except asyncio.CancelledError:
+            # Скасовано саме рендер (власником), а не того, хто на нього чекає
+            if state['cancelled'] and not asyncio.current_task().cancelling():
+                raise RenderCancelled() from None
+            raise
+        finally:
+            self._jobs.pop(job, None)
+
+    def cancel(self, owner) -> int:
+        """Скасовує рендери власника `owner` (у черзі чи вже запущені); повертає їхню кількість."""
+        cancelled = 0
+        now = time.perf_counter()
+        for job, (job_owner, state) in list(self._jobs.items()):
+            if job_owner != owner or job.done() or state['cancelled']:
+                continue
+            state['cancelled'] = True
+            job.cancel()
+            cancelled += 1
+            if state['started_at'] is None:
+                self.cancelled_queued += 1
+                self.render_seconds_saved += self.render_seconds
+            else:
+                self.cancelled_running += 1
+                self.render_seconds_saved += max(0.0, self.render_seconds - (now - state['started_at']))
+        if cancelled:
+            logger.info("Скасовано рендерів: %s (власник %s)", cancelled, owner)
+        return cancelled
+
+    async def _render(self, markdown: str, on_progress, lane, state: dict) -> bytes:
+        self.pending += 1
+        self._issued += 1
+        ticket = self._issued
+        enqueued_at = time.perf_counter()
+        try:
+            try:
+                await self._acquire(ticket, on_progress, lane)
+            except asyncio.CancelledError:
+                # Квиток вибув із черги — позиції тих, хто за ним, зсуваються
+                self._started += 1
+                raise
+            self._started += 1
+            self._waits.append(time.perf_counter() - enqueued_at)
+            try:
+                started_at = state['started_at'] = time.perf_counter()
+                result = await render_pdf_bytes_async(markdown)
+                self.render_seconds += _EWMA_ALPHA * (time.perf_counter() - started_at - self.render_seconds)
+                self.completed_total += 1
+                return result
+            finally:
+                self._release()
+        finally:
+            self.pending -= 1
+
+    async def _acquire(self, ticket: int, on_progress, lane) -> None:
+        if self._running < self.concurrency and not self._lanes:
+            self._running += 1
+            return
+        granted = asyncio.get_running_loop().create_future()
+        self._lanes.setdefault(lane, deque()).append(granted)
+        reported = self.estimate(ticket)[0]
+        try:
+            while not (await asyncio.wait({granted}, timeout=RENDER_PROGRESS_INTERVAL))[0]:
+                position, eta = self.estimate(ticket)
+                if on_progress and position != reported:
+                    reported = position
+                    await on_progress(position, eta)
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                # Слот уже віддали нам — передаємо далі
+                self._release()
+            else:
+                granted.cancel()
+                waiters = self._lanes.get(lane)
+                if waiters is not None and granted in waiters:
+                    waiters.remove(granted)
+                    if not waiters:
+                        del self._lanes[lane]
+            raise
+
+    def _release(self) -> None:
+        """Віддає звільнений слот першому, хто чекає в наступній по колу смузі."""
+        while self._lanes:
+            lane, waiters = next(iter(self._lanes.items()))
+            granted = waiters.popleft()
+            if waiters:
+                self._lanes.move_to_end(lane)
+            else:
+                del self._lanes[lane]
+            if not granted.done():
+                granted.set_result(None)
+                return
+        self._running -= 1
+
+    def stats(self) -> dict:
+        """Глибина черги, відмови та час очікування (перцентилі за останні _WAIT_SAMPLES рендерів)."""
+        waits = sorted(self._waits)
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 3) if waits else 0.0
+        return {
+            'pending': self.pending,
+            'waiting': max(0, self.pending - self.concurrency),
+            'admitted': self.admitted,
+            'limit': self.limit,
+            'shed_total': self.shed_total,
+            'completed_total': self.completed_total,
+            'render_seconds_avg': round(self.render_seconds, 3),
+            'wait_seconds_p50': percentile(0.5),
+            'wait_seconds_p95': percentile(0.95),
+            'wait_seconds_max': round(waits[-1], 3) if waits else 0.0,
+            'waiting_by_lane': {str(lane): len(waiters) for lane, waiters in self._lanes.items()},
+            'cancelled_queued': self.cancelled_queued,
+            'cancelled_running': self.cancelled_running,
+            'render_seconds_saved': round(self.render_seconds_saved, 1),
+            'backends': backend_states(),
+            'memory': render_memory.snapshot(),
+            'workers': render_worker_pool.snapshot(),
+        }
+
+render_queue = RenderQueue(RENDER_CONCURRENCY, RENDER_SATURATION)
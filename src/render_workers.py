@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Робочі процеси для рендеру PDF.
+
+xhtml2pdf і reportlab роздувають процес на десятки МБ на великий документ і не повертають
+цю пам'ять системі. Тому Python-бекенди рендерять не в процесі бота, а в окремих
+робочих процесах (`RenderWorkerPool`):
+  * кожен процес має ліміт адресного простору RENDER_WORKER_MEMORY_MB (RLIMIT_AS) —
+    рендер, що виходить за нього, отримує MemoryError, а не OOM killer весь бот;
+  * процес замінюється новим після RENDER_WORKER_MAX_JOBS рендерів або коли його RSS
+    перевищує RENDER_WORKER_MAX_RSS_MB, а також після будь-якого невдалого рендеру;
+  * скасований рендер (drain, /cancel) вбиває процес разом із рендером.
+Заміну запускаємо одразу у фоні, тож наступний рендер не чекає на імпорт xhtml2pdf.
+
+Процес — це `python render_workers.py <ліміт МБ>`: запити й відповіді йдуть через
+stdin/stdout як pickle з 4-байтовою довжиною попереду, тож бот читає їх асинхронно,
+без потоків. Готовий PDF процес одразу стискає (pdf_optimize.py). Після кожного рендеру процес повідомляє пік пам'яті (VmHWM, скинутий
+перед рендером); `render_memory` збирає ці піки за бекендами для логів і статистики черги.
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import resource
+import signal
+import struct
+import sys
+
+logger = logging.getLogger("render_workers")
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.getenv("RENDER_CONCURRENCY", "1")))
+RENDER_WORKER_MEMORY_MB = int(os.getenv("RENDER_WORKER_MEMORY_MB", "1536"))
+RENDER_WORKER_MAX_JOBS = int(os.getenv("RENDER_WORKER_MAX_JOBS", "100"))
+RENDER_WORKER_MAX_RSS_MB = int(os.getenv("RENDER_WORKER_MAX_RSS_MB", "300"))
+# Скільки секунд чекати, поки процес завершиться сам під час зупинки бота, перш ніж вбити
+_STOP_TIMEOUT = 5.0
+
+_HEADER = struct.Struct(">I")
+
+class RenderWorkerCrashed(Exception):
+    """Робочий процес помер або не відповів (OOM killer, ліміт пам'яті, зависання)."""
+
+# --- Пам'ять процесу (Linux /proc; деінде — лише ru_maxrss) ---
+
+def _proc_memory_kb(pid="self") -> tuple:
+    """(пік RSS, поточний RSS) у КБ з /proc/<pid>/status; (0, 0), якщо недоступно."""
+    peak = rss = 0
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    peak = int(line.split()[1])
+                elif line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+    except OSError:
+        pass
+    return peak, rss
+
+def _reset_peak_rss() -> bool:
+    """Скидає VmHWM до поточного RSS, щоб наступний пік був піком одного рендеру."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+class RenderMemoryStats:
+    """Пік пам'яті рендерів за бекендами."""
+
+    def __init__(self):
+        self._backends = {}
+
+    def record(self, backend: str, peak_kb: int) -> None:
+        if not peak_kb:
+            return
+        entry = self._backends.setdefault(backend, {'renders': 0, 'peak_rss_mb_max': 0.0, 'peak_rss_mb_last': 0.0})
+        peak_mb = round(peak_kb / 1024, 1)
+        entry['renders'] += 1
+        entry['peak_rss_mb_last'] = peak_mb
+        entry['peak_rss_mb_max'] = max(entry['peak_rss_mb_max'], peak_mb)
+
+    def snapshot(self) -> dict:
+        return {backend: dict(entry) for backend, entry in self._backends.items()}
+
+render_memory = RenderMemoryStats()
+
+# --- Робочий процес ---
+
+def _read_message(stream):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    return pickle.loads(stream.read(_HEADER.unpack(header)[0]))
+
+def _write_message(stream, message) -> None:
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+def _worker_main(memory_limit_mb: int) -> None:
+    # Ctrl+C отримує вся група процесів; зупинкою робочих процесів керує бот (drain)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # stdout — канал відповідей; випадкові print() бібліотек ідуть у stderr
+    requests = sys.stdin.buffer
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    from log_setup import setup_worker_logging
+    setup_worker_logging()
+    import pdf_utils
+    from pdf_optimize import optimize_pdf
+    # Імпортуємо рушій заздалегідь, поки процес ще не отримав першого рендеру
+    pdf_utils._try_import_xhtml2pdf()
+    backends = {name: generate for name, generate, _ in pdf_utils.PDF_BACKENDS}
+
+    while True:
+        job = _read_message(requests)
+        if job is None:
+            return
+        backend, html_full = job
+        reset = _reset_peak_rss()
+        retire = False
+        try:
+            pdf = backends[backend](html_full)
+            # Стискаємо тут же, поза процесом бота
+            result = ("ok", optimize_pdf(pdf) if pdf else pdf)
+        except MemoryError:
+            result = ("error", pdf_utils.RenderBackendError(
+                f"{backend}: перевищено ліміт пам'яті робочого процесу ({memory_limit_mb} МБ)"
+            ))
+            retire = True
+        except pdf_utils.RenderTimeout as e:
+            # Потік рендеру, що не вклався, ще працює — процес треба замінити
+            result = ("error", pdf_utils.RenderTimeout(str(e)))
+            retire = True
+        except Exception as e:
+            # Після падіння рушія стан процесу ненадійний (напр., пам'ять закінчилась не там, де чекали)
+            message = str(e) if isinstance(e, pdf_utils.RenderBackendError) else f"{backend}: {type(e).__name__}: {e}"
+            result = ("error", pdf_utils.RenderBackendError(message))
+            retire = True
+        peak_kb, rss_kb = _proc_memory_kb()
+        if not reset:
+            peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        _write_message(replies, result + (peak_kb, rss_kb, retire))
+        if retire:
+            return
+
+class _Worker:
+    def __init__(self, process):
+        self.process = process
+        self.jobs = 0
+        self.rss_kb = 0
+
+    @classmethod
+    async def start(cls, memory_limit_mb: int) -> "_Worker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), str(memory_limit_mb),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        )
+        return cls(process)
+
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def call(self, backend: str, html_full: str, timeout: float) -> tuple:
+        payload = pickle.dumps((backend, html_full), protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            self.process.stdin.write(_HEADER.pack(len(payload)) + payload)
+            await self.process.stdin.drain()
+            header = await asyncio.wait_for(self.process.stdout.readexactly(_HEADER.size), timeout)
+            reply = await self.process.stdout.readexactly(_HEADER.unpack(header)[0])
+        except asyncio.TimeoutError as e:
+            self.kill()
+            raise RenderWorkerCrashed(f"робочий процес не відповів за {timeout:g} с — вбито") from e
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            raise RenderWorkerCrashed(f"робочий процес завершився (код {await self.process.wait()})") from e
+        return pickle.loads(reply)
+
+    def stop(self) -> None:
+        # EOF у stdin — процес завершиться сам після поточного рендеру
+        if self.process.stdin and not self.process.stdin.is_closing():
+            self.process.stdin.close()
+
+    def kill(self) -> None:
+        if self.alive():
+            self.process.kill()
+
+class RenderWorkerPool:
+    def __init__(self, size: int = RENDER_WORKERS, memory_limit_mb: int = RENDER_WORKER_MEMORY_MB,
+                 max_jobs: int = RENDER_WORKER_MAX_JOBS, max_rss_mb: int = RENDER_WORKER_MAX_RSS_MB):
+        self.size = max(1, size)
+        self.memory_limit_mb = memory_limit_mb
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.started_total = 0
+        self.recycled_total = 0
+        self.crashed_total = 0
+        self._slots = None
+        self._workers = set()
+        self._respawns = set()
+        self._closed = False
+
+    def _get_slots(self) -> asyncio.Queue:
+        # Створюємо ліниво, вже всередині робочого event loop; None — процес ще не запущено
+        if self._slots is None:
+            self._slots = asyncio.Queue()
+            for _ in range(self.size):
+                self._slots.put_nowait(None)
+        return self._slots
+
+    async def _spawn(self) -> _Worker:
+        worker = await _Worker.start(self.memory_limit_mb)
+        self._workers.add(worker)
+        self.started_total += 1
+        return worker
+
+    def _replace(self, worker: _Worker) -> None:
+        """Прибирає процес із пулу і повертає слот уже з новим процесом (запуск — у фоні)."""
+        self._workers.discard(worker)
+        if self._closed:
+            # Бот зупиняється (напр., drain скасував рендери) — новий процес уже не знадобиться
+            return
+
+        async def respawn():
+            replacement = None
+            try:
+                replacement = await self._spawn()
+            except Exception as e:
+                logger.error("Не вдалося запустити робочий процес рендеру: %s", e)
+            finally:
+                self._get_slots().put_nowait(replacement)
+
+        task = asyncio.ensure_future(respawn())
+        self._respawns.add(task)
+        task.add_done_callback(self._respawns.discard)
+
+    def _retire_reason(self, worker: _Worker, retire: bool):
+        if retire:
+            return "після невдалого рендеру"
+        if worker.jobs >= self.max_jobs:
+            return f"{worker.jobs} рендерів"
+        if worker.rss_kb / 1024 >= self.max_rss_mb:
+            return f"RSS {worker.rss_kb / 1024:.0f} МБ"
+        return None
+
+    async def run(self, backend: str, html_full: str, timeout: float):
+        """
+        Рендерить HTML бекендом `backend` у робочому процесі й повертає (PDF або None, пік пам'яті в КБ).
+        Винятки бекенда (RenderBackendError / RenderTimeout) піднімаються як є,
+        смерть процесу — як RenderWorkerCrashed.
+        """
+        slots = self._get_slots()
+        worker = await slots.get()
+        try:
+            if worker is None or not worker.alive():
+                self._workers.discard(worker)
+                worker = await self._spawn()
+        except BaseException:
+            slots.put_nowait(None)
+            raise
+
+        try:
+            status, payload, peak_kb, rss_kb, retire = await worker.call(backend, html_full, timeout)
+        except BaseException as e:
+            # Процес помер, завис або рендер скасовано — у будь-якому разі процес замінюється
+            if isinstance(e, RenderWorkerCrashed):
+                self.crashed_total += 1
+            worker.kill()
+            self._replace(worker)
+            raise
+
+        worker.jobs += 1
+        worker.rss_kb = rss_kb
+        render_memory.record(backend, peak_kb)
+        reason = self._retire_reason(worker, retire)
+        if reason:
+            logger.info("Робочий процес рендеру %s замінюється: %s", worker.process.pid, reason)
+            self.recycled_total += 1
+            worker.stop()
+            self._replace(worker)
+        else:
+            slots.put_nowait(worker)
+        if status == "error":
+            raise payload
+        return payload, peak_kb
+
+    async def warm_up(self) -> None:
+        """Запускає всі робочі процеси заздалегідь."""
+        slots = self._get_slots()
+        for _ in range(self.size):
+            worker = await slots.get()
+            try:
+                if worker is None:
+                    worker = await self._spawn()
+            finally:
+                slots.put_nowait(worker)
+
+    async def close(self) -> None:
+        """Зупинка бота: заміни більше не запускаються, робочі процеси завершуються (EOF у stdin)."""
+        self._closed = True
+        if self._respawns:
+            await asyncio.gather(*self._respawns, return_exceptions=True)
+        workers, self._workers = list(self._workers), set()
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            try:
+                await asyncio.wait_for(worker.process.wait(), _STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                worker.kill()
+                await worker.process.wait()
+
+    def snapshot(self) -> dict:
+        return {
+            'workers': len(self._workers),
+            'size': self.size,
+            'rss_mb': [round(worker.rss_kb / 1024, 1) for worker in self._workers],
+            'started_total': self.started_total,
+            'recycled_total': self.recycled_total,
+            'crashed_total': self.crashed_total,
+        }
+
+render_worker_pool = RenderWorkerPool()
+
+if __name__ == "__main__":
+    _worker_main(int(sys.argv[1]) if len(sys.argv) > 1 else RENDER_WORKER_MEMORY_MB)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Екранування відповідей користувача для HTML-повідомлень Telegram та PDF (Markdown-таблиць).
+
+HTML — це `html.escape`; для PDF ще "|" → "/" і "\n" → <br>. Однопрохідний `str.translate`
+на кирилиці виявився ~10× повільнішим, а власна таблиця замін — не швидшою за `html.escape`
+(див. benchmarks/bench_sanitizer.py), тож виграш дає лише кеш нижче.
+
+Результат для поля сесії кешується прямо в даних сесії, тож проміжні підсумки
+DPIA / Чек-ліста не екранують ту саму відповідь знову на кожному кроці. Кеш живе
+рівно стільки, скільки й сесія: `clear_user_data` видаляє його разом із відповідями,
+а на диск (session_store.py) він не потрапляє — див. `strip_escape_memo`.
+"""
+
+import html
+
+# Ключ у словнику сесії, де зберігаються вже екрановані значення
+ESCAPE_CACHE_KEY = "_escaped"
+
+def escape_html(text: str) -> str:
+    if not text: return ""
+    return html.escape(text)
+
+def escape_pdf(text: str) -> str:
+    if not text: return ""
+    # "|" ламає Markdown-таблицю, "\n" → <br> усередині комірки
+    safe = html.escape(text)
+    if "|" in safe:
+        safe = safe.replace("|", "/")
+    if "\n" in safe:
+        safe = safe.replace("\n", "<br>")
+    return safe
+
+def session_memo(data: dict, key: str, raw, build):
+    """
+    Повертає `build(raw)`, закешований у `data` під ключем `key`.
+    Кеш звіряє сире значення, тож зміна відповіді інвалідовує запис.
+    """
+    cache = data.setdefault(ESCAPE_CACHE_KEY, {})
+    cached = cache.get(key)
+    if cached is not None and cached[0] == raw:
+        return cached[1]
+    result = build(raw)
+    cache[key] = (raw, result)
+    return result
+
+def session_escape_html(data: dict, key: str, default: str = "") -> str:
+    """Екранує відповідь `data[key]` для HTML один раз за сесію."""
+    return session_memo(data, key, data.get(key, default), escape_html)
+
+def strip_escape_memo(value):
+    """Копія даних сесії без кешу екранування (для збереження сесій)."""
+    if isinstance(value, dict):
+        return {k: strip_escape_memo(v) for k, v in value.items() if k != ESCAPE_CACHE_KEY}
+    if isinstance(value, list):
+        return [strip_escape_memo(v) for v in value]
+    return value
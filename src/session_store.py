@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Опційне збереження незавершених діалогів між перезапусками (за замовчуванням вимкнено).
+
+Вмикається змінною SESSION_DB_PATH, яка має вказувати на tmpfs (RAM), напр. `/dev/shm/kai_sessions.sqlite`.
+Гарантії, що зберігають обіцянку короткого зберігання:
+  - кожен запис шифрується (Fernet, пакет `cryptography`) ефемерним ключем групи процесів:
+    SESSION_KEY з оточення або ключ у `/dev/shm`, прив'язаний до `os.getpgid(0)`.
+    Нова група процесів → новий ключ → старі записи нечитабельні й відкидаються;
+  - жорсткий TTL (SESSION_TTL, секунди): прострочені записи не завантажуються і видаляються з диска;
+  - порожні `user_data` (після генерації чи /cancel) та завершені розмови видаляються одразу;
+  - ключ у `/dev/shm`, створений цим процесом, видаляється під час зупинки, якщо в сховищі
+    не лишилося сесій (інакше він потрібен, щоб наступний процес групи їх прочитав, — до TTL).
+
+Запис відбувається "write-behind": методи update_* лише кладуть зміни в буфер,
+а пакет записується в SQLite у робочому потоці — хендлери не чекають на диск.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from sanitizer import strip_escape_memo
+
+logger = logging.getLogger("session_store")
+
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH")
+SESSION_TTL = int(os.getenv("SESSION_TTL", "900"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "5"))
+SESSION_KEY_DIR = os.getenv("SESSION_KEY_DIR", "/dev/shm")
+
+_RAM_PREFIXES = ("/dev/shm", "/run", "/tmp")
+
+# Ключ, створений цим процесом: шлях, скільки сховищ ним ще користуються, чи лишилися сесії
+_owned_key = {'path': None, 'open': 0, 'sessions_left': False}
+
+def _try_import_fernet():
+    try:
+        from cryptography.fernet import Fernet, InvalidToken  # type: ignore
+        return Fernet, InvalidToken
+    except Exception:
+        return None
+
+def load_process_group_key(key_dir: str = SESSION_KEY_DIR) -> bytes:
+    """
+    Ключ шифрування, спільний для процесів однієї групи (перезапуск бота під тим самим
+    супервізором читає старі сесії; новий деплой у новій групі — ні).
+    """
+    env_key = os.getenv("SESSION_KEY")
+    if env_key:
+        return env_key.encode()
+    Fernet, _ = _try_import_fernet()
+    path = os.path.join(key_dir, f"kai-privacy-kit-{os.getpgid(0)}.key")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as key_file:
+            return key_file.read().strip()
+    key = Fernet.generate_key()
+    with os.fdopen(fd, "wb") as key_file:
+        key_file.write(key)
+    _owned_key['path'] = path
+    return key
+
+def _release_process_group_key(sessions_left: bool) -> None:
+    """Останнє закрите сховище видаляє ключ цього процесу, якщо розшифровувати вже нічого."""
+    _owned_key['open'] -= 1
+    _owned_key['sessions_left'] = _owned_key['sessions_left'] or sessions_left
+    path = _owned_key['path']
+    if _owned_key['open'] > 0 or path is None:
+        return
+    if _owned_key['sessions_left']:
+        logger.info("Ключ сесій %s лишається до закінчення TTL збережених сесій", path)
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    _owned_key['path'] = None
+
+class EncryptedSQLitePersistence(BasePersistence):
+    """Зашифрована persistence для `user_data`, `chat_data` та станів ConversationHandler."""
+
+    def __init__(self, path: str, key: bytes, ttl: int = SESSION_TTL, update_interval: float = SESSION_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        Fernet, self._invalid_token = _try_import_fernet()
+        self._fernet = Fernet(key)
+        self._path = path
+        self._ttl = ttl
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._writer_active = False
+        self._write_task = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        _owned_key['open'] += 1
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " kind TEXT NOT NULL, key TEXT NOT NULL, updated_at REAL NOT NULL, blob BLOB NOT NULL,"
+                " PRIMARY KEY (kind, key))"
+            )
+
+    # --- Читання (лише під час старту) ---
+
+    def _load(self, kind: str) -> dict:
+        cutoff = time.time() - self._ttl
+        result, stale = {}, 0
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT key, blob FROM sessions WHERE kind = ? AND updated_at >= ?", (kind, cutoff)
+            ).fetchall()
+        for key, blob in rows:
+            try:
+                result[key] = json.loads(self._fernet.decrypt(blob, ttl=self._ttl))
+            except (self._invalid_token, ValueError):
+                stale += 1
+        if stale:
+            logger.info("Відкинуто %s нечитабельних/прострочених записів (%s)", stale, kind)
+        return result
+
+    async def get_user_data(self) -> dict:
+        return {int(k): v for k, v in (await asyncio.to_thread(self._load, "user")).items()}
+
+    async def get_chat_data(self) -> dict:
+        return {int(k): v for k, v in (await asyncio.to_thread(self._load, "chat")).items()}
+
+    async def get_conversations(self, name: str) -> dict:
+        raw = await asyncio.to_thread(self._load, f"conv:{name}")
+        return {tuple(json.loads(k)): v for k, v in raw.items()}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # --- Запис (write-behind) ---
+
+    def _stage(self, kind: str, key: str, value) -> None:
+        with self._pending_lock:
+            self._pending[(kind, key)] = value
+            start_writer = not self._writer_active
+            self._writer_active = True
+        if start_writer:
+            self._write_task = asyncio.get_running_loop().create_task(asyncio.to_thread(self._write_pending))
+
+    def _write_pending(self) -> None:
+        """Записує буфер пакетами, доки він не спорожніє (виконується в робочому потоці)."""
+        batch = {}
+        try:
+            while True:
+                with self._pending_lock:
+                    batch, self._pending = self._pending, {}
+                    if not batch:
+                        self._writer_active = False
+                        return
+                self._write_batch(batch)
+        except Exception as e:
+            # "database is locked", повний диск, помилка шифрування: пакет повертається в буфер
+            # (новіші зміни тих самих ключів важливіші) і буде записаний з наступною зміною
+            with self._pending_lock:
+                for key, value in batch.items():
+                    self._pending.setdefault(key, value)
+                self._writer_active = False
+            logger.error("Не вдалося записати сесії (%s записів): %s", len(batch), e)
+
+    def _write_batch(self, batch: dict) -> None:
+        now = time.time()
+        upserts, deletes = [], []
+        for (kind, key), value in batch.items():
+            if value:
+                # Кеш екранування відтворюється з відповідей — зберігати його немає сенсу
+                blob = self._fernet.encrypt(json.dumps(strip_escape_memo(value), ensure_ascii=False).encode("utf-8"))
+                upserts.append((kind, key, now, blob))
+            else:
+                deletes.append((kind, key))
+        with self._db_lock, self._conn:
+            if upserts:
+                self._conn.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)", upserts)
+            if deletes:
+                self._conn.executemany("DELETE FROM sessions WHERE kind = ? AND key = ?", deletes)
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self._ttl,))
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage("user", str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage("chat", str(chat_id), data)
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        self._stage(f"conv:{name}", json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage("user", str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._stage("chat", str(chat_id), None)
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    def _count_sessions(self) -> int:
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (time.time() - self._ttl,)
+            ).fetchone()[0]
+
+    async def flush(self) -> None:
+        sessions_left = True
+        try:
+            if self._write_task is not None:
+                await self._write_task
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+            if batch:
+                await asyncio.to_thread(self._write_batch, batch)
+            sessions_left = await asyncio.to_thread(self._count_sessions) > 0
+        except Exception as e:
+            logger.error("Не вдалося записати сесії під час зупинки: %s", e)
+        finally:
+            with self._db_lock:
+                self._conn.close()
+            _release_process_group_key(sessions_left)
+
+def build_session_persistence(name: str = None):
+    """
+    Повертає persistence, якщо SESSION_DB_PATH задано і `cryptography` доступна; інакше None.
+    `name` — бот у процесі з кількома ботами: кожен пише у власний файл (`kai_sessions.<name>.sqlite`).
+    """
+    if not SESSION_DB_PATH:
+        return None
+    if not _try_import_fernet():
+        logger.warning("SESSION_DB_PATH задано, але пакет 'cryptography' не встановлено — сесії лише в RAM.")
+        return None
+    if not SESSION_DB_PATH.startswith(_RAM_PREFIXES):
+        logger.warning("SESSION_DB_PATH=%s схоже не на tmpfs — дані потраплять на диск (хоч і зашифровані).", SESSION_DB_PATH)
+    path = SESSION_DB_PATH
+    if name:
+        root, ext = os.path.splitext(SESSION_DB_PATH)
+        path = f"{root}.{name}{ext}"
+    persistence = EncryptedSQLitePersistence(path, load_process_group_key())
+    logger.info("Збереження сесій увімкнено: %s, TTL %s с", path, SESSION_TTL)
+    return persistence
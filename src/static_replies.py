@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Статичні відповіді й клавіатури, зібрані один раз під час імпорту.
+
+Головне меню, /help, /privacy і повідомлення після генерації не залежать від користувача,
+тож їхні `InlineKeyboardMarkup` (незмінні в PTB) будуються один раз, а розмітка клавіатури
+й опції прев'ю посилань одразу серіалізуються в JSON. Готові параметри запиту
+(`StaticReply.kwargs`) передаються в `send_message` / `reply_text` / `edit_message_text`:
+PTB не перетворює рядкові параметри, тож на гарячому шляху немає ні нових об'єктів
+клавіатур, ні повторного `to_dict()` + `json.dumps`.
+
+Бот із власними текстами (BOTS_CONFIG, multi_bot.py) отримує свій набір відповідей,
+зібраний так само один раз під час старту (`build_static_replies(registry)`).
+"""
+
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, LinkPreviewOptions
+from telegram.constants import ParseMode
+
+import templates
+
+# === Клавіатури ===
+
+MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("1️⃣ Крок 1: Оцінка Ризиків (DPIA)", callback_data="start_dpia")],
+    [InlineKeyboardButton("2️⃣ Крок 2: Політика Приватності", callback_data="start_policy")],
+    [InlineKeyboardButton("3️⃣ Крок 3: Технічний Чек-ліст", callback_data="start_checklist")],
+    [InlineKeyboardButton("📦 Порожні шаблони (кіт)", callback_data="show_kit")],
+    [
+        InlineKeyboardButton("❓ Допомога", callback_data="show_help"),
+        InlineKeyboardButton("🔒 Наша Політика", callback_data="show_privacy")
+    ],
+    [InlineKeyboardButton("🐙 GitHub (Open Source)", url="https://github.com/Kirill3224/KAI-Privacy-Kit")]
+])
+
+POST_ACTION_KEYBOARD = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Повернутись до головного меню", callback_data="start_menu_post_generation")
+]])
+
+DPIA_UPSELL_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📄 Створити Політику (Крок 2)", callback_data="start_policy_upsell")],
+    [InlineKeyboardButton("⬅️ В меню", callback_data="start_menu_post_generation")]
+])
+
+POLICY_UPSELL_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Пройти Чек-ліст (Крок 3)", callback_data="start_checklist_upsell")],
+    [InlineKeyboardButton("⬅️ В меню", callback_data="start_menu_post_generation")]
+])
+
+RETRY_GENERATION_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔁 Спробувати ще раз", callback_data="retry_generation")],
+    [InlineKeyboardButton("⬅️ В меню", callback_data="start_menu_post_generation")]
+])
+
+BACK_TO_MENU_KEYBOARD = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад в меню", callback_data="start_menu")]])
+
+# === Відповіді ===
+
+_NO_LINK_PREVIEW_JSON = LinkPreviewOptions(is_disabled=True).to_json()
+
+@dataclass(frozen=True)
+class StaticReply:
+    """Текст + клавіатура з уже серіалізованими параметрами запиту (`kwargs`)."""
+    text: str
+    reply_markup: InlineKeyboardMarkup = None
+    disable_preview: bool = False
+    kwargs: MappingProxyType = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        api_kwargs = {}
+        if self.reply_markup is not None:
+            api_kwargs['reply_markup'] = self.reply_markup.to_json()
+        if self.disable_preview:
+            api_kwargs['link_preview_options'] = _NO_LINK_PREVIEW_JSON
+        object.__setattr__(self, 'kwargs', MappingProxyType({
+            'text': self.text,
+            'parse_mode': ParseMode.HTML,
+            'api_kwargs': MappingProxyType(api_kwargs),
+        }))
+
+def build_static_replies(registry: templates.TemplateRegistry = None) -> MappingProxyType:
+    """Збирає всі статичні відповіді з текстів `registry` (за замовчуванням — спільні templates)."""
+    registry = registry or templates.compiled
+    return MappingProxyType({
+        'WELCOME': StaticReply(registry.BOT_WELCOME(), MAIN_MENU_KEYBOARD),
+        'HELP': StaticReply(registry.BOT_HELP(), disable_preview=True),
+        'HELP_INLINE': StaticReply(registry.BOT_HELP(), BACK_TO_MENU_KEYBOARD, disable_preview=True),
+        'PRIVACY': StaticReply(registry.BOT_PRIVACY_POLICY(), disable_preview=True),
+        'PRIVACY_INLINE': StaticReply(registry.BOT_PRIVACY_POLICY(), BACK_TO_MENU_KEYBOARD, disable_preview=True),
+        'POST_POLICY_UPSELL': StaticReply(registry.POST_POLICY_UPSELL(), POLICY_UPSELL_KEYBOARD),
+        'POST_DPIA_UPSELL': StaticReply(registry.POST_DPIA_UPSELL(), DPIA_UPSELL_KEYBOARD),
+        'POST_CHECKLIST_SUCCESS': StaticReply(registry.POST_CHECKLIST_SUCCESS(), POST_ACTION_KEYBOARD),
+    })
+
+static_replies = build_static_replies()
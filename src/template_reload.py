@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Гаряче оновлення шаблонів без перезапуску.
+
+TEMPLATES_DIR — каталог із файлами `<НАЗВА_ШАБЛОНУ>.txt|.md|.html` (напр., `POLICY_TEMPLATE.md`,
+`POST_DPIA_UPSELL.html`): кожен файл замінює однойменний шаблон з templates.py. Версія набору —
+хеш вмісту всіх файлів. `TemplateWatcher` раз на TEMPLATES_RELOAD_INTERVAL секунд перевіряє
+(mtime, розмір) файлів; якщо щось змінилося — читає каталог, компілює шаблони, звіряє
+плейсхолдери (`bot.validate_templates`) і лише тоді атомарно публікує нову версію.
+Невдалий набір пишеться в лог і не застосовується — бот лишається на попередній версії.
+
+Кожен бот має `TemplateStore` (у `bot_data['template_store']`): шари templates.py → файли →
+власні тексти бота (BOTS_CONFIG), а також останні TEMPLATES_KEEP_VERSIONS версій і всі старіші,
+за якими ще закріплені живі діалоги. Діалог, що вже йде, закріплений за версією, на якій почався
+(`user_data['templates_version']`), і завершується на ній; нові діалоги отримують поточну версію.
+Файли читаються й компілюються в робочому потоці, а публікується версія в event loop —
+хендлери бачать або стару версію, або нову, і ніколи — сховище посеред заміни.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from static_replies import build_static_replies
+from templates import TemplateRegistry
+
+logger = logging.getLogger("template_reload")
+
+TEMPLATES_DIR = os.getenv("TEMPLATES_DIR")
+TEMPLATES_RELOAD_INTERVAL = float(os.getenv("TEMPLATES_RELOAD_INTERVAL", "2"))
+TEMPLATES_KEEP_VERSIONS = int(os.getenv("TEMPLATES_KEEP_VERSIONS", "5"))
+
+BUILTIN_VERSION = "builtin"
+SESSION_VERSION_KEY = 'templates_version'
+_EXTENSIONS = (".txt", ".md", ".html")
+
+@dataclass(frozen=True)
+class TemplateVersion:
+    """Скомпільований набір шаблонів і статичні відповіді, зібрані з нього."""
+    version: str
+    registry: TemplateRegistry
+    replies: MappingProxyType
+
+class TemplateStore:
+    def __init__(self, base: TemplateRegistry, bot_overrides: dict = None, validate=None,
+                 keep: int = TEMPLATES_KEEP_VERSIONS, sessions=None):
+        """`sessions` — живі `user_data` бота (`application.user_data`): їхні версії не забуваються."""
+        self._base = base
+        self._sessions = sessions if sessions is not None else {}
+        self._bot_overrides = dict(bot_overrides or {})
+        self._validate = validate
+        self._keep = max(1, keep)
+        self._versions = OrderedDict()
+        self.current = None
+        self.activate(self.build({}, BUILTIN_VERSION))
+
+    def build(self, file_overrides: dict, version: str) -> TemplateVersion:
+        """Компілює і перевіряє набір; піднімає ValueError, якщо шаблони некоректні."""
+        registry = self._base
+        for overrides in (file_overrides, self._bot_overrides):
+            if overrides:
+                registry = registry.with_overrides(overrides)
+        if self._validate:
+            self._validate(registry)
+        return TemplateVersion(version, registry, build_static_replies(registry))
+
+    def activate(self, template_version: TemplateVersion) -> None:
+        self._versions[template_version.version] = template_version
+        self._versions.move_to_end(template_version.version)
+        self.current = template_version
+        if len(self._versions) <= self._keep:
+            return
+        # Забуваємо найстаріші версії, але не ті, на яких ще йдуть діалоги
+        pinned = {data.get(SESSION_VERSION_KEY) for data in self._sessions.values() if data}
+        for version in list(self._versions)[:-1]:
+            if len(self._versions) <= self._keep:
+                break
+            if version not in pinned:
+                del self._versions[version]
+
+    def for_session(self, user_data) -> TemplateVersion:
+        """
+        Версія для діалогу: закріплена в `user_data`, а якщо її немає — поточна.
+        Закріплена версія може бути недоступна лише після перезапуску (версії живуть у пам'яті).
+        Закріплюється лише непорожня сесія, тож /start і меню не лишають слідів у user_data.
+        """
+        if not user_data:
+            return self.current
+        pinned_version = user_data.get(SESSION_VERSION_KEY)
+        pinned = self._versions.get(pinned_version)
+        if pinned is None:
+            if pinned_version is not None:
+                logger.warning("Версія шаблонів %s діалогу недоступна — діалог продовжиться на %s",
+                               pinned_version, self.current.version)
+            user_data[SESSION_VERSION_KEY] = self.current.version
+            return self.current
+        return pinned
+
+    def snapshot(self) -> dict:
+        return {'current': self.current.version, 'kept': list(self._versions)}
+
+# --- Файли шаблонів ---
+
+def _template_files(directory: str) -> dict:
+    """{назва шаблону: шлях} для файлів із підтримуваними розширеннями."""
+    files = {}
+    for entry in os.scandir(directory):
+        name, ext = os.path.splitext(entry.name)
+        if entry.is_file() and ext in _EXTENSIONS and name.isupper():
+            files[name] = entry.path
+    return files
+
+def _fingerprint(directory: str) -> tuple:
+    return tuple(sorted(
+        (name, stat.st_mtime_ns, stat.st_size)
+        for name, stat in ((name, os.stat(path)) for name, path in _template_files(directory).items())
+    ))
+
+def read_template_files(directory: str) -> tuple:
+    """(версія, {назва: текст}) з каталогу; один завершальний перенос рядка у файлі відкидається."""
+    overrides = {}
+    for name, path in sorted(_template_files(directory).items()):
+        with open(path, encoding="utf-8") as template_file:
+            text = template_file.read()
+        overrides[name] = text[:-1] if text.endswith("\n") else text
+    digest = hashlib.sha256()
+    for name, text in overrides.items():
+        digest.update(name.encode() + b"\0" + text.encode("utf-8") + b"\0")
+    return (digest.hexdigest()[:12] if overrides else BUILTIN_VERSION), overrides
+
+class TemplateWatcher:
+    def __init__(self, directory: str = TEMPLATES_DIR, interval: float = TEMPLATES_RELOAD_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.reloads_total = 0
+        self.rejected_total = 0
+        self._stores = []
+        self._fingerprint = None
+        self._task = None
+
+    def attach(self, store: TemplateStore) -> None:
+        self._stores.append(store)
+
+    def load(self) -> bool:
+        """
+        Читає каталог і публікує версію в усі сховища — все або нічого.
+        Піднімає ValueError (некоректні шаблони) або OSError; повертає False, якщо версія та сама.
+        """
+        return self._publish(self._prepare())
+
+    def _prepare(self) -> tuple:
+        """Читання й компіляція без зміни сховищ — безпечно виконувати в робочому потоці."""
+        fingerprint = _fingerprint(self.directory)
+        version, overrides = read_template_files(self.directory)
+        if all(store.current.version == version for store in self._stores):
+            return fingerprint, version, len(overrides), None
+        # Спершу збираємо всі набори, щоб помилка в одному боті не лишила інших на новій версії
+        return fingerprint, version, len(overrides), [store.build(overrides, version) for store in self._stores]
+
+    def _publish(self, prepared: tuple) -> bool:
+        fingerprint, version, files, built = prepared
+        self._fingerprint = fingerprint
+        if built is None:
+            return False
+        for store, template_version in zip(self._stores, built):
+            store.activate(template_version)
+        self.reloads_total += 1
+        logger.info("Шаблони оновлено: версія %s (%s файлів)", version, files)
+        return True
+
+    def start(self) -> None:
+        """Фонове стеження за каталогом; викликати всередині робочого event loop."""
+        if self.directory and self._task is None:
+            self._task = asyncio.ensure_future(self._watch())
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await asyncio.to_thread(_fingerprint, self.directory) == self._fingerprint:
+                    continue
+                # Версія публікується вже в event loop, між обробкою оновлень
+                self._publish(await asyncio.to_thread(self._prepare))
+            except (OSError, ValueError) as e:
+                self.rejected_total += 1
+                # Не перевіряємо той самий зламаний набір знову, поки файли не зміняться
+                self._fingerprint = await asyncio.to_thread(_fingerprint, self.directory)
+                logger.error("Нові шаблони не застосовано, лишається версія %s: %s",
+                             self._stores[0].current.version if self._stores else "?", e)
+
+template_watcher = TemplateWatcher()
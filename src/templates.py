@@ -3,9 +3,20 @@
 (v4.5 - HTML Templates)
 Шаблони, переписані на HTML для стабільності.
 UX: Уніфіковано кроки у Чек-лісті (Крок X/10).
+
+Усі шаблони компілюються один раз під час імпорту (див. `compiled` внизу файлу).
 """
 
+import string
+
 # === 1. Статичні Тексти ===
+
+BOT_WELCOME = """👋 <b>Привіт! Я — Privacy Sentry.</b>
+
+Я допоможу вам зробити ваш студентський проєкт безпечним та законним. Я не зберігаю ваші дані («stateless»), тому ми будемо працювати крок за кроком.
+
+👇 <b>Ваша Дорожня Карта (натискайте по черзі):</b>"""
+
 BOT_HELP = """<b>❓ Як користуватися "KAI Privacy Kit"?</b>
 
 Ми рекомендуємо натискати кнопки саме в такому порядку (1 → 2 → 3). Це гарантує підхід "Privacy by Design".
@@ -34,6 +45,10 @@ BOT_HELP = """<b>❓ Як користуватися "KAI Privacy Kit"?</b>
 3. Отримайте PDF.
 4. Бот <b>миттєво видалить</b> ваші дані з пам'яті.
 
+⚡ Вже маєте заповнену таблицю DPIA чи відповіді у JSON? Див. /import — PDF за одне повідомлення.
+📦 Потрібна таблиця замість PDF? Оберіть формат у /format.
+🗂 Хочете заповнити шаблони самостійно? /kit надішле порожні файли кіта.
+
 <b>📞 Контакти:</b>
 • Team Lead: @rntroo
 • Tech Lead: @QFITP
@@ -93,7 +108,7 @@ POST_POLICY_UPSELL = """Вітаю! Ви завершили "Крок 2: Поо
 Будь ласка, натисніть [ ✅ Пройти Чек-ліст ] прямо зараз, щоб переконатися, що ваш проєкт справді безпечний.
 """
 
-POST_DPIA_UPSELL = """✅ <b>Ваш PDF готовий. Дані успішно видалено.</b>
+POST_DPIA_UPSELL = """✅ <b>Ваш документ готовий. Дані успішно видалено.</b>
 
 Вітаю! Ви завершили "Крок 1: Подумай".
 
@@ -102,7 +117,7 @@ POST_DPIA_UPSELL = """✅ <b>Ваш PDF готовий. Дані успішно
 Ваш наступний крок — <b>"Крок 2: Пообіцяй"</b>.
 """
 
-POST_CHECKLIST_SUCCESS = """✅ <b>Ваш PDF готовий. Дані успішно видалено.</b>
+POST_CHECKLIST_SUCCESS = """✅ <b>Ваш документ готовий. Дані успішно видалено.</b>
 
 <b>Вітаю! Ви завершили повний цикл "Privacy Kit".</b>
 
@@ -113,6 +128,81 @@ POST_CHECKLIST_SUCCESS = """✅ <b>Ваш PDF готовий. Дані успі
 Тепер ваш проєкт готовий до запуску. Успіхів! 🚀
 """
 
+# Фігурні дужки подвоєні: текст проходить через реєстр шаблонів (compiled.BOT_IMPORT_HELP())
+BOT_IMPORT_HELP = """<b>⚡ Швидкий імпорт: документ за одне повідомлення</b>
+
+Замість покрокового діалогу можна надіслати вже заповнені відповіді — бот одразу згенерує PDF.
+
+<b>1. Таблиця DPIA</b>
+Заповніть <code>1_dpia_lite.xlsx</code> з папки <code>artifacts</code> і надішліть файл у чат.
+У блоці «Мінімізація» починайте відповідь з «Так» або «Ні».
+
+<b>2. JSON- або YAML-повідомлення</b> (або файл <code>.json</code> / <code>.yaml</code>)
+<pre>{{
+  "document": "policy",
+  "project_name": "KAI Schedule Bot",
+  "contact": "@username",
+  "data_collected": "Telegram ID",
+  "data_storage": "Firebase",
+  "delete_mechanism": "/deleteme"
+}}</pre>
+• <code>"document": "dpia"</code> — поля <code>team, goal, retention_period, retention_mechanism, storage, risk, mitigation</code> і список <code>data</code>: <code>[{{"item": "Email", "needed": true, "reason": "..."}}]</code>
+• <code>"document": "checklist"</code> — пункти <code>c1_s1 … c3_s3</code>: <code>{{"status": "yes", "note": "..."}}</code>
+YAML-повідомлення починайте з рядка <code>document: policy</code> (dpia, checklist) — поля ті самі.
+
+<i>Дані обробляються так само, як у діалозі: лише в пам'яті та видаляються одразу після генерації.</i>
+"""
+
+KIT_INTRO = """<b>🗂 Порожній KAI Privacy Kit</b>
+
+• <code>1_dpia_lite.xlsx</code> — таблиця оцінки ризиків (її ж можна заповнити й повернути через /import);
+• <code>2_privacy_policy</code> — шаблон Політики Приватності (.md і .pdf);
+• <code>3_minimization_checklist</code> — технічний чек-ліст (.md і .pdf).
+"""
+
+OUTPUT_FORMAT_PROMPT = """<b>📦 Формат документів</b>
+
+• <b>PDF</b> — готовий до друку документ.
+• <b>XLSX</b> — таблиця у форматі <code>1_dpia_lite.xlsx</code>, створюється миттєво (для DPIA та Чек-ліста).
+• <b>PDF + XLSX</b> — обидва файли.
+• <b>HTML</b> — сторінка з тими самими стилями, відкривається в будь-якому браузері.
+• <b>Markdown</b> — текст <code>.md</code>, який можна вставити у свій README.
+
+<i>XLSX для Політики Приватності немає — замість нього буде PDF.</i>
+"""
+
+RENDER_FALLBACK_NOTICE = """⚠️ Зараз багато запитів на PDF, тож надсилаю документ у форматі HTML — він відкривається в будь-якому браузері і його можна зберегти як PDF через «Друк».
+"""
+
+PDF_UNAVAILABLE_NOTICE = """⚠️ PDF-генератор зараз недоступний, тож надсилаю документ у форматі HTML — він відкривається в будь-якому браузері і його можна зберегти як PDF через «Друк».
+"""
+
+DOCUMENT_TOO_LARGE = """⚠️ Документ завеликий для генерації ({chars} символів, ліміт {limit}).
+Будь ласка, скоротіть відповіді або кількість пунктів і спробуйте ще раз.
+"""
+
+XLSX_UNAVAILABLE_NOTICE = "⚠️ Таблиця XLSX зараз недоступна, тож надсилаю документ у PDF."
+
+RENDER_QUEUE_FULL_NOTICE = """🚦 Зараз дуже багато охочих отримати документ, і черга заповнена.
+Ваші відповіді збережено — натисніть «Спробувати ще раз» за хвилину-дві.
+"""
+
+RETRY_EXPIRED_NOTICE = "Відповіді вже не збережені — почніть документ спочатку з головного меню."
+
+RATE_LIMIT_MESSAGES_NOTICE = "⏳ Забагато повідомлень поспіль. Зачекайте {wait} і повторіть останню дію."
+
+RATE_LIMIT_FLOW_NOTICE = "⏳ Ви дуже часто починаєте документи заново. Новий можна буде почати через {wait}."
+
+RATE_LIMIT_RENDER_NOTICE = """⏳ Ліміт документів на годину вичерпано.
+Ваші відповіді збережено — натисніть «Спробувати ще раз» через {wait}.
+"""
+
+DRAIN_NOTICE = "🔄 Бот оновлюється і за хвилину повернеться. Спробуйте, будь ласка, трохи згодом."
+
+DRAIN_INTERRUPTED_NOTICE = """🔄 Бот перезапускався, і документ не встиг згенеруватися.
+Вибачте! Натисніть /start за хвилину і пройдіть діалог ще раз (або надішліть відповіді через /import).
+"""
+
 # === 2. PDF Шаблони (Залишаються Markdown, бо PDF-генератор очікує MD) ===
 POLICY_TEMPLATE = """# {project_name} – Наша Політика Приватності
 **Дата:** {date}
@@ -361,4 +451,83 @@ CHECKLIST_C3_S3_NOTE = """{summary_text}
 {status}
 
 Додайте нотатку.
-"""
\ No newline at end of file
+"""
+
+
+# === 4. Реєстр скомпільованих шаблонів ===
+
+_FORMATTER = string.Formatter()
+
+class CompiledTemplate:
+    """
+    Шаблон `str.format`, розібраний один раз під час імпорту.
+    Статичні частини зберігаються вже розекранованими (`{{` → `{`),
+    тож рендер — це лише склеювання рядків без повторного парсингу.
+    """
+    __slots__ = ("name", "source", "placeholders", "_literals", "_fields")
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        literals, fields = [], []
+        pending_literal = ""
+        for literal, field, spec, conversion in _FORMATTER.parse(source):
+            pending_literal += literal
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f"Шаблон {name}: непідтримуваний плейсхолдер {{{field}}}")
+            literals.append(pending_literal)
+            fields.append(field)
+            pending_literal = ""
+        literals.append(pending_literal)
+        self._literals = tuple(literals)
+        self._fields = tuple(fields)
+        self.placeholders = frozenset(fields)
+
+    def __call__(self, **data) -> str:
+        literals = self._literals
+        parts = [literals[0]]
+        for i, field in enumerate(self._fields, 1):
+            parts.append(str(data[field]))
+            parts.append(literals[i])
+        return "".join(parts)
+
+    def __repr__(self) -> str:
+        return f"<CompiledTemplate {self.name} {sorted(self.placeholders)}>"
+
+class TemplateRegistry:
+    """Набір скомпільованих шаблонів: `compiled.POLICY_Q_CONTACT(**data)`."""
+
+    def __init__(self, sources: dict):
+        self._templates = {name: CompiledTemplate(name, text) for name, text in sources.items()}
+
+    def __getattr__(self, name: str) -> CompiledTemplate:
+        try:
+            return self.__dict__["_templates"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name: str) -> CompiledTemplate:
+        return self._templates[name]
+
+    def items(self):
+        return self._templates.items()
+
+    def with_overrides(self, overrides: dict) -> "TemplateRegistry":
+        """Новий реєстр, де частину шаблонів замінено (напр., власні тексти бота з BOTS_CONFIG)."""
+        unknown = set(overrides) - set(self._templates)
+        if unknown:
+            raise ValueError(f"Невідомі шаблони: {sorted(unknown)}")
+        sources = {name: tpl.source for name, tpl in self._templates.items()}
+        sources.update(overrides)
+        return TemplateRegistry(sources)
+
+def collect_template_sources(namespace: dict) -> dict:
+    """Усі рядкові константи у ВЕРХНЬОМУ_РЕГІСТРІ вважаються шаблонами."""
+    return {
+        name: value for name, value in namespace.items()
+        if name.isupper() and not name.startswith("_") and isinstance(value, str)
+    }
+
+compiled = TemplateRegistry(collect_template_sources(globals()))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Паралельна обробка оновлень різних користувачів, але послідовна — для одного.
+
+ConversationHandler розрахований на те, що оновлення одного діалогу обробляються по черзі:
+дві швидкі відповіді, оброблені паралельно, читають той самий застарілий стан
+(напр., обидві додають пункт DPIA і обидві зсувають `current_data_index`).
+Тому оновлення одного користувача (або чату, якщо користувача немає) чекають одне на одне,
+а оновлення різних користувачів ідуть паралельно — не більше ніж `max_concurrent_updates`.
+Слот паралельності береться лише після черги користувача, тож один користувач зі зливою
+повідомлень не займає слоти інших.
+
+Довгий крок — генерація документа — запускається без блокування (`block=False` у хендлерах
+генерації), тож /cancel того самого користувача обробляється, поки документ рендериться.
+"""
+
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # ключ → [замок, скільки оновлень його тримають або чекають]
+        self._locks = {}
+
+    @staticmethod
+    def _key(update):
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return 'user', user.id
+        chat = getattr(update, 'effective_chat', None)
+        return ('chat', chat.id) if chat is not None else None
+
+    async def process_update(self, update, coroutine) -> None:
+        key = self._key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Експорт заповнених DPIA та Чек-ліста у `.xlsx` (без HTML-рушія та PDF-рендерера).
+
+Книга пишеться openpyxl у write-only режимі (рядки стрімляться одразу в zip),
+тому файл готовий за мілісекунди. Аркуш DPIA повторює розкладку
+`artifacts/1_dpia_lite.xlsx`, тож експортований файл можна знову імпортувати через /import.
+"""
+
+import io
+import logging
+import time
+from datetime import date
+
+from budgets import limit_items, truncate_field
+
+logger = logging.getLogger("xlsx_export")
+
+class XlsxUnavailable(RuntimeError):
+    """Експорт у XLSX неможливий: не встановлено openpyxl."""
+
+CHECKLIST_ROWS = (
+    ("Категорія 1: Контроль Доступу", (
+        ('c1_s1', "1.1. 2FA"),
+        ('c1_s2', "1.2. Привілеї"),
+        ('c1_s3', "1.3. Публічні посилання"),
+    )),
+    ("Категорія 2: Права Користувачів", (
+        ('c2_s1', "2.1. Політика"),
+        ('c2_s2', "2.2. Видалення"),
+        ('c2_s3', "2.3. Контакт"),
+    )),
+    ("Категорія 3: Технічна Гігієна", (
+        ('c3_s1', "3.1. Токени"),
+        ('c3_s2', "3.2. Retention"),
+        ('c3_s3', "3.3. Шифрування"),
+    )),
+)
+
+def _try_import_openpyxl():
+    try:
+        import openpyxl  # type: ignore
+        from openpyxl.cell import WriteOnlyCell  # type: ignore
+        from openpyxl.styles import Alignment, Font  # type: ignore
+        return openpyxl, WriteOnlyCell, Alignment, Font
+    except Exception:
+        return None
+
+class _SheetWriter:
+    """Обгортка над write-only аркушем: усі значення — текст (жодних формул з відповідей)."""
+
+    def __init__(self, sheet, cell_cls, alignment, bold_font):
+        self._sheet = sheet
+        self._cell_cls = cell_cls
+        self._alignment = alignment
+        self._bold = bold_font
+
+    def _cell(self, value, bold=False):
+        cell = self._cell_cls(self._sheet, value=value or "")
+        # Відповідь на кшталт "=HYPERLINK(...)" не повинна стати формулою
+        cell.data_type = "s"
+        cell.alignment = self._alignment
+        if bold:
+            cell.font = self._bold
+        return cell
+
+    def row(self, *values, bold=False):
+        self._sheet.append([self._cell(v, bold) for v in values])
+
+def _new_workbook(title: str, widths: tuple):
+    imported = _try_import_openpyxl()
+    if not imported:
+        raise XlsxUnavailable("Експорт у XLSX недоступний: встановіть `openpyxl` (`pip install openpyxl`).")
+    openpyxl, cell_cls, Alignment, Font = imported
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    for column, width in zip("ABC", widths):
+        sheet.column_dimensions[column].width = width
+    writer = _SheetWriter(sheet, cell_cls, Alignment(wrap_text=True, vertical="top"), Font(bold=True))
+    return workbook, writer
+
+def _save(workbook) -> bytes:
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def _field(data: dict, key: str) -> str:
+    return truncate_field(data.get(key) or "")
+
+def build_dpia_xlsx(data: dict) -> bytes:
+    """DPIA Lite у розкладці artifacts/1_dpia_lite.xlsx."""
+    started = time.perf_counter()
+    workbook, sheet = _new_workbook("DPIA Lite", (45, 90))
+    sheet.row("Стовпець A (Питання)", "Стовпець B (Ваша Відповідь)", bold=True)
+    sheet.row("Проєкт", bold=True)
+    sheet.row("Назва проєкту:", _field(data, 'project_name'))
+    sheet.row("Керівник/Розробник:", _field(data, 'team'))
+    sheet.row("Дата:", date.today().strftime("%d.%m.%Y"))
+    sheet.row("1. Мета: Навіщо ми це робимо?", _field(data, 'goal'))
+
+    minimization_data, dropped = limit_items(data.get('minimization_data', []))
+    sheet.row("2. Дані: Що ми збираємо?", "\n".join(truncate_field(m['item']) for m in minimization_data))
+    sheet.row("3. Мінімізація: Чи справді нам це потрібно? (Питання до кожного поля з кроку 2)", bold=True)
+    refused = []
+    for item in minimization_data:
+        if item['needed']:
+            answer = f"Так. {truncate_field(item['reason'])}".strip()
+        else:
+            # Причину відмови зберігаємо, щоб вона пережила повторний /import цього файлу
+            answer = f"Ні. {truncate_field(item['reason']) or 'Відмовлено'}"
+            refused.append(item['item'])
+        sheet.row(truncate_field(item['item']), answer)
+    dropped += data.get('data_list_dropped', 0)
+    if dropped:
+        sheet.row(f"[Ще {dropped} пункт(ів) не включено — ліміт {len(minimization_data)}]")
+    conclusion = ", ".join(refused) if refused else "—"
+    sheet.row(f"Висновок: відмовилися від: {truncate_field(conclusion)}", bold=True)
+
+    sheet.row("4. Зберігання та Ризики: Де це буде жити?", bold=True)
+    sheet.row("Де зберігаємо:", _field(data, 'storage'))
+    sheet.row("Який головний ризик?", _field(data, 'risk'))
+    sheet.row("Як мінімізуємо ризик?", _field(data, 'mitigation'))
+    sheet.row("5. Строки: Коли ми це видалимо?", bold=True)
+    sheet.row("План зберігання:", _field(data, 'retention_period'))
+    sheet.row("План очистки:", _field(data, 'retention_mechanism'))
+
+    content = _save(workbook)
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("XLSX (DPIA) створено: %s байт за %s мс", len(content), duration_ms,
+                extra={"sample": True, "duration_ms": duration_ms, "xlsx_bytes": len(content)})
+    return content
+
+def build_checklist_xlsx(data: dict) -> bytes:
+    """Технічний чек-ліст: Пункт | Статус | Нотатки."""
+    started = time.perf_counter()
+    workbook, sheet = _new_workbook("Чек-ліст", (30, 16, 70))
+    sheet.row("Назва проєкту:", _field(data, 'project_name'), bold=True)
+    sheet.row("Дата:", date.today().strftime("%d.%m.%Y"))
+    for category, items in CHECKLIST_ROWS:
+        sheet.row()
+        sheet.row(category, bold=True)
+        sheet.row("Пункт", "Статус", "Нотатки", bold=True)
+        for key, label in items:
+            status = "Виконано" if data.get(f"{key}_status") == "yes" else "Не виконано"
+            note = data.get(f"{key}_note", "Не заповнено")
+            if note == "*Пропущено*":
+                note = "Пропущено"
+            sheet.row(label, status, truncate_field(note))
+
+    content = _save(workbook)
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("XLSX (Чек-ліст) створено: %s байт за %s мс", len(content), duration_ms,
+                extra={"sample": True, "duration_ms": duration_ms, "xlsx_bytes": len(content)})
+    return content
+
+XLSX_BUILDERS = {
+    'dpia': build_dpia_xlsx,
+    'checklist': build_checklist_xlsx,
+}